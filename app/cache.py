@@ -0,0 +1,300 @@
+"""
+缓存模块
+提供答案缓存（规范化问题的精确匹配 + 问题嵌入的语义近邻匹配），
+以及按索引版本失效的问题嵌入 / 检索结果缓存
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.logger import setup_logger
+from app.metrics import RETRIEVAL_CACHE_LOOKUPS
+
+logger = setup_logger(__name__)
+
+
+def normalize_question(question: str) -> str:
+    """规范化问题文本，用作精确匹配的缓存键
+
+    转小写、合并空白、去掉首尾的标点，例如
+    "  What is the grading scheme for MAT235? " -> "what is the grading scheme for mat235"
+
+    Args:
+        question: 原始问题
+
+    Returns:
+        规范化后的问题
+    """
+    text = re.sub(r"\s+", " ", question.lower()).strip()
+    return text.strip(" ?!.,;:")
+
+
+@dataclass
+class CachedAnswer:
+    """缓存的答案及其来源元数据"""
+    answer: str
+    sources: List[Dict] = field(default_factory=list)
+
+
+@dataclass
+class _Entry:
+    value: CachedAnswer
+    scope: FrozenSet[str]
+    embedding: Optional[np.ndarray]
+    expires_at: float
+
+
+class SemanticAnswerCache:
+    """两级答案缓存（线程安全）
+
+    1. 精确匹配：规范化后的问题文本
+    2. 语义匹配：在相同课程代码范围内，问题嵌入的余弦相似度超过阈值的最近邻
+
+    容量有界（LRU 淘汰）且每个条目有 TTL；与嵌入 / 检索缓存一样按索引版本失效，
+    set_version() 发现向量库重建（版本变化）时清空全部条目。
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float, similarity_threshold: float):
+        """
+        Args:
+            max_size: 最大条目数，超过后淘汰最久未使用的条目
+            ttl_seconds: 条目有效期（秒）
+            similarity_threshold: 语义匹配的最小余弦相似度
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.version: Optional[int] = None
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        # 按课程范围缓存的嵌入矩阵和过期时间，供近邻搜索使用；范围内条目变化时失效
+        self._scope_matrices: Dict[FrozenSet[str], Tuple[List[str], np.ndarray, np.ndarray]] = {}
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _scope(course_codes: Iterable[str]) -> FrozenSet[str]:
+        return frozenset(course_codes)
+
+    @staticmethod
+    def _normalize_vector(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._scope_matrices.pop(entry.scope, None)
+
+    def get_exact(self, question: str) -> Optional[CachedAnswer]:
+        """按规范化问题精确查找
+
+        Args:
+            question: 用户问题
+
+        Returns:
+            命中时返回缓存答案，否则返回 None（不计入 miss，语义查找后再统计）
+        """
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry.value
+
+    def get_similar(self, embedding, course_codes: Iterable[str]) -> Optional[CachedAnswer]:
+        """在相同课程范围内按问题嵌入查找最近邻
+
+        Args:
+            embedding: 问题嵌入向量
+            course_codes: 问题中提取到的课程代码
+
+        Returns:
+            相似度超过阈值时返回缓存答案，否则返回 None 并计入 miss
+        """
+        scope = self._scope(course_codes)
+        query = self._normalize_vector(embedding)
+        now = time.monotonic()
+
+        with self._lock:
+            cached = self._scope_matrices.get(scope)
+            if cached is None:
+                keys = [
+                    key for key, entry in self._entries.items()
+                    if entry.scope == scope and entry.embedding is not None
+                ]
+                if keys:
+                    matrix = np.stack([self._entries[key].embedding for key in keys])
+                    expires_at = np.array([self._entries[key].expires_at for key in keys])
+                    cached = (keys, matrix, expires_at)
+                    self._scope_matrices[scope] = cached
+
+            if cached is not None:
+                keys, matrix, expires_at = cached
+                # 过期条目不参与打分并顺便淘汰，否则一个过期的最近邻会遮住其后仍有效的匹配
+                fresh = expires_at > now
+                if not fresh.all():
+                    for key in [key for key, ok in zip(keys, fresh) if not ok]:
+                        self._remove(key)
+                scores = np.where(fresh, matrix @ query, -np.inf)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity_threshold:
+                    key = keys[best]
+                    self._entries.move_to_end(key)
+                    self.semantic_hits += 1
+                    logger.debug("语义缓存命中，相似度 %.3f", scores[best])
+                    return self._entries[key].value
+
+            self.misses += 1
+            return None
+
+    def put(
+        self, question: str, course_codes: Iterable[str], embedding, value: CachedAnswer,
+        version: Optional[int] = None
+    ) -> None:
+        """写入缓存
+
+        Args:
+            question: 用户问题
+            course_codes: 问题中提取到的课程代码
+            embedding: 问题嵌入向量，为 None 时只参与精确匹配
+            value: 要缓存的答案
+            version: 计算答案时的索引版本；与当前版本不一致（计算期间索引已重新加载）时丢弃
+        """
+        key = normalize_question(question)
+        scope = self._scope(course_codes)
+        vector = self._normalize_vector(embedding) if embedding is not None else None
+
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(
+                value=value,
+                scope=scope,
+                embedding=vector,
+                expires_at=time.monotonic() + self.ttl_seconds
+            )
+            self._scope_matrices.pop(scope, None)
+
+            # 淘汰最久未使用的条目
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def set_version(self, version: int) -> None:
+        """设置当前索引版本，版本变化时清空缓存"""
+        with self._lock:
+            changed = version != self.version and bool(self._entries)
+            self.version = version
+        if changed:
+            logger.info(f"索引版本变为 {version}，清空答案缓存")
+            self.invalidate()
+
+    def invalidate(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._scope_matrices.clear()
+        logger.info("答案缓存已清空")
+
+    def stats(self) -> Dict[str, float]:
+        """返回缓存命中统计"""
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            total = hits + self.misses
+            return {
+                "size": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class VersionedLRUCache:
+    """按索引版本失效的有界 LRU 缓存（线程安全）
+
+    用于问题嵌入和检索结果：索引版本不变时两者都是确定的，与答案缓存不同，
+    修改 Prompt 或更换 LLM 后仍然有效。set_version() 发现版本变化时清空全部条目。
+    命中和未命中计入 rag_retrieval_cache_total{cache=name}，用于评估容量。
+    """
+
+    def __init__(self, name: str, max_size: int):
+        """
+        Args:
+            name: 缓存名称（指标标签）
+            max_size: 最大条目数，0 表示禁用
+        """
+        self.name = name
+        self.max_size = max_size
+        self.version: Optional[int] = None
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def set_version(self, version: int) -> None:
+        """设置当前索引版本，版本变化时清空缓存"""
+        with self._lock:
+            if version != self.version and self._entries:
+                logger.info(f"索引版本 {self.version} -> {version}，清空 {self.name} 缓存（{len(self._entries)} 条）")
+                self._entries.clear()
+            self.version = version
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """查找并刷新条目的最近使用时间，未命中返回 None"""
+        if not self.max_size:
+            return None
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        RETRIEVAL_CACHE_LOOKUPS.inc(cache=self.name, result="miss" if value is None else "hit")
+        return value
+
+    def put(self, key: Hashable, value: Any, version: Optional[int] = None) -> None:
+        """写入条目，超过容量时淘汰最久未使用的条目
+
+        version 为计算该值时的索引版本，与当前版本不一致（计算期间索引已重新加载）时丢弃
+        """
+        if not self.max_size:
+            return
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        """返回缓存命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,201 @@
+"""
+紧凑片段存储模块
+片段文本和元数据与向量索引分开保存，摄取时写入 chroma_db/snapshot/：
+- texts.bin: 所有片段文本拼接成的 UTF-8 字节串（内存映射）
+- records.npy: 每个片段一条定长记录（课程序号、页码、内容类型、表格序号、文本字节范围）（内存映射）
+- chunks.json: 片段 ID、课程表和索引版本
+
+检索只返回行号，由 ChunkRecord 在访问时才从映射中解码文本、构造元数据字典：
+没有进入上下文的候选片段不会产生字符串和字典分配，常驻内存也不随元数据字典数量增长。
+"""
+import json
+import mmap
+from enum import IntEnum
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from app.config import DB_PATH
+from app.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+STORE_DIR = "snapshot"
+STORE_VERSION = 2
+
+TEXTS_FILE = "texts.bin"
+RECORDS_FILE = "records.npy"
+CHUNKS_FILE = "chunks.json"
+
+
+class ContentType(IntEnum):
+    """片段内容类型（与摄取元数据中的 content_type 对应）"""
+    TEXT = 0
+    TABLE = 1
+
+
+# 每个片段的定长记录；table_index 为 0 表示不是表格（表格序号从 1 开始）
+RECORD_DTYPE = np.dtype([
+    ("course", "<u4"),
+    ("page", "<i4"),
+    ("content_type", "u1"),
+    ("table_index", "<u2"),
+    ("start", "<u8"),
+    ("end", "<u8"),
+])
+
+
+def write_chunk_store(
+    path: Path, ids: List[str], texts: Iterable[str], metadatas: Iterable[Dict], index_version: int
+) -> None:
+    """把片段写入 path 目录（调用方负责原子替换目录）
+
+    只保存摄取产生的元数据字段: course、course_base、source_file（按课程去重存入课程表）、
+    page、content_type、table_index。
+
+    Args:
+        path: 输出目录
+        ids: 片段 ID（写入顺序即行号）
+        texts: 片段文本
+        metadatas: 片段元数据
+        index_version: 当前索引版本
+    """
+    records = np.zeros(len(ids), dtype=RECORD_DTYPE)
+    courses: List[Dict] = []
+    course_rows: Dict[str, int] = {}
+    offset = 0
+    with open(path / TEXTS_FILE, "wb") as f:
+        for row, (text, meta) in enumerate(zip(texts, metadatas)):
+            encoded = text.encode("utf-8")
+            f.write(encoded)
+            course = meta.get("course", "")
+            if course not in course_rows:
+                course_rows[course] = len(courses)
+                courses.append({
+                    "course": course,
+                    "course_base": meta.get("course_base"),
+                    "source_file": meta.get("source_file"),
+                })
+            records[row] = (
+                course_rows[course],
+                meta.get("page", -1),
+                ContentType.TABLE if meta.get("content_type") == "table" else ContentType.TEXT,
+                meta.get("table_index", 0),
+                offset,
+                offset + len(encoded),
+            )
+            offset += len(encoded)
+    np.save(path / RECORDS_FILE, records)
+    (path / CHUNKS_FILE).write_text(json.dumps({
+        "version": STORE_VERSION,
+        "index_version": index_version,
+        "ids": ids,
+        "courses": courses,
+    }, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+
+
+class ChunkRecord:
+    """一个片段的轻量视图，接口与 langchain Document 兼容（id / page_content / metadata）
+
+    只保存行号和所属存储；文本和元数据字典在首次访问时才生成并缓存。
+    """
+
+    __slots__ = ("row", "id", "_store", "_text", "_metadata")
+
+    def __init__(self, store: "ChunkStore", row: int):
+        self.row = row
+        self.id = store.ids[row]
+        self._store = store
+        self._text: Optional[str] = None
+        self._metadata: Optional[Dict] = None
+
+    @property
+    def page_content(self) -> str:
+        if self._text is None:
+            self._text = self._store.text(self.row)
+        return self._text
+
+    @property
+    def metadata(self) -> Dict:
+        if self._metadata is None:
+            self._metadata = self._store.metadata(self.row)
+        return self._metadata
+
+    def __repr__(self) -> str:
+        return f"ChunkRecord(id={self.id!r}, row={self.row})"
+
+
+class ChunkStore:
+    """内存映射的只读片段存储（线程安全）
+
+    Attributes:
+        ids: 片段 ID（按行排列）
+        courses: 课程表，每项包含 course、course_base、source_file
+        records: 定长记录数组（RECORD_DTYPE，只读映射）
+        index_version: 写入时的索引版本
+    """
+
+    def __init__(self, path: Path):
+        """
+        Args:
+            path: 存储目录
+
+        Raises:
+            ValueError: 存储格式版本不兼容时
+        """
+        chunks = json.loads((path / CHUNKS_FILE).read_text(encoding="utf-8"))
+        if chunks.get("version") != STORE_VERSION:
+            raise ValueError(f"片段存储版本 {chunks.get('version')} 不兼容")
+        self.path = path
+        self.index_version: int = chunks["index_version"]
+        self.ids: List[str] = chunks["ids"]
+        self.courses: List[Dict] = chunks["courses"]
+        self.records: np.ndarray = np.load(path / RECORDS_FILE, mmap_mode="r")
+        self._rows: Dict[str, int] = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+        with open(path / TEXTS_FILE, "rb") as f:
+            # 空文件不能映射
+            self._texts = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if f.seek(0, 2) else b""
+
+    @classmethod
+    def load(cls, db_path: str = DB_PATH) -> Optional["ChunkStore"]:
+        """打开片段存储，不存在、损坏或版本不兼容时返回 None"""
+        path = Path(db_path) / STORE_DIR
+        if not (path / CHUNKS_FILE).exists():
+            return None
+        try:
+            return cls(path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"读取片段存储失败: {e}")
+            return None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def text(self, row: int) -> str:
+        """第 row 个片段的文本（从映射中解码）"""
+        record = self.records[row]
+        return self._texts[int(record["start"]):int(record["end"])].decode("utf-8")
+
+    def metadata(self, row: int) -> Dict:
+        """第 row 个片段的元数据字典（与摄取时写入 Chroma 的字段一致）"""
+        record = self.records[row]
+        meta = dict(self.courses[int(record["course"])])
+        meta["page"] = int(record["page"])
+        if record["content_type"] == ContentType.TABLE:
+            meta["content_type"] = "table"
+            meta["table_index"] = int(record["table_index"])
+        else:
+            meta["content_type"] = "text"
+        return meta
+
+    def course_metadatas(self) -> List[Dict]:
+        """每个片段所属课程的课程表条目（共享同一批字典，不逐行构造元数据）"""
+        return [self.courses[course] for course in self.records["course"].tolist()]
+
+    def record(self, row: int) -> ChunkRecord:
+        return ChunkRecord(self, row)
+
+    def get_records(self, ids: List[str]) -> Dict[str, ChunkRecord]:
+        """按片段 ID 取回记录，不存在的 ID 不出现在结果中"""
+        return {chunk_id: ChunkRecord(self, self._rows[chunk_id]) for chunk_id in ids if chunk_id in self._rows}
@@ -16,10 +16,29 @@ PDF_FILES: List[str] = os.getenv("PDF_FILES", "MAT235Y1.pdf").split(",")
 # 数据库配置
 DB_PATH = os.getenv("CHROMA_DB_PATH", str(BASE_DIR / "chroma_db"))
 
+# 摄取配置
+# 解析 PDF 的进程数；大文件按 INGEST_PAGES_PER_TASK 页拆分为多个任务
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1)))
+INGEST_PAGES_PER_TASK = int(os.getenv("INGEST_PAGES_PER_TASK", "20"))
+# 每个嵌入/写入批次的 chunk 数
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+
 # LLM 配置
 LLM_MODEL = os.getenv("LLM_MODEL", "llama-3.3-70b-versatile")
 EMBED_MODEL = os.getenv("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# 嵌入后端: torch（sentence-transformers）/ onnx / onnx-int8（需先运行 python -m app.embeddings --export）
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+# 推理线程数，0 表示使用库的默认值
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", "0"))
+# 批量编码（摄取、批量问答）时每批的文本数
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+# ONNX 导出目录
+EMBED_ONNX_DIR = os.getenv("EMBED_ONNX_DIR", str(BASE_DIR / "models" / EMBED_MODEL.split("/")[-1]))
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
+# LLM HTTP 客户端：长连接池在所有请求间共享，避免重复 TLS 握手
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "10"))
 
 # API 配置
 API_HOST = os.getenv("API_HOST", "127.0.0.1")
@@ -29,9 +48,97 @@ API_PORT = int(os.getenv("API_PORT", "8000"))
 API_KEY = os.getenv("API_KEY", "dev-secret-key-change-in-production")
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "*").split(",")
 
+# 调试配置：为 /chat 响应添加 X-Timing 头（各阶段耗时），流式接口在 done 事件中附带耗时
+DEBUG_TIMING = os.getenv("DEBUG_TIMING", "false").lower() in ("1", "true", "yes")
+
 # 日志配置
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 LOG_FILE = os.getenv("LOG_FILE", str(BASE_DIR / "logs" / "app.log"))
+# 异步模式：日志先进入有界内存队列，由后台线程写入控制台和文件；队列满时丢弃
+LOG_ASYNC = os.getenv("LOG_ASYNC", "true").lower() in ("1", "true", "yes")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# text 或 json（每行一个 JSON 对象）
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# 日志文件轮转：size（按大小）、time（按时间）或 none
+LOG_ROTATION = os.getenv("LOG_ROTATION", "size")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "midnight")
 
 # 速率限制配置
 RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "10"))
+# memory: 每个进程独立计数；sqlite: 通过本机 SQLite 文件在多个 uvicorn worker 间共享
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH", str(BASE_DIR / "logs" / "rate_limit.sqlite3"))
+# sqlite 后端等待写锁的最长时间（秒），超时后放行请求（fail open），不让限流拖慢请求
+RATE_LIMIT_DB_TIMEOUT = float(os.getenv("RATE_LIMIT_DB_TIMEOUT", "0.1"))
+# /chat/batch 按问题数单独计费：每个客户端每小时最多提交的批量问题数（至少能容纳一个最大批次）
+BATCH_RATE_LIMIT_PER_HOUR = int(os.getenv("BATCH_RATE_LIMIT_PER_HOUR", "200"))
+
+# 并发配置
+# 检索（问题嵌入 + 向量搜索）属于 CPU 密集/阻塞操作，放入有界线程池执行，避免阻塞事件循环
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "4"))
+
+# 多 worker 共享模式（gunicorn -c gunicorn.conf.py app.main:app）
+# 开启后 API 不打开 Chroma，而是内存映射摄取时导出的只读索引快照，各 worker 通过页缓存共享；
+# 模型和索引在 gunicorn 主进程中加载一次，fork 后以写时复制方式共享
+SHARED_INDEX = os.getenv("SHARED_INDEX", "false").lower() in ("1", "true", "yes")
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "2"))
+
+# 向量检索后端
+# chroma: Chroma 的 HNSW 索引；numpy: 内存映射摄取时导出的索引快照做精确搜索（共享模式下总是使用 numpy）
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+# 导出快照时向量的存储精度: float32 / float16（内存减半）/ int8（内存为 1/4，按行量化）
+VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float32")
+
+# 批量问答配置（/chat/batch）
+# 单次请求最多的问题数，以及同时进行的 LLM 调用数
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "100"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+
+# 检索配置
+# vector: 只用向量检索；hybrid: 向量检索 + BM25 词法检索，按倒数排名融合（RRF）
+# hybrid 需显式开启：用真实嵌入模型运行 python -m benchmarks.hybrid_bench，确认 recall 不低于 vector 后再启用
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector")
+# 未识别到课程代码时的全局检索数量，以及识别到课程代码时每个课程的检索数量
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "10"))
+RETRIEVAL_K_PER_COURSE = int(os.getenv("RETRIEVAL_K_PER_COURSE", "5"))
+# RRF 平滑常数
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# 上下文组装配置
+# 发送给 LLM 的上下文 token 预算（按约 4 字符/token 估算，含来源标签）
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+# 两段上下文的词级 3-gram 包含度达到该值时视为近似重复，只保留排名靠前的一段
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.9"))
+
+# 答案缓存配置（ANSWER_CACHE_SIZE=0 相当于禁用）
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+# 语义匹配的最小余弦相似度，过低会把不同的问题当成同一个
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+
+# 问题嵌入缓存（规范化问题 -> 嵌入）和检索结果缓存（嵌入 + 课程过滤 + k -> 片段 ID）的容量，0 表示禁用
+# 两者按索引版本失效，修改 Prompt 或更换 LLM 后仍然有效
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2000"))
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "2000"))
+
+# 运行中的服务每隔多少秒检查一次摄取清单，索引版本变化（python -m app.ingest 更新了向量库）时
+# 重新加载索引并清空答案、嵌入和检索缓存，不需要重启；0 表示不检查（摄取后需重启服务）
+INDEX_RELOAD_INTERVAL = float(os.getenv("INDEX_RELOAD_INTERVAL", "10"))
+
+# 请求合并：同时进行中的相同问题（规范化问题 + 课程范围）只检索和调用 LLM 一次，其余请求共享结果
+COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "true").lower() in ("1", "true", "yes")
+
+# LLM 调度：并发上限、等待队列长度（队列满时立即返回 503 + Retry-After）和请求截止时间（秒，应小于 Nginx 的 proxy_read_timeout）
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "32"))
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "30"))
+# 上游暂时性错误（连接失败、429、5xx）的重试次数和首次退避时间（秒），连续失败多少次后熔断及熔断冷却时间（秒）
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "0.5"))
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+# 结构化事实回答：评分方案、考核权重/日期、任课教师等高频问题直接从摄取时抽取的课程事实回答，不检索、不调用 LLM
+FACT_ANSWERS = os.getenv("FACT_ANSWERS", "true").lower() in ("1", "true", "yes")
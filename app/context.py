@@ -0,0 +1,156 @@
+"""
+上下文组装模块
+把检索到的片段整理成发送给 LLM 的上下文：合并同一来源的相邻重叠片段、去除近似重复、
+按检索排名在 token 预算内填充，并为每段加上简短的来源标签
+"""
+import re
+from dataclasses import dataclass, field
+from typing import FrozenSet, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from app.config import CONTEXT_TOKEN_BUDGET, CONTEXT_DEDUP_THRESHOLD
+from app.ingest import CHUNK_OVERLAP
+
+# 粗略估算：英文文本平均约 4 个字符一个 token
+CHARS_PER_TOKEN = 4
+# 判断两个片段是否重叠时，取后一片段开头的字符数在前一片段结尾查找
+OVERLAP_PROBE_CHARS = 40
+# 上下文中段落之间的分隔
+BLOCK_SEPARATOR = "\n\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """按字符数估算 token 数（向上取整）"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+@dataclass
+class _Passage:
+    """一段上下文：一个或多个合并后的片段"""
+    text: str
+    rank: int
+    docs: List[Document] = field(default_factory=list)
+
+    @property
+    def metadata(self) -> dict:
+        return self.docs[0].metadata
+
+
+def _merge_key(doc: Document) -> Tuple:
+    """只有同一文件、同一页、同一内容块（正文或同一张表）的片段才可能相邻重叠"""
+    meta = doc.metadata
+    return meta.get("source_file"), meta.get("page"), meta.get("content_type"), meta.get("table_index")
+
+
+def _merge_overlap(first: str, second: str) -> Optional[str]:
+    """若 second 的开头与 first 的结尾重叠（分块时的 overlap），返回合并后的文本
+
+    Args:
+        first: 在前的片段
+        second: 在后的片段
+
+    Returns:
+        合并后的文本；不相邻时返回 None
+    """
+    if second in first:
+        return first
+    probe = second[:OVERLAP_PROBE_CHARS]
+    start = first.find(probe, max(0, len(first) - CHUNK_OVERLAP - len(probe)))
+    while start != -1:
+        # first 从 start 开始的结尾必须恰好是 second 的开头
+        if second.startswith(first[start:]):
+            return first[:start] + second
+        start = first.find(probe, start + 1)
+    return None
+
+
+def _shingles(text: str, size: int = 3) -> FrozenSet[Tuple[str, ...]]:
+    """规范化后的词级 n-gram 集合，用于近似重复检测"""
+    words = re.findall(r"\w+", text.lower())
+    return frozenset(tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1)))
+
+
+def source_tag(metadata: dict) -> str:
+    """简短的来源标签，例如 "[Source: MAT235Y1 p.3 table]"（页码从 1 开始）"""
+    parts = [str(metadata.get("course") or metadata.get("source_file") or "unknown")]
+    if metadata.get("page") is not None:
+        parts.append(f"p.{metadata['page'] + 1}")
+    if metadata.get("content_type") == "table":
+        parts.append("table")
+    return f"[Source: {' '.join(parts)}]"
+
+
+def assemble_context(
+    docs: List[Document],
+    budget_tokens: int = CONTEXT_TOKEN_BUDGET,
+    dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD
+) -> Tuple[str, List[Document]]:
+    """把检索结果组装成 LLM 上下文
+
+    1. 合并同一来源中首尾重叠的相邻片段，重叠部分只保留一份
+    2. 去除近似重复（词级 3-gram 包含度不低于 dedup_threshold），保留排名靠前的一段
+    3. 按检索排名（相似度顺序）依次放入，放不下的段落跳过，直到用完 token 预算；
+       排名第一的段落即使超出预算也会截断后保留
+    4. 每段前加来源标签
+
+    Args:
+        docs: 按相关度排序的检索结果
+        budget_tokens: 上下文的 token 预算（含来源标签）
+        dedup_threshold: 近似重复判定阈值，取值 0-1
+
+    Returns:
+        (上下文文本, 实际进入上下文的文档列表)
+    """
+    # 1. 合并相邻重叠片段；合并结果继续尝试与其它片段合并（例如先取到 1、3，再取到 2）
+    passages: List[_Passage] = []
+    for rank, doc in enumerate(docs):
+        passage = _Passage(text=doc.page_content, rank=rank, docs=[doc])
+        merged = True
+        while merged:
+            merged = False
+            for other in passages:
+                if _merge_key(other.docs[0]) != _merge_key(doc):
+                    continue
+                text = _merge_overlap(other.text, passage.text) or _merge_overlap(passage.text, other.text)
+                if text is not None:
+                    passages.remove(other)
+                    passage = _Passage(
+                        text=text, rank=min(rank, other.rank, passage.rank), docs=other.docs + passage.docs
+                    )
+                    merged = True
+                    break
+        passages.append(passage)
+    passages.sort(key=lambda p: p.rank)
+
+    # 2. 去除近似重复
+    unique: List[Tuple[_Passage, FrozenSet]] = []
+    for passage in passages:
+        shingles = _shingles(passage.text)
+        duplicate = any(
+            len(shingles & kept) >= dedup_threshold * min(len(shingles), len(kept))
+            for _, kept in unique
+        )
+        if not duplicate:
+            unique.append((passage, shingles))
+
+    # 3. 在预算内按排名填充
+    blocks: List[str] = []
+    used_docs: List[Document] = []
+    remaining = budget_tokens
+    for passage, _ in unique:
+        block = f"{source_tag(passage.metadata)}\n{passage.text}"
+        # 段落之间的空行也计入预算
+        cost = estimate_tokens(block) + (estimate_tokens(BLOCK_SEPARATOR) if blocks else 0)
+        if cost > remaining:
+            if blocks:
+                continue
+            block = block[:remaining * CHARS_PER_TOKEN]
+            cost = remaining
+        blocks.append(block)
+        used_docs.extend(passage.docs)
+        remaining -= cost
+        if remaining <= 0:
+            break
+
+    return BLOCK_SEPARATOR.join(blocks), used_docs
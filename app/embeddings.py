@@ -0,0 +1,217 @@
+"""
+嵌入模块
+可插拔的嵌入后端，由 EMBED_BACKEND 选择：
+- torch: sentence-transformers + PyTorch（原实现）
+- onnx: 同一模型导出的 ONNX（FP32），用 ONNX Runtime 推理
+- onnx-int8: 在 ONNX 导出基础上做动态 int8 量化
+
+ONNX 后端只依赖 onnxruntime 和 tokenizers，运行时不导入 torch，加载更快、内存更小。
+模型文件需要预先导出: python -m app.embeddings --export
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_core.embeddings import Embeddings
+
+from app.config import EMBED_MODEL, EMBED_BACKEND, EMBED_THREADS, EMBED_BATCH_SIZE, EMBED_ONNX_DIR
+from app.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+EMBED_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# 导出目录中的文件
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_INT8_MODEL_FILE = "model_int8.onnx"
+EXPORT_CONFIG_FILE = "embedding_config.json"
+
+
+class OnnxEmbeddings(Embeddings):
+    """基于 ONNX Runtime 的句向量模型（mean pooling + L2 归一化，与 sentence-transformers 一致）"""
+
+    def __init__(self, model_dir: Path, quantized: bool = False, threads: int = 0, batch_size: int = 32):
+        """
+        Args:
+            model_dir: python -m app.embeddings --export 的输出目录
+            quantized: 是否使用 int8 量化模型
+            threads: ONNX Runtime 算子内线程数，0 表示使用默认值（物理核数）
+            batch_size: embed_documents 每批编码的文本数
+
+        Raises:
+            FileNotFoundError: 模型尚未导出时
+            ValueError: 导出的模型与 EMBED_MODEL 不一致时
+        """
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        model_dir = Path(model_dir)
+        model_path = model_dir / (ONNX_INT8_MODEL_FILE if quantized else ONNX_MODEL_FILE)
+        config_path = model_dir / EXPORT_CONFIG_FILE
+        if not model_path.exists() or not config_path.exists():
+            raise FileNotFoundError(f"找不到 ONNX 模型: {model_path}，请先运行 python -m app.embeddings --export")
+
+        config = json.loads(config_path.read_text(encoding="utf-8"))
+        if config["model"] != EMBED_MODEL:
+            # 向量库中的向量由 EMBED_MODEL 生成，换模型必须重新导出并重建向量库
+            raise ValueError(f"ONNX 模型导出自 {config['model']}，与 EMBED_MODEL={EMBED_MODEL} 不一致")
+
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=config["max_length"])
+        self.tokenizer.enable_padding(pad_id=config["pad_id"])
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(
+            str(model_path), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = [node.name for node in self.session.get_inputs()]
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """编码一批文本，返回归一化后的句向量（float32）"""
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        inputs = {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {name: inputs[name] for name in self._input_names})[0]
+
+        # mean pooling：只对非 padding 位置求平均
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """按 batch_size 分批编码多个文本"""
+        vectors = [self._encode(texts[i:i + self.batch_size]) for i in range(0, len(texts), self.batch_size)]
+        return np.concatenate(vectors).tolist() if vectors else []
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+
+def create_embeddings(backend: str = EMBED_BACKEND) -> Embeddings:
+    """按配置创建嵌入模型
+
+    Args:
+        backend: torch / onnx / onnx-int8
+
+    Returns:
+        langchain Embeddings 实例
+
+    Raises:
+        ValueError: 未知的后端
+    """
+    logger.info(f"初始化嵌入模型: {EMBED_MODEL}（后端 {backend}）")
+    if backend == "torch":
+        if EMBED_THREADS:
+            import torch
+            torch.set_num_threads(EMBED_THREADS)
+        return HuggingFaceEmbeddings(
+            model_name=EMBED_MODEL,
+            model_kwargs={'device': 'cpu'},
+            encode_kwargs={'normalize_embeddings': True, 'batch_size': EMBED_BATCH_SIZE}
+        )
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxEmbeddings(
+            Path(EMBED_ONNX_DIR),
+            quantized=backend == "onnx-int8",
+            threads=EMBED_THREADS,
+            batch_size=EMBED_BATCH_SIZE
+        )
+    raise ValueError(f"未知的嵌入后端: {backend}，可选: {', '.join(EMBED_BACKENDS)}")
+
+
+def export_onnx(model_name: str = EMBED_MODEL, output_dir: str = EMBED_ONNX_DIR, quantize: bool = True) -> Path:
+    """把 sentence-transformers 模型导出为 ONNX（可选 int8 动态量化）
+
+    导出需要 torch 和 onnx，只在构建/部署时运行一次；运行时只加载导出结果。
+
+    Args:
+        model_name: sentence-transformers 模型名或本地路径
+        output_dir: 输出目录
+        quantize: 是否同时导出 int8 量化模型
+
+    Returns:
+        输出目录
+
+    Raises:
+        ValueError: 模型不是 mean pooling 时（ONNX 后端只实现了 mean pooling）
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    start = time.perf_counter()
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    model = SentenceTransformer(model_name, device="cpu")
+    pooling = model[1].get_pooling_mode_str()
+    if pooling != "mean":
+        raise ValueError(f"不支持的 pooling 方式: {pooling}（ONNX 后端只支持 mean）")
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+    tokenizer.save_pretrained(str(output_dir))
+
+    sample = tokenizer(["export sample", "a longer export sample sentence"], padding=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(sample[name] for name in input_names),
+            str(output_dir / ONNX_MODEL_FILE),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=17,
+            dynamo=False
+        )
+    logger.info(f"已导出 ONNX 模型: {output_dir / ONNX_MODEL_FILE}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(
+            str(output_dir / ONNX_MODEL_FILE), str(output_dir / ONNX_INT8_MODEL_FILE), weight_type=QuantType.QInt8
+        )
+        logger.info(f"已导出 int8 量化模型: {output_dir / ONNX_INT8_MODEL_FILE}")
+
+    config = {"model": model_name, "max_length": model.max_seq_length, "pad_id": tokenizer.pad_token_id or 0}
+    (output_dir / EXPORT_CONFIG_FILE).write_text(json.dumps(config, indent=2), encoding="utf-8")
+    logger.info(f"导出完成，耗时 {time.perf_counter() - start:.1f}s")
+    return output_dir
+
+
+def main(argv: List[str] = None) -> int:
+    """命令行入口
+
+    用法:
+        python -m app.embeddings --export                # 导出 FP32 和 int8 ONNX 模型
+        python -m app.embeddings --export --no-quantize  # 只导出 FP32
+
+    Returns:
+        进程返回码
+    """
+    parser = argparse.ArgumentParser(prog="python -m app.embeddings", description="导出 ONNX 嵌入模型")
+    parser.add_argument("--export", action="store_true", help=f"把 {EMBED_MODEL} 导出到 {EMBED_ONNX_DIR}")
+    parser.add_argument("--no-quantize", action="store_true", help="不导出 int8 量化模型")
+    args = parser.parse_args(argv)
+    if not args.export:
+        parser.print_help()
+        return 1
+    export_onnx(quantize=not args.no_quantize)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,363 @@
+"""
+结构化事实模块
+摄取时从课程大纲的表格（以及少数固定版式的文本行）中抽取结构化事实，按课程和事实类型索引：
+- assessment: 考核项 -> 权重 / 日期（评分表、考试日期表、"• Final Exam (40%)" 列表、"6% Pre-class 52% Term Tests" 网格）
+- instructor: 教师 -> 讲课班级、时间、答疑时间（带 Instructor 列的表格）
+- textbook: 教材（带 Textbook / Book 列的表格）
+
+事实随解析结果写入摄取清单，API 启动时从清单构建只读索引。请求路径上用正则识别少数高频问题
+（评分方案、某项考核的权重或日期、任课教师、答疑时间、教材），能从索引直接回答时不检索、不调用 LLM，
+否则回退到 RAG。
+"""
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.lexical import STOPWORDS
+
+# 事实类型
+ASSESSMENT, INSTRUCTOR, TEXTBOOK = "assessment", "instructor", "textbook"
+
+# 权重单元格，例如 "25%"、"2% each"
+_WEIGHT_CELL = re.compile(r"^\d+(?:\.\d+)?\s*%")
+# 表头列名
+_DATE_HEADER = re.compile(r"^(?:dates?|due|deadlines?|when)\b|\bdates?$", re.IGNORECASE)
+_WEIGHT_HEADER = re.compile(r"^(?:weights?|weighting|worth|percent(?:age)?|%)", re.IGNORECASE)
+_INSTRUCTOR_HEADER = re.compile(r"^(?:instructor|professor|lecturer|teacher)", re.IGNORECASE)
+_TEXTBOOK_HEADER = re.compile(r"text\s*book|^book|^title", re.IGNORECASE)
+_OFFICE_HOURS_HEADER = re.compile(r"office", re.IGNORECASE)
+# 文本中的评分列表："• 2 tests (cumulative) (40%): drop the lowest score"
+_BULLET_WEIGHT = re.compile(r"^[•\-*]\s*(.+?)\s*\((\d+(?:\.\d+)?\s*%)\)\s*(?::\s*(.+))?$")
+# 文本中的评分网格："6% Pre-class 52% Term Tests"（整行只由 "权重 名称" 组成）
+_GRID_LINE = re.compile(r"^(?:\d+(?:\.\d+)?%\s+[A-Za-z][A-Za-z\- ]*?\s*)+$")
+_GRID_ITEM = re.compile(r"(\d+(?:\.\d+)?%)\s+([A-Za-z][A-Za-z\- ]*?)(?=\s+\d+(?:\.\d+)?%|\s*$)")
+
+# 问题意图，按顺序匹配
+_INTENTS: Tuple[Tuple[str, re.Pattern], ...] = (
+    ("grading", re.compile(
+        r"grading (?:scheme|breakdown|policy)|marking scheme|(?:mark|grade) (?:breakdown|distribution)"
+        r"|how (?:is|are|will) .*\b(?:graded|marked|evaluated|assessed)\b"
+    )),
+    ("office_hours", re.compile(r"\boffice hours?\b")),
+    ("textbook", re.compile(r"\btext ?books?\b|\brequired (?:book|text)s?\b")),
+    ("instructor", re.compile(
+        r"\bwho\b.*\b(?:teach(?:es|ing)?|instructors?|professors?|profs?|lecturers?|coordinator)\b"
+        r"|\b(?:which|what) (?:instructor|professor|prof|lecturer)s?\b"
+    )),
+    ("weight", re.compile(r"\bworth\b|\bweigh(?:t|ts|ted|ting)?\b|\bpercent(?:age)?\b|%|\bcounts? (?:for|towards?)\b")),
+    ("date", re.compile(r"\bwhen\b|\bdates?\b|\bdue\b|\bdeadlines?\b")),
+)
+# 看起来属于上述意图、但事实索引答不了的问题（政策、时长、数量、联系方式等）直接交给 RAG
+_EXCLUDED = re.compile(
+    r"\b(?:miss(?:ed|ing)?|late|drop|defer(?:red)?|accommodations?|reread|regrade|calculators?|e-?mail|contact"
+    r"|allowed|permitted|policy|why|how (?:many|long)|final (?:course )?(?:grade|mark)s?)\b"
+)
+# 讲课班级，例如 L0201、LEC0101、lec 5101
+_SECTION = re.compile(r"\b(?:lec|l)\s?(\d{4})\b")
+
+# 考核名称的同义词（在去掉复数后比较）
+_SYNONYMS = {"midterm": "test", "tt": "test", "pca": "preclass", "exams": "exam"}
+_NAME_STOPWORDS = STOPWORDS | {"each", "much", "worth", "weight", "weighted", "percent", "percentage", "due"}
+
+
+@dataclass
+class FactAnswer:
+    """事实索引给出的答案"""
+    intent: str
+    answer: str
+    sources: List[Dict]
+
+
+def _clean(cell: Optional[str]) -> str:
+    """单元格文本：合并换行和多余空白"""
+    return " ".join(str(cell).split()) if cell else ""
+
+
+def _fact(kind: str, name: str, attrs: Dict[str, str], metadata: Dict) -> Dict:
+    return {
+        "course": metadata["course_base"],
+        "kind": kind,
+        "name": name,
+        "attrs": {key: value for key, value in attrs.items() if value},
+        "source": {
+            "course": metadata["course"],
+            "source_file": metadata["source_file"],
+            "page": metadata["page"],
+            "content_type": metadata["content_type"],
+        },
+    }
+
+
+def _has_header(first_row: List[str]) -> bool:
+    """第一行是否为表头：每个单元格都非空，且不包含权重"""
+    return all(first_row) and not any(_WEIGHT_CELL.match(cell) for cell in first_row)
+
+
+def _weight_column(rows: List[List[str]]) -> Optional[int]:
+    """找出至少一半非空单元格是权重的列"""
+    for col in range(max(len(row) for row in rows)):
+        cells = [row[col] for row in rows if col < len(row) and row[col]]
+        if cells and sum(1 for cell in cells if _WEIGHT_CELL.match(cell)) * 2 >= len(cells):
+            return col
+    return None
+
+
+def _merge_continuations(rows: List[List[str]], key_col: int) -> List[List[str]]:
+    """合并续行：关键列为空的行（跨行合并的单元格）并入上一行，或继承上一行的关键列"""
+    merged: List[List[str]] = []
+    for row in rows:
+        if row[key_col] or not merged:
+            merged.append(list(row))
+            continue
+        previous = merged[-1]
+        # 续行只在个别列有内容（例如第二个考试时间）：追加到上一行
+        filled = [col for col, cell in enumerate(row) if cell]
+        if len(filled) == 1:
+            col = filled[0]
+            previous[col] = f"{previous[col]}; {row[col]}" if previous[col] else row[col]
+        else:
+            # 独立的一行（例如同一位教师的另一个班级）：继承关键列
+            merged.append([previous[key_col] if col == key_col else cell for col, cell in enumerate(row)])
+    return merged
+
+
+def extract_table_facts(table: List[List[Optional[str]]], metadata: Dict) -> List[Dict]:
+    """从 pdfplumber 提取的一个表格中抽取事实
+
+    支持三种表格：带权重列的评分表（可以没有表头）、带日期列的考核日期表、带教师/教材列的表格，
+    其它表格（课程日历、计算器清单等）返回空列表。
+
+    Args:
+        table: 表格行列表
+        metadata: 表格所在片段的元数据（course、course_base、source_file、page、content_type）
+
+    Returns:
+        事实列表
+    """
+    rows = [[_clean(cell) for cell in row] for row in table if row and any(row)]
+    if len(rows) < 2:
+        return []
+    width = max(len(row) for row in rows)
+    rows = [row + [""] * (width - len(row)) for row in rows]
+    header = rows[0] if _has_header(rows[0]) else None
+    body = rows[1:] if header else rows
+
+    def labelled(row: List[str], skip: Set[int]) -> Dict[str, str]:
+        return {
+            (header[col] if header else f"column {col + 1}"): cell
+            for col, cell in enumerate(row) if col not in skip and cell
+        }
+
+    # 1. 教师 / 教材表：按表头识别
+    if header:
+        for kind, pattern in ((INSTRUCTOR, _INSTRUCTOR_HEADER), (TEXTBOOK, _TEXTBOOK_HEADER)):
+            key_col = next((col for col, name in enumerate(header) if pattern.search(name)), None)
+            if key_col is None:
+                continue
+            return [
+                _fact(kind, row[key_col], labelled(row, {key_col}), metadata)
+                for row in _merge_continuations(body, key_col) if row[key_col]
+            ]
+
+    # 2. 评分表（权重列）/ 考核日期表（日期列），第一列非权重的文本列为考核名称
+    weight_col = _weight_column(body)
+    if weight_col is None and header:
+        weight_col = next((col for col, name in enumerate(header) if _WEIGHT_HEADER.search(name)), None)
+    date_col = next((col for col, name in enumerate(header) if _DATE_HEADER.search(name)), None) if header else None
+    if weight_col is None and date_col is None:
+        return []
+    name_col = next((col for col in range(width) if col not in (weight_col, date_col)), None)
+    if name_col is None:
+        return []
+    if date_col is None and not header:
+        # 没有表头的评分表：名称和权重之外的第一个文本列通常是日期或安排（例如 "Scheduled by FAS"）
+        date_col = next((col for col in range(width) if col not in (weight_col, name_col)), None)
+
+    facts = []
+    for row in _merge_continuations(body, name_col):
+        if not row[name_col]:
+            continue
+        attrs = {
+            "weight": row[weight_col] if weight_col is not None else "",
+            "date": row[date_col] if date_col is not None else "",
+        }
+        notes = labelled(row, {name_col, weight_col, date_col})
+        attrs["notes"] = "; ".join(f"{label}: {value}" for label, value in notes.items()) if header else ""
+        facts.append(_fact(ASSESSMENT, row[name_col], attrs, metadata))
+    return [fact for fact in facts if "weight" in fact["attrs"] or "date" in fact["attrs"]]
+
+
+def extract_text_facts(text: str, metadata: Dict) -> List[Dict]:
+    """从页面文本中抽取固定版式的评分列表（"• Final Exam (cumulative) (40%)"）和评分网格（"6% Pre-class 52% Term Tests"）
+
+    Args:
+        text: 页面文本（不含表格区域）
+        metadata: 页面文本片段的元数据
+
+    Returns:
+        考核项事实列表
+    """
+    facts = []
+    for line in text.splitlines():
+        line = line.strip()
+        match = _BULLET_WEIGHT.match(line)
+        if match:
+            name, weight, notes = match.groups()
+            facts.append(_fact(ASSESSMENT, name, {"weight": weight, "notes": notes or ""}, metadata))
+        elif _GRID_LINE.match(line) and len(_GRID_ITEM.findall(line)) >= 2:
+            for weight, name in _GRID_ITEM.findall(line):
+                facts.append(_fact(ASSESSMENT, name.strip(), {"weight": weight}, metadata))
+    return facts
+
+
+def _normalize_token(token: str) -> str:
+    if token.endswith("zzes"):
+        token = token[:-3]
+    elif token.endswith("ies"):
+        token = token[:-3] + "y"
+    elif token.endswith("s") and not token.endswith("ss") and len(token) > 3:
+        token = token[:-1]
+    return _SYNONYMS.get(token, token)
+
+
+def name_tokens(text: str) -> Set[str]:
+    """考核名称 / 问题的比较词项：去掉括号注释、连字符、停用词，复数变单数并替换同义词"""
+    text = re.sub(r"\([^)]*\)", " ", text.lower()).replace("-", "")
+    tokens = re.findall(r"[a-z0-9]+", text)
+    # 名称开头的数量（"10 tutorial work"、"2 tests"）不是名称的一部分
+    if len(tokens) > 1 and tokens[0].isdigit():
+        tokens = tokens[1:]
+    return {_normalize_token(token) for token in tokens if token not in _NAME_STOPWORDS}
+
+
+def _display_name(name: str) -> str:
+    """去掉名称中的脚注标记，例如 "Midterm (*See note below*)" -> "Midterm" """
+    return re.sub(r"\s*\(\*[^)]*\*\)", "", name).strip()
+
+
+class FactIndex:
+    """课程事实索引（只读，线程安全）"""
+
+    def __init__(self, facts: Iterable[Dict]):
+        self._facts: Dict[str, Dict[str, List[Dict]]] = {}
+        for fact in facts:
+            self._facts.setdefault(fact["course"], {}).setdefault(fact["kind"], []).append(fact)
+
+    @classmethod
+    def from_manifest(cls, manifest: Dict) -> "FactIndex":
+        """从摄取清单中各文件的事实构建索引（旧版解析器摄取的文件没有事实）"""
+        return cls(fact for entry in manifest["files"].values() for fact in entry.get("facts", []))
+
+    def __len__(self) -> int:
+        return sum(len(facts) for kinds in self._facts.values() for facts in kinds.values())
+
+    def counts(self) -> Dict[str, int]:
+        """每个课程的事实数量"""
+        return {course: sum(len(facts) for facts in kinds.values()) for course, kinds in self._facts.items()}
+
+    def answer(self, question: str, course_codes: List[str]) -> Optional[FactAnswer]:
+        """尝试直接从事实索引回答问题
+
+        只处理明确提到一门课程、意图可识别且索引中有对应事实的问题，其余返回 None（回退到 RAG）。
+
+        Args:
+            question: 用户问题
+            course_codes: 问题中的基础课程代码
+
+        Returns:
+            事实答案，无法回答时返回 None
+        """
+        if len(course_codes) != 1 or course_codes[0] not in self._facts:
+            return None
+        text = question.lower()
+        if _EXCLUDED.search(text):
+            return None
+        intent = next((name for name, pattern in _INTENTS if pattern.search(text)), None)
+        if intent is None:
+            return None
+        facts = self._facts[course_codes[0]]
+
+        if intent == "grading":
+            selected = [fact for fact in facts.get(ASSESSMENT, []) if "weight" in fact["attrs"]]
+        elif intent in ("weight", "date"):
+            candidates = [fact for fact in facts.get(ASSESSMENT, []) if intent in fact["attrs"]]
+            selected = self._match_names(question, course_codes[0], candidates)
+        elif intent == "textbook":
+            selected = facts.get(TEXTBOOK, [])
+        else:
+            selected = self._match_staff(text, intent, facts.get(INSTRUCTOR, []))
+        if not selected:
+            return None
+        return FactAnswer(intent=intent, answer=self._format(intent, selected), sources=self._sources(selected))
+
+    @staticmethod
+    def _match_names(question: str, course: str, facts: List[Dict]) -> List[Dict]:
+        """按问题与考核名称的词项重合度选出最匹配的考核项（并列时全部返回）"""
+        asked = name_tokens(question) - {course.lower()}
+        best: List[Dict] = []
+        best_score: Tuple[int, float] = (0, 0.0)
+        for fact in facts:
+            tokens = name_tokens(fact["name"])
+            matched = tokens & asked
+            # 只重合数字（例如 "1"）不算匹配
+            if not tokens or not any(not token.isdigit() for token in matched):
+                continue
+            score = (len(matched), len(matched) / len(tokens))
+            if score > best_score:
+                best, best_score = [fact], score
+            elif score == best_score:
+                best.append(fact)
+        return best
+
+    @staticmethod
+    def _match_staff(text: str, intent: str, facts: List[Dict]) -> List[Dict]:
+        """筛选教师事实：答疑时间问题只保留有答疑时间的行，可按讲课班级或课程协调人进一步筛选"""
+        if intent == "office_hours":
+            facts = [fact for fact in facts if any(_OFFICE_HOURS_HEADER.search(key) for key in fact["attrs"])]
+        section = _SECTION.search(text)
+        if section:
+            facts = [fact for fact in facts if any(section.group(1) in value for value in fact["attrs"].values())]
+        if "coordinator" in text:
+            facts = [fact for fact in facts if "coordinator" in fact["name"].lower()]
+        return facts
+
+    @staticmethod
+    def _format(intent: str, facts: List[Dict]) -> str:
+        course = facts[0]["source"]["course"]
+        titles = {
+            "grading": f"Grading scheme for {course}:",
+            "weight": f"Assessment weight in {course}:",
+            "date": f"Assessment dates in {course}:",
+            "instructor": f"Instructors for {course}:",
+            "office_hours": f"Office hours for {course}:",
+            "textbook": f"Textbooks for {course}:",
+        }
+        lines = [titles[intent]]
+        for fact in facts:
+            attrs = fact["attrs"]
+            if intent in ("grading", "weight"):
+                value = attrs["weight"] + (f" ({attrs['notes']})" if attrs.get("notes") else "")
+            elif intent == "date":
+                value = attrs["date"] + (f" ({attrs['notes']})" if attrs.get("notes") else "")
+            elif intent == "office_hours":
+                value = "; ".join(v for k, v in attrs.items() if _OFFICE_HOURS_HEADER.search(k))
+            else:
+                value = "; ".join(f"{k}: {v}" for k, v in attrs.items())
+            lines.append(f"- {_display_name(fact['name'])}: {value}" if value else f"- {_display_name(fact['name'])}")
+        pages = sorted({(fact["source"]["course"], fact["source"]["page"]) for fact in facts}, key=lambda s: s[1])
+        lines.append("")
+        lines.append("Source: " + ", ".join(f"{name} (page {page + 1})" for name, page in pages))
+        return "\n".join(lines)
+
+    @staticmethod
+    def _sources(facts: List[Dict]) -> List[Dict]:
+        """来源元数据（与 RAG 答案的 sources 格式相同，按出现顺序去重）"""
+        sources = []
+        seen = set()
+        for fact in facts:
+            source = fact["source"]
+            key = (source["course"], source["page"], source["content_type"])
+            if key not in seen:
+                seen.add(key)
+                sources.append(dict(source))
+        return sources
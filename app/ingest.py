@@ -0,0 +1,665 @@
+"""
+文档摄取模块
+单遍解析 PDF（文本 + 表格），并基于内容哈希清单增量同步到向量库、BM25 索引和只读索引快照；
+解析时同时抽取结构化课程事实（评分、考试日期、教师等），随清单保存
+离线运行: python -m app.ingest（API 进程只读取已构建的向量库）
+"""
+import argparse
+import fcntl
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import pdfplumber
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.config import (
+    PDF_DIR, PDF_FILES, DB_PATH, INGEST_WORKERS, INGEST_BATCH_SIZE, INGEST_PAGES_PER_TASK, VECTOR_DTYPE
+)
+from app.embeddings import create_embeddings
+from app.facts import extract_table_facts, extract_text_facts
+from app.lexical import BM25Index, build_lexical_index
+from app.logger import setup_logger
+from app.snapshot import IndexSnapshot, export_snapshot
+
+logger = setup_logger(__name__)
+
+# 清单文件：记录每个 PDF 的内容哈希、大小和修改时间，以及对应的 chunk ID
+MANIFEST_FILE = "ingest_manifest.json"
+MANIFEST_VERSION = 1
+
+# 摄取互斥锁文件（位于向量库目录中）
+INGEST_LOCK_FILE = ".ingest.lock"
+
+# 解析器版本：解析逻辑变化时递增，已摄取的文件会被重新解析（3: 解析结果包含结构化事实）
+EXTRACTOR_VERSION = 3
+
+# 分块参数
+CHUNK_SIZE = 1500  # 增加 chunk_size 以更好地保留表格
+CHUNK_OVERLAP = 300
+
+# 字符水平间距容差：默认值 3 会把部分 PDF 中的单词粘连在一起
+TEXT_X_TOLERANCE = 1.5
+
+
+def normalize_course_code(course_name: str) -> Optional[str]:
+    """将文件名形式的课程名规范化为基础课程代码
+
+    例如 MAT235Y1 -> MAT235，STA237H1 -> STA237
+
+    Args:
+        course_name: 课程/文档名（通常是 PDF 文件名去掉后缀）
+
+    Returns:
+        基础课程代码（大写），无法识别时返回 None
+    """
+    match = re.match(r'([A-Z]{3}\d{3})', course_name.upper())
+    return match.group(1) if match else None
+
+
+def file_stat(path: Path) -> Tuple[int, int]:
+    """返回文件的 (大小, 修改时间 ns)，用于在不读取内容的情况下判断文件是否可能变化"""
+    stat = path.stat()
+    return stat.st_size, stat.st_mtime_ns
+
+
+def file_sha256(path: Path) -> str:
+    """计算文件内容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _format_table(page_num: int, table_idx: int, table: List[List[Optional[str]]]) -> str:
+    """将 pdfplumber 提取的表格格式化为文本
+
+    Args:
+        page_num: 页码（从 1 开始）
+        table_idx: 页内表格序号（从 1 开始）
+        table: 表格行列表，第一行视为表头
+
+    Returns:
+        格式化的表格文本
+    """
+    table_text = f"\n[Table from Page {page_num}, Table {table_idx}]\n"
+
+    # 处理表头
+    if table[0]:
+        header = " | ".join([str(cell) if cell else "" for cell in table[0]])
+        table_text += header + "\n"
+        table_text += "-" * len(header) + "\n"
+
+    # 处理表格内容
+    for row in table[1:]:
+        if row:
+            row_text = " | ".join([str(cell) if cell else "" for cell in row])
+            table_text += row_text + "\n"
+
+    return table_text
+
+
+def _outside_bboxes(bboxes: List[Tuple[float, float, float, float]]):
+    """返回 pdfplumber 对象过滤函数：丢弃中心点落在任一表格区域内的字符"""
+    def keep(obj) -> bool:
+        if obj.get("object_type") != "char":
+            return True
+        cx = (obj["x0"] + obj["x1"]) / 2
+        cy = (obj["top"] + obj["bottom"]) / 2
+        return not any(x0 <= cx <= x1 and top <= cy <= bottom for x0, top, x1, bottom in bboxes)
+    return keep
+
+
+def extract_page(page) -> Tuple[str, List[List[List[Optional[str]]]]]:
+    """一次布局分析同时得到页面的非表格文本和表格
+
+    表格区域内的文字只出现在表格中，不再重复出现在页面文本里。
+
+    Args:
+        page: pdfplumber 页面对象
+
+    Returns:
+        (非表格文本, 表格列表)
+    """
+    found = page.find_tables()
+    tables = [table.extract(x_tolerance=TEXT_X_TOLERANCE) for table in found]
+    if found:
+        page = page.filter(_outside_bboxes([table.bbox for table in found]))
+    text = page.extract_text(x_tolerance=TEXT_X_TOLERANCE) or ""
+    return text, [table for table in tables if table]
+
+
+def count_pdf_pages(pdf_path: Path) -> int:
+    """返回 PDF 页数（只读取页目录，不解析内容）"""
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+
+def parse_pdf_pages(pdf_path: Path, start: int = 0, end: Optional[int] = None) -> List[Document]:
+    """单遍解析 PDF 指定页范围的文本和表格并分块，为每个片段添加元数据
+
+    Args:
+        pdf_path: PDF 文件路径
+        start: 起始页（从 0 开始，包含）
+        end: 结束页（不包含），None 表示到最后一页
+
+    Returns:
+        分块后的文档列表
+    """
+    return parse_pdf_pages_with_facts(pdf_path, start, end)[0]
+
+
+def parse_pdf_pages_with_facts(
+    pdf_path: Path, start: int = 0, end: Optional[int] = None
+) -> Tuple[List[Document], List[Dict]]:
+    """单遍解析 PDF 指定页范围，返回分块后的文档和抽取的结构化事实
+
+    每页只打开、分析一次：表格格式化为独立文档，页面文本去掉表格区域的文字，
+    避免同一内容被嵌入两次；结构化事实从同一次提取的表格行和页面文本中抽取。
+    该函数是纯 CPU 计算且可被 pickle，摄取时在进程池中并行执行。
+
+    Args:
+        pdf_path: PDF 文件路径
+        start: 起始页（从 0 开始，包含）
+        end: 结束页（不包含），None 表示到最后一页
+
+    Returns:
+        (分块后的文档列表, 事实列表)
+    """
+    pdf_path = Path(pdf_path)
+    pdf_file = pdf_path.name
+    # 从文件名提取课程信息（例如：MAT235Y.pdf -> MAT235Y）
+    course_name = pdf_path.stem  # 去掉 .pdf 后缀
+    course_base = normalize_course_code(course_name) or course_name
+    base_metadata = {"source_file": pdf_file, "course": course_name, "course_base": course_base}
+
+    docs: List[Document] = []
+    facts: List[Dict] = []
+    with pdfplumber.open(pdf_path) as pdf:
+        end = len(pdf.pages) if end is None else min(end, len(pdf.pages))
+        for page_index in range(start, end):
+            page = pdf.pages[page_index]
+            text, tables = extract_page(page)
+            # 释放该页的布局缓存，控制大文件的内存占用
+            page.close()
+
+            if text.strip():
+                metadata = {**base_metadata, "page": page_index, "content_type": "text"}
+                docs.append(Document(page_content=text, metadata=metadata))
+                facts.extend(extract_text_facts(text, metadata))
+            if tables:
+                logger.debug(f"在 {pdf_file} 第 {page_index + 1} 页找到 {len(tables)} 个表格")
+            for table_idx, table in enumerate(tables, start=1):
+                metadata = {**base_metadata, "page": page_index, "content_type": "table", "table_index": table_idx}
+                docs.append(Document(page_content=_format_table(page_index + 1, table_idx, table), metadata=metadata))
+                facts.extend(extract_table_facts(table, metadata))
+
+    logger.debug(f"从 {pdf_file} 解析了第 {start + 1}-{end} 页")
+
+    # 分割文档（文本和表格），分割后的片段保留原文档的元数据
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP
+    )
+    return text_splitter.split_documents(docs), facts
+
+
+def load_pdf_documents(pdf_path: Path) -> List[Document]:
+    """解析整个 PDF（文本 + 表格）并分块
+
+    Args:
+        pdf_path: PDF 文件路径
+
+    Returns:
+        分块后的文档列表
+    """
+    splits = parse_pdf_pages(pdf_path)
+    logger.info(f"文档 {pdf_path.name} 处理完成：{len(splits)} 个片段（包含表格）")
+    return splits
+
+
+# --- 清单 ---
+def _manifest_path(db_path: str) -> Path:
+    return Path(db_path) / MANIFEST_FILE
+
+
+def _empty_manifest() -> Dict:
+    return {"version": MANIFEST_VERSION, "index_version": 0, "files": {}}
+
+
+def load_manifest(db_path: str = DB_PATH) -> Dict:
+    """读取摄取清单，不存在或损坏时返回空清单"""
+    path = _manifest_path(db_path)
+    if not path.exists():
+        return _empty_manifest()
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+        if manifest.get("version") != MANIFEST_VERSION:
+            logger.warning(f"清单版本 {manifest.get('version')} 不兼容，将重新摄取")
+            return _empty_manifest()
+        return manifest
+    except (OSError, ValueError) as e:
+        logger.warning(f"读取清单失败，将重新摄取: {e}")
+        return _empty_manifest()
+
+
+def save_manifest(manifest: Dict, db_path: str = DB_PATH) -> None:
+    """原子写入摄取清单（先写临时文件再替换）"""
+    path = _manifest_path(db_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def ingest_lock(db_path: str = DB_PATH) -> Iterator[None]:
+    """摄取互斥锁：同一向量库同时只允许一个进程写入
+
+    多个容器或部署脚本同时启动摄取时，后来者阻塞等待，拿到锁后再读取清单，
+    通常会发现向量库已是最新而直接返回，而不是同时写入同一个 chroma_db。
+    """
+    path = Path(db_path)
+    path.mkdir(parents=True, exist_ok=True)
+    with open(path / INGEST_LOCK_FILE, "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            logger.info("另一个摄取进程正在写入向量库，等待其完成...")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def ingest_running(db_path: str = DB_PATH) -> bool:
+    """是否有摄取进程正持有摄取锁（只读检查，不创建锁文件）
+
+    API 进程据此避免在摄取中途（清单已更新、BM25 索引和快照尚未导出）重新加载索引。
+    """
+    path = Path(db_path) / INGEST_LOCK_FILE
+    if not path.exists():
+        return False
+    with open(path) as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return False
+
+
+def verify_index(vector_store: Chroma, manifest: Dict) -> bool:
+    """校验向量库与清单是否一致
+
+    删除清单中没有记录的孤立 chunk（例如摄取中断时已写入的批次），
+    检查清单中的每个 ID 是否存在，并做一次探测查询以发现损坏的 HNSW 段文件。
+
+    Returns:
+        一致（或清理孤立 chunk 后一致）时返回 True
+    """
+    expected_ids = {chunk_id for entry in manifest["files"].values() for chunk_id in entry["chunk_ids"]}
+    try:
+        stored_ids = set(vector_store.get(include=[])["ids"])
+        missing = expected_ids - stored_ids
+        if missing:
+            logger.warning(f"清单中有 {len(missing)} 个片段在向量库中缺失")
+            return False
+
+        orphans = stored_ids - expected_ids
+        if orphans:
+            logger.warning(f"删除 {len(orphans)} 个清单中未记录的孤立片段")
+            vector_store.delete(ids=list(orphans))
+
+        if expected_ids:
+            # 探测查询：确认向量索引可读
+            probe = vector_store.get(ids=[next(iter(expected_ids))], include=["embeddings"])
+            vector_store.similarity_search_by_vector(list(probe["embeddings"][0]), k=1)
+        return True
+    except Exception as e:
+        logger.warning(f"向量库完整性校验失败: {e}")
+        return False
+
+
+def is_unchanged(entry: Optional[Dict], pdf_path: Path) -> bool:
+    """清单条目是否仍对应文件的当前内容（同一解析器版本、内容未变）
+
+    大小和修改时间与清单记录一致时直接视为未变化，不读取文件；
+    不一致（或旧清单没有记录）时再比较内容哈希，例如文件只是被 touch 或重新拷贝。
+    """
+    if not entry or entry.get("extractor") != EXTRACTOR_VERSION:
+        return False
+    if [entry.get("size"), entry.get("mtime_ns")] == list(file_stat(pdf_path)):
+        return True
+    return entry["sha256"] == file_sha256(pdf_path)
+
+
+def stale_files(manifest: Dict, pdf_files: List[str] = PDF_FILES, pdf_dir: Path = PDF_DIR) -> List[str]:
+    """找出清单中已过期的文档（只读，不修改向量库）
+
+    Returns:
+        需要重新摄取（新增、内容变化、解析器版本变化）或需要删除的文件名列表
+    """
+    files = manifest["files"]
+    stale = [name for name in files if name not in pdf_files]
+    for pdf_file in pdf_files:
+        pdf_path = pdf_dir / pdf_file
+        if pdf_path.exists() and not is_unchanged(files.get(pdf_file), pdf_path):
+            stale.append(pdf_file)
+    return stale
+
+
+class _ParseTask(NamedTuple):
+    """一个解析任务：某个 PDF 的一段页范围"""
+    pdf_file: str
+    pdf_path: Path
+    sha256: str
+    start: int
+    end: int
+
+
+def _plan_parse_tasks(pdf_file: str, pdf_path: Path, sha256: str) -> List[_ParseTask]:
+    """将 PDF 按页范围拆分为解析任务，大文件拆成多个任务以便跨核并行"""
+    page_count = count_pdf_pages(pdf_path)
+    step = max(1, INGEST_PAGES_PER_TASK)
+    return [
+        _ParseTask(pdf_file, pdf_path, sha256, start, min(start + step, page_count))
+        for start in range(0, max(page_count, 1), step)
+    ]
+
+
+def _run_parse_tasks(tasks: List[_ParseTask], workers: int) -> Iterator[Tuple[_ParseTask, Any]]:
+    """执行解析任务，按完成顺序返回 (任务, (文档列表, 事实列表) 或异常)
+
+    workers > 1 时使用进程池并行解析；子进程使用 spawn 启动，
+    避免 fork 已加载嵌入模型（及其线程池）的父进程。
+    """
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            try:
+                yield task, parse_pdf_pages_with_facts(task.pdf_path, task.start, task.end)
+            except Exception as e:
+                yield task, e
+        return
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=context) as pool:
+        futures = {
+            pool.submit(parse_pdf_pages_with_facts, task.pdf_path, task.start, task.end): task
+            for task in tasks
+        }
+        for future in as_completed(futures):
+            task = futures[future]
+            try:
+                yield task, future.result()
+            except Exception as e:
+                yield task, e
+
+
+def _peak_rss_mb() -> Tuple[float, float]:
+    """返回 (本进程, 已结束子进程) 的峰值常驻内存（MB）"""
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return self_kb / 1024, children_kb / 1024
+
+
+def sync_vector_store(
+    vector_store: Chroma,
+    pdf_files: List[str] = PDF_FILES,
+    pdf_dir: Path = PDF_DIR,
+    db_path: str = DB_PATH,
+    workers: int = INGEST_WORKERS,
+    batch_size: int = INGEST_BATCH_SIZE
+) -> bool:
+    """根据内容哈希清单增量同步 PDF 到向量库
+
+    - 新增、内容变化或由旧版解析器摄取的 PDF：重新解析并嵌入，删除旧 chunk
+    - 从 PDF_FILES 中移除的 PDF：删除其 chunk
+    - 清单与向量库不一致（例如半写入的 chroma_db）：清空后全量重建
+
+    摄取是分阶段的流水线：进程池按文件/页范围并行解析，解析结果按完成顺序
+    流入大小为 batch_size 的嵌入批次，每批嵌入后立即批量写入 Chroma。
+
+    Args:
+        vector_store: 已打开的 Chroma 向量库
+        pdf_files: 需要摄取的 PDF 文件名列表
+        pdf_dir: PDF 所在目录
+        db_path: 向量库目录（清单保存在其中）
+        workers: 解析进程数
+        batch_size: 每个嵌入/写入批次的 chunk 数
+
+    Returns:
+        向量库内容是否发生变化
+
+    Raises:
+        FileNotFoundError: 同步后向量库中没有任何文档时
+    """
+    start_time = time.perf_counter()
+    manifest = load_manifest(db_path)
+    changed = False
+    # 只更新了文件大小/修改时间记录，向量库内容不变
+    touched = False
+
+    # 1. 完整性校验，不一致时全量重建
+    if not verify_index(vector_store, manifest):
+        logger.warning("向量库与清单不一致，清空后全量重建")
+        vector_store.reset_collection()
+        manifest["files"] = {}
+        changed = True
+
+    files = manifest["files"]
+
+    # 2. 删除已移除文件的 chunk
+    for pdf_file in [name for name in files if name not in pdf_files]:
+        logger.info(f"文档 {pdf_file} 已移除，删除 {len(files[pdf_file]['chunk_ids'])} 个片段")
+        if files[pdf_file]["chunk_ids"]:
+            vector_store.delete(ids=files[pdf_file]["chunk_ids"])
+        del files[pdf_file]
+        changed = True
+
+    # 3. 找出新增或变化的文件，规划解析任务
+    tasks: List[_ParseTask] = []
+    pending: Dict[str, Dict] = {}
+    for pdf_file in pdf_files:
+        pdf_path = pdf_dir / pdf_file
+        if not pdf_path.exists():
+            logger.warning(f"找不到文件: {pdf_path}")
+            continue
+
+        entry = files.get(pdf_file)
+        # 先取大小和修改时间再计算哈希：哈希期间文件被修改时，下次同步会重新比较哈希
+        stat = file_stat(pdf_path)
+        if is_unchanged(entry, pdf_path):
+            logger.debug(f"文档 {pdf_file} 未变化，跳过")
+            if [entry.get("size"), entry.get("mtime_ns")] != list(stat):
+                # 内容相同但大小/修改时间与清单不同（touch、重新拷贝）：更新记录，下次启动不必再计算哈希
+                entry["size"], entry["mtime_ns"] = stat
+                touched = True
+            continue
+        sha256 = file_sha256(pdf_path)
+
+        try:
+            file_tasks = _plan_parse_tasks(pdf_file, pdf_path, sha256)
+        except Exception as e:
+            logger.error(f"处理文档 {pdf_file} 时出错: {str(e)}", exc_info=True)
+            continue
+        tasks.extend(file_tasks)
+        pending[pdf_file] = {
+            "sha256": sha256,
+            "stat": stat,
+            "old_ids": entry["chunk_ids"] if entry else [],
+            "remaining": len(file_tasks),
+            "chunk_ids": [],
+            "facts": [],
+            "failed": False,
+        }
+
+    # 4. 并行解析 -> 批量嵌入 -> 批量写入
+    if tasks:
+        pages = sum(task.end - task.start for task in tasks)
+        logger.info(f"开始摄取 {len(pending)} 个文档（{pages} 页，{len(tasks)} 个解析任务，{workers} 个进程）")
+        batch: List[Tuple[str, Document]] = []
+        chunk_count = 0
+
+        def flush() -> None:
+            if batch:
+                vector_store.add_texts(
+                    texts=[doc.page_content for _, doc in batch],
+                    metadatas=[doc.metadata for _, doc in batch],
+                    ids=[chunk_id for chunk_id, _ in batch]
+                )
+                batch.clear()
+
+        for task, result in _run_parse_tasks(tasks, workers):
+            state = pending[task.pdf_file]
+            state["remaining"] -= 1
+            if isinstance(result, Exception):
+                logger.error(f"处理文档 {task.pdf_file} 第 {task.start + 1}-{task.end} 页时出错: {result}")
+                state["failed"] = True
+            elif not state["failed"]:
+                result, facts = result
+                state["facts"].extend(facts)
+                # chunk ID 由文件名、内容哈希前缀、解析器版本、起始页和序号确定
+                for i, doc in enumerate(result):
+                    chunk_id = f"{task.pdf_path.stem}-{task.sha256[:12]}-v{EXTRACTOR_VERSION}-{task.start}-{i}"
+                    state["chunk_ids"].append(chunk_id)
+                    batch.append((chunk_id, doc))
+                    if len(batch) >= batch_size:
+                        flush()
+                chunk_count += len(result)
+
+            if state["remaining"] == 0:
+                flush()
+                if state["failed"]:
+                    # 部分页解析失败：丢弃已写入的 chunk，保留旧版本
+                    if state["chunk_ids"]:
+                        vector_store.delete(ids=state["chunk_ids"])
+                    continue
+                if state["old_ids"]:
+                    vector_store.delete(ids=state["old_ids"])
+                is_update = task.pdf_file in files
+                files[task.pdf_file] = {
+                    "sha256": state["sha256"],
+                    "size": state["stat"][0],
+                    "mtime_ns": state["stat"][1],
+                    "extractor": EXTRACTOR_VERSION,
+                    "chunk_ids": state["chunk_ids"],
+                    # 按页序保存（解析任务按完成顺序返回）
+                    "facts": sorted(state["facts"], key=lambda fact: fact["source"]["page"])
+                }
+                changed = True
+                # 每个文件完成后落盘清单，中断后可从已完成的文件继续
+                save_manifest(manifest, db_path)
+                logger.info(
+                    f"文档 {task.pdf_file} 已{'更新' if is_update else '新增'}："
+                    f"{len(state['chunk_ids'])} 个片段，{len(state['facts'])} 条结构化事实"
+                )
+
+        elapsed = time.perf_counter() - start_time
+        peak_self, peak_children = _peak_rss_mb()
+        logger.info(
+            f"摄取完成：{chunk_count} 个片段，{pages / elapsed:.1f} 页/秒，{chunk_count / elapsed:.1f} 片段/秒，"
+            f"峰值内存 主进程 {peak_self:.0f}MB / 子进程 {peak_children:.0f}MB"
+        )
+
+    if not any(entry["chunk_ids"] for entry in files.values()):
+        error_msg = f"未找到任何 PDF 文件在 {pdf_dir}"
+        logger.error(error_msg)
+        raise FileNotFoundError(error_msg)
+
+    if changed:
+        manifest["index_version"] += 1
+        save_manifest(manifest, db_path)
+        logger.info(
+            f"向量库同步完成，索引版本 {manifest['index_version']}，"
+            f"共 {sum(len(e['chunk_ids']) for e in files.values())} 个片段，"
+            f"耗时 {time.perf_counter() - start_time:.2f}s"
+        )
+    else:
+        if touched:
+            save_manifest(manifest, db_path)
+        logger.info(
+            f"向量库已是最新（索引版本 {manifest['index_version']}），"
+            f"耗时 {time.perf_counter() - start_time:.2f}s"
+        )
+
+    # 5. BM25 索引与向量库保持同一版本（旧向量库没有索引文件时补建）
+    lexical_index = BM25Index.load(db_path)
+    if changed or lexical_index is None or lexical_index.index_version != manifest["index_version"]:
+        build_lexical_index(vector_store, manifest["index_version"]).save(db_path)
+
+    # 6. NumPy 检索后端 / 多 worker 共享模式使用的只读快照，同样与向量库保持同一版本；修改 VECTOR_DTYPE 后重新导出
+    snapshot = IndexSnapshot.load(db_path)
+    if (
+        changed or snapshot is None or snapshot.index_version != manifest["index_version"]
+        or snapshot.dtype != VECTOR_DTYPE
+    ):
+        export_snapshot(vector_store, manifest["index_version"], db_path)
+
+    return changed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """离线摄取命令行入口，在启动 API 之前构建或增量更新向量库
+
+    用法:
+        python -m app.ingest              # 增量同步
+        python -m app.ingest --rebuild    # 清空后全量重建
+        python -m app.ingest --check      # 只检查是否最新，过期时返回码为 1
+
+    Returns:
+        进程返回码
+    """
+    parser = argparse.ArgumentParser(prog="python -m app.ingest", description="构建或增量更新向量库")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="解析进程数")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="每个嵌入/写入批次的 chunk 数")
+    parser.add_argument("--rebuild", action="store_true", help="清空向量库后全量重建")
+    parser.add_argument("--check", action="store_true", help="只检查向量库是否最新，不写入")
+    args = parser.parse_args(argv)
+
+    manifest = load_manifest()
+    if args.check:
+        if not manifest["files"]:
+            logger.error(f"向量库尚未构建: {DB_PATH}")
+            return 1
+        stale = stale_files(manifest)
+        if stale:
+            logger.warning(f"以下文档需要重新摄取: {stale}")
+            return 1
+        logger.info(f"向量库已是最新（索引版本 {manifest['index_version']}）")
+        return 0
+
+    embeddings = create_embeddings()
+    with ingest_lock():
+        vector_store = Chroma(persist_directory=DB_PATH, embedding_function=embeddings)
+
+        if args.rebuild:
+            logger.info("清空向量库，全量重建")
+            vector_store.reset_collection()
+            # 保留索引版本，保证重建后版本号仍然递增（等待锁期间清单可能已被更新，重新读取）
+            manifest = load_manifest()
+            manifest["files"] = {}
+            save_manifest(manifest)
+
+        try:
+            sync_vector_store(vector_store, workers=args.workers, batch_size=args.batch_size)
+        except FileNotFoundError:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
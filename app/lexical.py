@@ -0,0 +1,222 @@
+"""
+词法检索模块
+在向量库的同一批片段上构建 BM25 倒排索引，弥补 MiniLM 向量检索对课程代码、专有名词等
+精确词项排序不佳的问题。索引在摄取时构建并与 chroma_db 一起持久化（bm25_index.json），
+API 启动时只读加载。
+"""
+import json
+import math
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+LEXICAL_INDEX_FILE = "bm25_index.json"
+LEXICAL_INDEX_VERSION = 1
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 常见英文停用词：几乎每个片段都有，对排序没有帮助，只会拉长倒排链
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it of on or the this to what when "
+    "where which who will with my me you your is are was were there their".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """分词：小写的字母数字词项，去掉停用词
+
+    带后缀的课程代码额外产生基础代码词项（例如 mat224h1 -> mat224h1, mat224），
+    使 "MAT224 textbook" 能命中写作 "MAT224H1" 的片段。
+
+    Args:
+        text: 原始文本
+
+    Returns:
+        词项列表（保留重复，用于计算词频）
+    """
+    tokens = []
+    for token in re.findall(r"[a-z0-9]+", text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        match = re.match(r"([a-z]{3}\d{3})[a-z]", token)
+        if match:
+            tokens.append(match.group(1))
+    return tokens
+
+
+class BM25Index:
+    """BM25 倒排索引（只读，线程安全）
+
+    Attributes:
+        ids: 片段 ID，与向量库中的 ID 一致
+        index_version: 构建时的向量库索引版本，与清单不一致时说明索引已过期
+    """
+
+    def __init__(
+        self,
+        ids: List[str],
+        courses: List[str],
+        lengths: List[int],
+        postings: Dict[str, List[List[int]]],
+        index_version: int = 0
+    ):
+        """
+        Args:
+            ids: 片段 ID 列表
+            courses: 每个片段的基础课程代码
+            lengths: 每个片段的词项数
+            postings: 词项 -> [片段序号列表, 词频列表]
+            index_version: 向量库索引版本
+        """
+        self.ids = ids
+        self.courses = courses
+        self.index_version = index_version
+        self._lengths = lengths
+        self._postings = postings
+        # 课程代码 -> 片段序号集合，用于课程过滤
+        self._course_docs: Dict[str, Set[int]] = {}
+        for index, course in enumerate(courses):
+            self._course_docs.setdefault(course, set()).add(index)
+        # 预先计算每个片段的长度归一化项和每个词项的 IDF
+        avgdl = sum(lengths) / len(lengths) if lengths else 0.0
+        self._norms = [BM25_K1 * (1 - BM25_B + BM25_B * length / avgdl) if avgdl else BM25_K1 for length in lengths]
+        total = len(ids)
+        self._idf = {
+            term: math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, (docs, _) in postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(
+        cls, ids: List[str], texts: Iterable[str], metadatas: Iterable[Optional[Dict]], index_version: int = 0
+    ) -> "BM25Index":
+        """从片段文本构建索引
+
+        Args:
+            ids: 片段 ID 列表
+            texts: 片段文本
+            metadatas: 片段元数据（读取 course_base）
+            index_version: 向量库索引版本
+
+        Returns:
+            构建好的索引
+        """
+        courses, lengths = [], []
+        postings: Dict[str, List[List[int]]] = {}
+        for index, (text, meta) in enumerate(zip(texts, metadatas)):
+            tokens = tokenize(text)
+            courses.append((meta or {}).get("course_base", ""))
+            lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                entry = postings.setdefault(term, [[], []])
+                entry[0].append(index)
+                entry[1].append(tf)
+        return cls(list(ids), courses, lengths, postings, index_version)
+
+    def search(self, query: str, k: int, course_codes: Optional[List[str]] = None) -> List[Tuple[str, float]]:
+        """按 BM25 分数检索
+
+        Args:
+            query: 查询文本
+            k: 返回的最大结果数
+            course_codes: 可选的基础课程代码，只在这些课程的片段中检索
+
+        Returns:
+            (片段 ID, 分数) 列表，按分数降序
+        """
+        allowed: Optional[Set[int]] = None
+        if course_codes:
+            allowed = set().union(*(self._course_docs.get(code, set()) for code in course_codes))
+            if not allowed:
+                return []
+
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            entry = self._postings.get(term)
+            if entry is None:
+                continue
+            idf = self._idf[term]
+            for index, tf in zip(*entry):
+                if allowed is not None and index not in allowed:
+                    continue
+                scores[index] = scores.get(index, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + self._norms[index])
+
+        top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.ids[index], score) for index, score in top]
+
+    def save(self, db_path: str) -> None:
+        """原子写入索引文件（与向量库放在同一目录）"""
+        path = Path(db_path) / LEXICAL_INDEX_FILE
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        data = {
+            "version": LEXICAL_INDEX_VERSION,
+            "index_version": self.index_version,
+            "ids": self.ids,
+            "courses": self.courses,
+            "lengths": self._lengths,
+            "postings": self._postings,
+        }
+        tmp_path.write_text(json.dumps(data, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, db_path: str) -> Optional["BM25Index"]:
+        """读取索引文件，不存在、损坏或版本不兼容时返回 None"""
+        path = Path(db_path) / LEXICAL_INDEX_FILE
+        if not path.exists():
+            return None
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if data.get("version") != LEXICAL_INDEX_VERSION:
+                logger.warning(f"BM25 索引版本 {data.get('version')} 不兼容")
+                return None
+            return cls(data["ids"], data["courses"], data["lengths"], data["postings"], data["index_version"])
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"读取 BM25 索引失败: {e}")
+            return None
+
+
+def build_lexical_index(vector_store, index_version: int) -> BM25Index:
+    """从向量库中的全部片段构建 BM25 索引
+
+    Args:
+        vector_store: Chroma 向量库
+        index_version: 当前索引版本
+
+    Returns:
+        构建好的索引
+    """
+    data = vector_store.get(include=["documents", "metadatas"])
+    index = BM25Index.build(data["ids"], data["documents"], data["metadatas"], index_version)
+    logger.info(f"BM25 索引构建完成: {len(index)} 个片段，{len(index._postings)} 个词项")
+    return index
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[str]:
+    """倒数排名融合（RRF）：score(d) = Σ 1 / (k + rank)
+
+    Args:
+        rankings: 多个按相关度排序的键列表
+        k: 平滑常数，越大越弱化头部排名的优势
+
+    Returns:
+        融合后按分数降序的键列表（同分时保持先出现的顺序）
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda key: scores[key], reverse=True)
@@ -0,0 +1,278 @@
+"""
+LLM 调度模块
+在 LLM 阶段前做准入控制，防止高峰期请求在上游堆积：
+- 并发上限：同时进行的 LLM 调用数不超过 LLM_MAX_CONCURRENCY
+- 有界等待队列：超过 LLM_QUEUE_SIZE 时立即拒绝（503 + Retry-After），而不是让请求排到超时
+- 请求截止时间：排队和调用都不会超过请求的截止时间，过期的请求直接放弃
+- 熔断和重试：上游暂时性错误（连接失败、429、5xx）按指数退避重试；
+  连续失败达到阈值后熔断，冷却期内直接拒绝，冷却结束后放行一个试探请求。
+  只有暂时性错误计入熔断，请求超过截止时间和不可重试的错误（400、401）不改变熔断器状态
+"""
+import asyncio
+import math
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Deque, Optional, TypeVar
+
+import groq
+import httpx
+
+from app.config import (
+    LLM_MAX_CONCURRENCY, LLM_QUEUE_SIZE, LLM_MAX_RETRIES, LLM_RETRY_BACKOFF,
+    LLM_BREAKER_THRESHOLD, LLM_BREAKER_RESET_SECONDS
+)
+from app.logger import setup_logger
+from app.metrics import (
+    LLM_ADMISSIONS, LLM_CIRCUIT_STATE, LLM_IN_FLIGHT, LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT_SECONDS, LLM_RETRIES,
+    StageTimer
+)
+
+logger = setup_logger(__name__)
+
+T = TypeVar("T")
+
+# 熔断器状态（与 rag_llm_circuit_state 指标的取值一致）
+CLOSED, OPEN, HALF_OPEN = 0, 1, 2
+
+# 估算 Retry-After 时使用的初始 LLM 调用耗时（秒），之后按指数滑动平均更新
+_INITIAL_SERVICE_SECONDS = 2.0
+
+
+class LLMUnavailableError(RuntimeError):
+    """请求被调度器拒绝或放弃（队列已满、熔断中、超过截止时间）
+
+    Attributes:
+        reason: queue_full / circuit_open / deadline
+        retry_after: 建议客户端重试前等待的秒数
+    """
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"LLM 暂时不可用: {reason}")
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def is_retryable(error: BaseException) -> bool:
+    """是否为值得重试的上游暂时性错误（连接失败、超时、408/409/429、5xx）"""
+    if isinstance(error, (groq.APIConnectionError, httpx.TransportError, ConnectionError, TimeoutError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return isinstance(status, int) and (status in (408, 409, 429) or status >= 500)
+
+
+class LLMScheduler:
+    """LLM 调用的准入控制、并发限制和熔断（在单个事件循环内使用）"""
+
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_queue: int = LLM_QUEUE_SIZE,
+        max_retries: int = LLM_MAX_RETRIES,
+        retry_backoff: float = LLM_RETRY_BACKOFF,
+        breaker_threshold: int = LLM_BREAKER_THRESHOLD,
+        breaker_reset_seconds: float = LLM_BREAKER_RESET_SECONDS
+    ):
+        """
+        Args:
+            max_concurrency: 同时进行的 LLM 调用数上限
+            max_queue: 等待队列长度上限，0 表示不排队（没有空闲名额时立即拒绝）
+            max_retries: 暂时性错误的最大重试次数
+            retry_backoff: 第一次重试前的等待时间（秒），之后每次翻倍并加随机抖动
+            breaker_threshold: 连续失败多少次后熔断
+            breaker_reset_seconds: 熔断冷却时间（秒）
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset_seconds = breaker_reset_seconds
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._service_seconds = _INITIAL_SERVICE_SECONDS
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def _estimate_wait(self, position: int) -> float:
+        """排在第 position 位（从 1 开始）的请求预计等待多久才能拿到名额（秒）"""
+        return self._service_seconds * position / self.max_concurrency
+
+    def _reject(self, reason: str, retry_after: float) -> LLMUnavailableError:
+        LLM_ADMISSIONS.inc(result=reason)
+        logger.warning("LLM 请求被拒绝: %s（并发 %d，排队 %d）", reason, self.active, self.queue_depth)
+        return LLMUnavailableError(reason, retry_after)
+
+    def deadline_exceeded(self) -> LLMUnavailableError:
+        """已获得名额的调用超过截止时间时抛出的错误（不计入熔断）"""
+        return self._reject("deadline", self._service_seconds)
+
+    # --- 熔断器 ---
+    def _set_state(self, state: int) -> None:
+        if state != self.state:
+            logger.warning("LLM 熔断器状态: %s -> %s", self.state, state)
+        self.state = state
+        LLM_CIRCUIT_STATE.set(state)
+
+    def _check_circuit(self) -> bool:
+        """熔断中直接拒绝；冷却结束后只放行一个试探请求
+
+        Returns:
+            本请求是否为试探请求
+        """
+        if self.state == CLOSED:
+            return False
+        remaining = self._opened_at + self.breaker_reset_seconds - time.monotonic()
+        if self.state == OPEN and remaining <= 0:
+            self._set_state(HALF_OPEN)
+        if self.state == OPEN or self._probing:
+            raise self._reject("circuit_open", max(remaining, 1))
+        self._probing = True
+        return True
+
+    def record_success(self) -> None:
+        """记录一次上游调用成功（关闭熔断器）"""
+        self._failures = 0
+        self._probing = False
+        self._set_state(CLOSED)
+
+    def record_failure(self) -> None:
+        """记录一次上游调用失败，连续失败达到阈值或试探失败时熔断"""
+        self._failures += 1
+        self._probing = False
+        if self.state == HALF_OPEN or self._failures >= self.breaker_threshold:
+            self._opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    # --- 准入 ---
+    @asynccontextmanager
+    async def slot(self, deadline: Optional[float] = None, timer: Optional[StageTimer] = None) -> AsyncIterator[None]:
+        """获取一个 LLM 调用名额，退出时释放
+
+        Args:
+            deadline: 请求截止时间（time.perf_counter() 时间），None 表示不限
+            timer: 可选的分阶段计时器，排队时间记为 "queue" 阶段
+
+        Raises:
+            LLMUnavailableError: 熔断中、队列已满或排队期间超过截止时间
+        """
+        probe = self._check_circuit()
+        try:
+            if self.active < self.max_concurrency and not self._waiters:
+                self.active += 1
+                LLM_QUEUE_WAIT_SECONDS.observe(0.0)
+            else:
+                await self._wait_in_queue(deadline, timer)
+        except BaseException:
+            if probe:
+                self._probing = False
+            raise
+        LLM_ADMISSIONS.inc(result="admitted")
+        LLM_IN_FLIGHT.set(self.active)
+        try:
+            yield
+        finally:
+            if probe:
+                # 试探请求被取消时，下一个请求继续试探
+                self._probing = False
+            self._release()
+
+    async def _wait_in_queue(self, deadline: Optional[float], timer: Optional[StageTimer]) -> None:
+        if len(self._waiters) >= self.max_queue:
+            raise self._reject("queue_full", self._estimate_wait(len(self._waiters) + 1))
+        timeout = None if deadline is None else deadline - time.perf_counter()
+        if timeout is not None and timeout <= 0:
+            raise self._reject("deadline", self._estimate_wait(len(self._waiters) + 1))
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        LLM_QUEUE_DEPTH.set(len(self._waiters))
+        start = time.perf_counter()
+        try:
+            # 名额由 _release 直接转交（active 不变），被唤醒即已持有名额
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # 超时或取消与转交同时发生：名额已经给了本请求，交还给下一个
+                self._release()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            LLM_QUEUE_DEPTH.set(len(self._waiters))
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._reject("deadline", self._estimate_wait(len(self._waiters) + 1)) from None
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            LLM_QUEUE_WAIT_SECONDS.observe(waited)
+            if timer is not None:
+                timer.record("queue", waited)
+
+    def _release(self) -> None:
+        """释放名额：有排队请求时按先进先出直接转交"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                LLM_QUEUE_DEPTH.set(len(self._waiters))
+                return
+        self.active -= 1
+        LLM_QUEUE_DEPTH.set(0)
+        LLM_IN_FLIGHT.set(self.active)
+
+    # --- 调用 ---
+    async def run(
+        self, func: Callable[[], Awaitable[T]], deadline: Optional[float] = None, timer: Optional[StageTimer] = None
+    ) -> T:
+        """在调度器控制下执行一次 LLM 调用，暂时性错误按指数退避重试
+
+        Args:
+            func: 发起 LLM 调用的无参数协程函数（每次重试重新调用）
+            deadline: 请求截止时间（time.perf_counter() 时间），None 表示不限
+            timer: 可选的分阶段计时器，排队时间记为 "queue" 阶段
+
+        Returns:
+            func 的返回值
+
+        Raises:
+            LLMUnavailableError: 被拒绝，或在截止时间前没有完成
+            Exception: 不可重试的上游错误，或重试次数用尽后的最后一个错误
+        """
+        async with self.slot(deadline, timer):
+            attempt = 0
+            while True:
+                timeout = None if deadline is None else deadline - time.perf_counter()
+                if timeout is not None and timeout <= 0:
+                    raise self.deadline_exceeded()
+                start = time.perf_counter()
+                try:
+                    result = await asyncio.wait_for(func(), timeout)
+                except asyncio.TimeoutError:
+                    # 请求自己的截止时间到了，不说明上游故障（例如只是排队太久），不计入熔断
+                    raise self.deadline_exceeded() from None
+                except Exception as e:
+                    if not is_retryable(e):
+                        # 请求本身有误（例如 400、401），既不是上游故障也不说明上游已恢复：熔断器状态不变
+                        raise
+                    self.record_failure()
+                    delay = self.retry_backoff * 2 ** attempt * (0.5 + random.random())
+                    if (
+                        attempt >= self.max_retries or self.state == OPEN
+                        or (deadline is not None and time.perf_counter() + delay >= deadline)
+                    ):
+                        raise
+                    attempt += 1
+                    LLM_RETRIES.inc()
+                    logger.warning("LLM 调用失败，%.2fs 后重试（第 %d 次）: %s", delay, attempt, e)
+                    await asyncio.sleep(delay)
+                else:
+                    self.record_success()
+                    self._service_seconds = 0.8 * self._service_seconds + 0.2 * (time.perf_counter() - start)
+                    return result
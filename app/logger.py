@@ -1,12 +1,158 @@
 """
 日志配置模块
 提供结构化日志功能，支持文件和控制台输出
+
+所有 logger 共享同一组输出 handler（控制台 + 轮转日志文件）。异步模式（默认）下，
+业务线程只把日志记录放入内存队列，由后台 QueueListener 线程格式化并写入，
+请求路径上没有磁盘 I/O。
 """
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
+import os
+import queue
 import sys
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional
-from app.config import LOG_LEVEL, LOG_FILE, BASE_DIR
+from typing import Dict, List, Optional, Tuple
+from app.config import (
+    LOG_LEVEL, LOG_FILE, LOG_ASYNC, LOG_FORMAT, LOG_QUEUE_SIZE,
+    LOG_ROTATION, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_ROTATE_WHEN
+)
+
+# LogRecord 的标准属性，其余属性视为通过 extra= 传入的结构化字段
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+# 日志文件路径 -> 挂到 logger 上的 handler（异步模式下为一个 QueueHandler）
+_handlers: Dict[str, List[logging.Handler]] = {}
+# 后台写入线程及向其队列写入的 handler
+_listeners: List[Tuple[logging.handlers.QueueListener, "_DroppingQueueHandler"]] = []
+_EXC_FORMATTER = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON，extra= 传入的字段作为顶层键"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exception"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """队列满时丢弃日志并计数，而不是阻塞业务线程"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 在调用线程中完成 %-格式化（参数之后可能被修改），异常堆栈单独保存在 exc_text 中
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _EXC_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _create_formatter() -> logging.Formatter:
+    if LOG_FORMAT == "json":
+        return JsonFormatter()
+    return logging.Formatter(
+        fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+
+
+def _create_file_handler(log_file: str) -> logging.Handler:
+    """按 LOG_ROTATION 创建按大小轮转、按时间轮转或不轮转的文件 handler"""
+    if LOG_ROTATION == "size":
+        return logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+    if LOG_ROTATION == "time":
+        return logging.handlers.TimedRotatingFileHandler(
+            log_file, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+    return logging.FileHandler(log_file, encoding='utf-8')
+
+
+def _get_handlers(log_file: str) -> List[logging.Handler]:
+    """返回写入 log_file 的共享 handler，首次调用时创建"""
+    handlers = _handlers.get(log_file)
+    if handlers is not None:
+        return handlers
+
+    formatter = _create_formatter()
+
+    # 控制台输出
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setLevel(logging.DEBUG)
+    console_handler.setFormatter(formatter)
+
+    # 文件输出
+    Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+    file_handler = _create_file_handler(log_file)
+    file_handler.setLevel(logging.DEBUG)
+    file_handler.setFormatter(formatter)
+
+    if LOG_ASYNC:
+        log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        listener = logging.handlers.QueueListener(
+            log_queue, console_handler, file_handler, respect_handler_level=True
+        )
+        listener.start()
+        queue_handler = _DroppingQueueHandler(log_queue)
+        _listeners.append((listener, queue_handler))
+        handlers = [queue_handler]
+    else:
+        handlers = [console_handler, file_handler]
+
+    _handlers[log_file] = handlers
+    return handlers
+
+
+def shutdown_logging() -> None:
+    """停止后台写入线程，写完队列中剩余的日志（进程退出时自动调用）"""
+    for listener, _ in _listeners:
+        listener.stop()
+    _listeners.clear()
+
+
+def _restart_listeners_after_fork() -> None:
+    """fork 出的子进程（例如 gunicorn worker）中没有父进程的后台写入线程：
+    换用新队列（旧队列的锁可能在 fork 时被持有）并重新启动写入线程"""
+    for listener, queue_handler in _listeners:
+        log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        listener.queue = log_queue
+        queue_handler.queue = log_queue
+        listener._thread = None
+        listener.start()
+
+
+atexit.register(shutdown_logging)
+os.register_at_fork(after_in_child=_restart_listeners_after_fork)
 
 
 def setup_logger(name: str, log_file: Optional[str] = None) -> logging.Logger:
@@ -27,30 +173,11 @@ def setup_logger(name: str, log_file: Optional[str] = None) -> logging.Logger:
     if logger.handlers:
         return logger
 
-    # 日志格式
-    formatter = logging.Formatter(
-        fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-
-    # 控制台输出
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.DEBUG)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-
-    # 文件输出
     if log_file is None:
         log_file = LOG_FILE
 
-    log_path = Path(log_file)
-    log_path.parent.mkdir(parents=True, exist_ok=True)
-
-    file_handler = logging.FileHandler(log_file, encoding='utf-8')
-    file_handler.setLevel(logging.DEBUG)
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
-
+    for handler in _get_handlers(log_file):
+        logger.addHandler(handler)
     return logger
 
 
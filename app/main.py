@@ -1,23 +1,88 @@
-from fastapi import FastAPI, HTTPException, Depends
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from typing import Annotated, Dict, List, Optional
+
+from fastapi import FastAPI, HTTPException, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, RedirectResponse, StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials
 from pydantic import BaseModel, Field
 
+from app.cache import normalize_question
 from app.rag_service import RAGService
-from app.config import API_HOST, API_PORT, ALLOWED_ORIGINS
+from app.config import (
+    API_HOST, API_PORT, ALLOWED_ORIGINS, DEBUG_TIMING, BATCH_MAX_QUESTIONS, SHARED_INDEX, INDEX_RELOAD_INTERVAL
+)
+from app.llm_scheduler import LLMUnavailableError
 from app.logger import setup_logger
-from app.middleware import security, verify_api_key, check_rate_limit
+from app.metrics import StageTimer, render_metrics
+from app.middleware import security, verify_api_key, check_rate_limit, check_batch_rate_limit
 
 # 初始化日志
 logger = setup_logger(__name__)
 
+# RAG 服务在 lifespan 中于后台线程初始化：进程启动后立即可以响应 /health，
+# 模型和向量库加载完成前 /ready 返回 503
+rag_service = RAGService(initialize=False)
+
+if SHARED_INDEX:
+    # 共享模式：导入时同步初始化。gunicorn preload_app 下只在主进程中加载一次模型和索引快照，
+    # worker fork 后以写时复制方式共享（见 gunicorn.conf.py）；初始化失败时主进程直接退出，
+    # 而不是每个 worker 各自失败
+    rag_service.initialize_rag()
+
+
+def _initialize_rag_service() -> None:
+    try:
+        rag_service.initialize_rag()
+    except Exception:
+        # 错误已在 initialize_rag 中记录，状态为 failed，/ready 返回 503
+        pass
+
+
+async def _watch_index() -> None:
+    """每 INDEX_RELOAD_INTERVAL 秒检查一次摄取清单，索引版本变化时在线程池中重新加载索引并清空缓存
+
+    共享模式下每个 worker 各自检查和加载（新快照仍通过页缓存在 worker 之间共享）
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(INDEX_RELOAD_INTERVAL)
+        try:
+            await loop.run_in_executor(None, rag_service.reload_index)
+        except Exception as e:
+            logger.error(f"检查索引版本时出错: {str(e)}", exc_info=True)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时后台初始化 RAG 服务并监视索引版本，关闭时释放资源"""
+    init_future = None
+    # 共享模式下已在导入时（gunicorn 主进程中）完成初始化
+    if not rag_service.is_ready:
+        logger.info("初始化 RAG 服务...")
+        init_future = asyncio.get_running_loop().run_in_executor(None, _initialize_rag_service)
+    watch_task = asyncio.create_task(_watch_index()) if INDEX_RELOAD_INTERVAL > 0 else None
+    logger.info("应用启动完成，等待 RAG 服务就绪")
+    yield
+    if watch_task is not None:
+        watch_task.cancel()
+    if init_future is not None and not init_future.done():
+        logger.info("等待 RAG 服务初始化结束后关闭...")
+        await init_future
+    rag_service.close()
+    logger.info("应用已关闭")
+
+
 # --- FastAPI App 设置 ---
 app = FastAPI(
     title="UofT Assistant API",
     description="基于 RAG 的智能课程助手",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # 允许跨域 (CORS)
@@ -33,11 +98,6 @@ app.add_middleware(
 # 挂载静态文件目录
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# 全局初始化 RAG 服务
-logger.info("初始化 RAG 服务...")
-rag_service = RAGService()
-logger.info("应用启动完成")
-
 
 # --- 全局异常处理器 ---
 @app.exception_handler(Exception)
@@ -68,10 +128,41 @@ class QueryResponse(BaseModel):
     answer: str = Field(..., description="AI 生成的答案")
 
 
+class BatchQueryRequest(BaseModel):
+    """批量聊天请求模型"""
+    questions: List[Annotated[str, Field(min_length=1, max_length=2000)]] = Field(
+        ..., min_length=1, max_length=BATCH_MAX_QUESTIONS, description="问题列表"
+    )
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "questions": [
+                    "What is the grading scheme for MAT235?",
+                    "When is Test 1 in MAT224?"
+                ]
+            }
+        }
+
+
+class BatchItemResponse(BaseModel):
+    """批量响应中的单个结果"""
+    answer: Optional[str] = Field(None, description="AI 生成的答案，出错时为空")
+    sources: List[Dict] = Field(default_factory=list, description="答案引用的来源元数据")
+    cached: bool = Field(False, description="是否来自答案缓存")
+    error: Optional[str] = Field(None, description="该问题的错误信息")
+
+
+class BatchQueryResponse(BaseModel):
+    """批量聊天响应模型"""
+    results: List[BatchItemResponse] = Field(..., description="与问题顺序一致的结果")
+
+
 # --- API 接口 ---
 @app.post("/chat", response_model=QueryResponse, summary="聊天接口")
 async def chat_endpoint(
     request: QueryRequest,
+    response: Response,
     credentials: HTTPAuthorizationCredentials = Depends(security),
     _: None = Depends(check_rate_limit)
 ):
@@ -80,16 +171,25 @@ async def chat_endpoint(
 
     - **question**: 用户提出的问题（1-2000字符）
 
-    返回 AI 基于课程大纲生成的答案
+    返回 AI 基于课程大纲生成的答案；过载或上游不可用时立即返回 503 和 `Retry-After`
     """
     await verify_api_key(credentials)
 
     try:
-        logger.info(f"收到问题: {request.question[:100]}...")
-        answer = rag_service.get_answer(request.question)
-        logger.info(f"成功生成答案，长度: {len(answer)} 字符")
+        logger.info("收到问题: %.100s...", request.question)
+        timer = StageTimer()
+        answer = await rag_service.aget_answer(request.question, timer)
+        logger.info("成功生成答案，长度: %d 字符", len(answer))
+        if DEBUG_TIMING:
+            response.headers["X-Timing"] = timer.as_header()
         return {"answer": answer}
 
+    except LLMUnavailableError as e:
+        # 过载或上游熔断：立即返回 503，由客户端按 Retry-After 重试
+        raise HTTPException(
+            status_code=503, detail="服务繁忙，请稍后重试", headers={"Retry-After": str(e.retry_after)}
+        )
+
     except RuntimeError as e:
         logger.error(f"RAG 服务错误: {str(e)}")
         raise HTTPException(status_code=503, detail="服务暂时不可用，请稍后重试")
@@ -99,6 +199,92 @@ async def chat_endpoint(
         raise HTTPException(status_code=500, detail="处理请求时发生错误")
 
 
+@app.post("/chat/batch", response_model=BatchQueryResponse, summary="批量聊天接口")
+async def chat_batch_endpoint(
+    request: BatchQueryRequest,
+    http_request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    _: None = Depends(check_rate_limit)
+):
+    """
+    批量处理聊天请求（例如夜间批量跑常见问题）
+
+    - **questions**: 问题列表（最多 BATCH_MAX_QUESTIONS 个，每个 1-2000 字符）
+
+    除每次请求的速率限制外，还按去重后的问题数计入每小时的批量限额（BATCH_RATE_LIMIT_PER_HOUR）；
+    所有问题一次性嵌入、按课程分组检索，LLM 调用并发执行。
+    结果与问题顺序一致，单个问题失败时该项返回 `error`，不影响其它问题
+    """
+    # 先认证再计费：未通过认证的请求不消耗该 IP 的批量限额
+    await verify_api_key(credentials)
+    await check_batch_rate_limit(
+        http_request, len({normalize_question(question) for question in request.questions})
+    )
+
+    try:
+        logger.info("收到批量问题: %d 个", len(request.questions))
+        results = await rag_service.aget_answers(request.questions)
+        return {"results": [asdict(result) for result in results]}
+
+    except RuntimeError as e:
+        logger.error(f"RAG 服务错误: {str(e)}")
+        raise HTTPException(status_code=503, detail="服务暂时不可用，请稍后重试")
+
+    except Exception as e:
+        logger.error(f"处理批量请求时出错: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="处理请求时发生错误")
+
+
+def _format_sse(event: str, data: Dict) -> str:
+    """将事件格式化为 Server-Sent Events 报文"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/chat/stream", summary="流式聊天接口")
+async def chat_stream_endpoint(
+    request: QueryRequest,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    _: None = Depends(check_rate_limit)
+):
+    """
+    以 Server-Sent Events 流式返回答案
+
+    - **question**: 用户提出的问题（1-2000字符）
+
+    事件顺序：`sources`（检索到的来源元数据）→ 若干 `token` → `done`；
+    出错时发送 `error` 事件
+    """
+    await verify_api_key(credentials)
+    logger.info("收到流式问题: %.100s...", request.question)
+
+    async def event_stream():
+        timer = StageTimer()
+        try:
+            async for event, data in rag_service.astream_answer(request.question, timer):
+                if event == "done" and DEBUG_TIMING:
+                    # 响应头在第一个事件之前已发送，耗时放在 done 事件中
+                    data = {**data, "timing": timer.as_dict()}
+                yield _format_sse(event, data)
+
+        except LLMUnavailableError as e:
+            yield _format_sse("error", {"detail": "服务繁忙，请稍后重试", "retry_after": e.retry_after})
+
+        except RuntimeError as e:
+            logger.error(f"RAG 服务错误: {str(e)}")
+            yield _format_sse("error", {"detail": "服务暂时不可用，请稍后重试"})
+
+        except Exception as e:
+            logger.error(f"处理流式请求时出错: {str(e)}", exc_info=True)
+            yield _format_sse("error", {"detail": "处理请求时发生错误"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # 禁止 Nginx 缓冲，保证 token 立即送达浏览器
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.get("/", include_in_schema=False)
 async def root() -> RedirectResponse:
     """根路径重定向到静态页面"""
@@ -120,5 +306,28 @@ async def health_check():
     }
 
 
-# 启动命令: uvicorn app.main:app --reload
+@app.get("/metrics", summary="Prometheus 指标", include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    """以 Prometheus 文本格式导出各阶段耗时、token 用量、缓存和限流指标（当前 worker 进程）"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/ready", summary="就绪检查")
+async def readiness_check():
+    """
+    就绪检查接口
+
+    RAG 服务（嵌入模型、向量库、课程索引）加载完成后返回 200，否则返回 503。
+    与 /health 不同：/health 只表示进程存活
+    """
+    if not rag_service.is_ready:
+        return JSONResponse(status_code=503, content={"status": rag_service.status})
+    return {
+        "status": "ready",
+        "index_version": rag_service.index_version,
+        "courses": sorted(rag_service.course_index)
+    }
+
+
+# 启动命令: python -m app.ingest && uvicorn app.main:app --reload
 # CI/CD 自动部署已启用 - Test deployment
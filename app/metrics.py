@@ -0,0 +1,265 @@
+"""
+指标模块
+进程内的计数器和直方图，以 Prometheus 文本格式导出（/metrics）
+
+每个 uvicorn worker 进程各自计数，Prometheus 按实例分别抓取后再聚合。
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# 阶段耗时的直方图桶（秒）：覆盖从亚毫秒的缓存查找到数十秒的 LLM 调用
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry: List["_Metric"] = []
+
+
+def _format_labels(labelnames: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """指标基类：名称、说明、标签名和一把锁"""
+    type_name = ""
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """单调递增的计数器"""
+    type_name = "counter"
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, description, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """
+        增加计数
+
+        Args:
+            amount: 增量（非负）
+            **labels: 标签值，必须与 labelnames 一致
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        """返回指定标签组合的当前值"""
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(Counter):
+    """可增可减的瞬时值（例如队列长度、进行中的请求数）"""
+    type_name = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        """设置当前值"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        """减少当前值"""
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """固定桶的直方图，记录观测值的分布、总和与次数"""
+    type_name = "histogram"
+
+    def __init__(
+        self, name: str, description: str, labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签组合 -> (每个桶的计数（非累计，最后一个为 +Inf）, 总和, 次数)
+        self._values: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """
+        记录一个观测值
+
+        Args:
+            value: 观测值（耗时以秒为单位）
+            **labels: 标签值，必须与 labelnames 一致
+        """
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels: str) -> int:
+        """返回指定标签组合的观测次数"""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[2] if state else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self._values.items())
+        lines = []
+        for key, (bucket_counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+def render_metrics() -> str:
+    """以 Prometheus 文本格式（0.0.4）导出所有指标"""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+class StageTimer:
+    """单个请求的分阶段计时器
+
+    用法:
+        timer = StageTimer()
+        with timer.stage("embed"):
+            ...
+        timer.as_header()  # "embed;dur=1.2, total;dur=3.4"
+
+    每个阶段结束时同时写入 rag_stage_seconds 直方图；同一阶段多次出现时耗时累加。
+    """
+
+    __slots__ = ("start", "stages")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """计时一个阶段（秒）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float) -> None:
+        """记录一个已测得的阶段耗时（秒）"""
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        STAGE_SECONDS.observe(seconds, stage=name)
+
+    def finish(self) -> float:
+        """记录并返回请求总耗时（秒）"""
+        total = time.perf_counter() - self.start
+        self.record("total", total)
+        return total
+
+    def as_header(self) -> str:
+        """格式化为 X-Timing 响应头（Server-Timing 语法，单位毫秒）"""
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items())
+
+    def as_dict(self) -> Dict[str, float]:
+        """各阶段耗时（毫秒）"""
+        return {name: round(seconds * 1000, 1) for name, seconds in self.stages.items()}
+
+
+def record_token_usage(usage: Optional[Dict]) -> None:
+    """记录 LLM 返回的 token 用量（AIMessage.usage_metadata）"""
+    if not usage:
+        return
+    LLM_TOKENS.inc(usage.get("input_tokens", 0), kind="prompt")
+    LLM_TOKENS.inc(usage.get("output_tokens", 0), kind="completion")
+
+
+# --- 应用指标 ---
+STAGE_SECONDS = Histogram(
+    "rag_stage_seconds", "Latency of each RAG request stage in seconds", ["stage"]
+)
+LLM_TOKENS = Counter(
+    "rag_llm_tokens_total", "LLM tokens reported by the provider", ["kind"]
+)
+CONTEXT_CHARS = Histogram(
+    "rag_context_chars", "Characters of retrieved context sent to the LLM",
+    buckets=(500, 1000, 2000, 4000, 8000, 16000, 32000)
+)
+RETRIEVED_CHUNKS = Histogram(
+    "rag_retrieved_chunks", "Number of chunks retrieved per question",
+    buckets=(0, 1, 2, 5, 10, 15, 20, 30)
+)
+CACHE_LOOKUPS = Counter(
+    "rag_answer_cache_total", "Answer cache lookups by result", ["result"]
+)
+RETRIEVAL_CACHE_LOOKUPS = Counter(
+    "rag_retrieval_cache_total", "Query embedding / retrieval cache lookups by result", ["cache", "result"]
+)
+RATE_LIMIT_DECISIONS = Counter(
+    "rate_limit_decisions_total", "Rate limiter decisions", ["limiter", "decision"]
+)
+COALESCED_REQUESTS = Counter(
+    "rag_coalesced_requests_total", "Requests that started (leader) or joined (follower) an in-flight computation",
+    ["name", "role"]
+)
+LLM_IN_FLIGHT = Gauge(
+    "rag_llm_in_flight", "LLM calls currently running"
+)
+LLM_QUEUE_DEPTH = Gauge(
+    "rag_llm_queue_depth", "Requests waiting for an LLM slot"
+)
+LLM_QUEUE_WAIT_SECONDS = Histogram(
+    "rag_llm_queue_wait_seconds", "Time requests waited for an LLM slot in seconds"
+)
+LLM_ADMISSIONS = Counter(
+    "rag_llm_admissions_total", "LLM scheduler admission decisions", ["result"]
+)
+LLM_RETRIES = Counter(
+    "rag_llm_retries_total", "LLM calls retried after a transient upstream error"
+)
+LLM_CIRCUIT_STATE = Gauge(
+    "rag_llm_circuit_state", "LLM circuit breaker state (0 closed, 1 open, 2 half-open)"
+)
+FACT_ANSWER_HITS = Counter(
+    "rag_fact_answers_total", "Questions answered from the structured fact index without an LLM call", ["intent"]
+)
@@ -4,13 +4,20 @@
 """
 from fastapi import Request, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import Optional, Dict
-from datetime import datetime, timedelta
-from collections import defaultdict
+from typing import Optional, Dict, Union
+from pathlib import Path
+import asyncio
+import math
+import sqlite3
 import threading
+import time
 
-from app.config import API_KEY, RATE_LIMIT_PER_MINUTE
+from app.config import (
+    API_KEY, RATE_LIMIT_PER_MINUTE, RATE_LIMIT_BACKEND, RATE_LIMIT_DB_PATH, RATE_LIMIT_DB_TIMEOUT,
+    BATCH_RATE_LIMIT_PER_HOUR, BATCH_MAX_QUESTIONS
+)
 from app.logger import setup_logger
+from app.metrics import RATE_LIMIT_DECISIONS
 
 logger = setup_logger(__name__)
 
@@ -51,21 +58,92 @@ async def verify_api_key(credentials: Optional[HTTPAuthorizationCredentials]) ->
 
 
 # 速率限制器
+class _Bucket:
+    """单个客户端的令牌桶状态"""
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class _Shard:
+    """一个分片：独立的锁和令牌桶表"""
+    __slots__ = ("lock", "buckets", "next_sweep")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets: Dict[str, _Bucket] = {}
+        self.next_sweep = 0.0
+
+
 class RateLimiter:
-    """简单的内存速率限制器"""
+    """令牌桶速率限制器（进程内）
+
+    每个客户端一个令牌桶：容量为 max_requests，按 max_requests / window_seconds 的速率匀速补充，
+    每次检查只做 O(1) 的浮点运算。客户端按 ID 哈希分到多个分片，各分片独立加锁；
+    闲置超过一个窗口的令牌桶已经补满，与新客户端等价，定期从内存中淘汰。
+    """
 
-    def __init__(self, max_requests: int = RATE_LIMIT_PER_MINUTE, window_seconds: int = 60):
+    def __init__(self, max_requests: int = RATE_LIMIT_PER_MINUTE, window_seconds: int = 60, shards: int = 16):
         """
         初始化速率限制器
 
         Args:
-            max_requests: 时间窗口内允许的最大请求数
+            max_requests: 时间窗口内允许的最大请求数（令牌桶容量）
             window_seconds: 时间窗口大小（秒）
+            shards: 锁分片数
         """
+        if max_requests <= 0 or window_seconds <= 0:
+            raise ValueError("max_requests 和 window_seconds 必须为正数")
         self.max_requests = max_requests
         self.window_seconds = window_seconds
-        self.requests: Dict[str, list] = defaultdict(list)
-        self.lock = threading.Lock()
+        self.rate = max_requests / window_seconds
+        self._shards = [_Shard() for _ in range(shards)]
+
+    def _sweep(self, shard: _Shard, now: float) -> None:
+        """淘汰分片中闲置超过一个窗口的令牌桶（调用方持有分片锁）"""
+        cutoff = now - self.window_seconds
+        idle = [client_id for client_id, bucket in shard.buckets.items() if bucket.updated <= cutoff]
+        for client_id in idle:
+            del shard.buckets[client_id]
+        shard.next_sweep = now + self.window_seconds
+
+    def acquire(self, client_id: str, cost: int = 1) -> float:
+        """
+        尝试为客户端消耗 cost 个令牌
+
+        Args:
+            client_id: 客户端标识（通常是 IP 地址）
+            cost: 本次请求消耗的令牌数（不超过 max_requests）
+
+        Returns:
+            0 表示允许请求；否则为令牌足够前需要等待的秒数
+
+        Raises:
+            ValueError: cost 超过令牌桶容量，永远无法满足
+        """
+        if cost > self.max_requests:
+            raise ValueError(f"cost {cost} 超过令牌桶容量 {self.max_requests}")
+        now = time.monotonic()
+        shard = self._shards[hash(client_id) % len(self._shards)]
+
+        with shard.lock:
+            if now >= shard.next_sweep:
+                self._sweep(shard, now)
+
+            bucket = shard.buckets.get(client_id)
+            if bucket is None:
+                shard.buckets[client_id] = _Bucket(self.max_requests - cost, now)
+                return 0.0
+
+            tokens = min(self.max_requests, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+            if tokens >= cost:
+                bucket.tokens = tokens - cost
+                return 0.0
+            bucket.tokens = tokens
+            return (cost - tokens) / self.rate
 
     def is_allowed(self, client_id: str) -> bool:
         """
@@ -77,28 +155,174 @@ class RateLimiter:
         Returns:
             是否允许请求
         """
-        now = datetime.now()
-        cutoff = now - timedelta(seconds=self.window_seconds)
+        return self.acquire(client_id) == 0.0
+
+    def __len__(self) -> int:
+        return sum(len(shard.buckets) for shard in self._shards)
+
+
+class SQLiteRateLimiter:
+    """基于本机 SQLite 文件的令牌桶速率限制器
+
+    令牌桶保存在 SQLite（WAL 模式）中，同一台机器上的多个 uvicorn worker 共享限额。
+    每次检查是一个 BEGIN IMMEDIATE 事务内的单行读写；由于要跨进程比较时间，
+    使用墙上时钟，并忽略时钟回拨。检查是阻塞调用，异步代码中应在线程池中执行；
+    等待写锁超过 busy_timeout 时放行请求（fail open）。
+    """
+
+    def __init__(
+        self, db_path: str, max_requests: int = RATE_LIMIT_PER_MINUTE, window_seconds: int = 60,
+        busy_timeout: float = RATE_LIMIT_DB_TIMEOUT, table: str = "rate_limit_buckets"
+    ):
+        """
+        Args:
+            db_path: SQLite 数据库文件路径
+            max_requests: 时间窗口内允许的最大请求数（令牌桶容量）
+            window_seconds: 时间窗口大小（秒）
+            busy_timeout: 等待其它进程释放写锁的最长时间（秒）
+            table: 令牌桶表名；窗口不同的限流器使用各自的表，互不淘汰对方的令牌桶
+        """
+        if max_requests <= 0 or window_seconds <= 0:
+            raise ValueError("max_requests 和 window_seconds 必须为正数")
+        self.db_path = db_path
+        self.max_requests = max_requests
+        self.window_seconds = window_seconds
+        self.rate = max_requests / window_seconds
+        self.busy_timeout = busy_timeout
+        self.table = table
+        # sqlite3 连接不能跨线程共享，每个线程一个连接
+        self._local = threading.local()
+        self._next_sweep = 0.0
+        self._connect().execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            "client_id TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL"
+            ") WITHOUT ROWID"
+        )
 
-        with self.lock:
-            # 清理过期的请求记录
-            self.requests[client_id] = [
-                req_time for req_time in self.requests[client_id]
-                if req_time > cutoff
-            ]
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # 限流状态丢失无害，不需要每次提交都落盘
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
 
-            # 检查是否超过限制
-            if len(self.requests[client_id]) >= self.max_requests:
-                logger.warning(f"客户端 {client_id} 超过速率限制")
-                return False
+    def acquire(self, client_id: str, cost: int = 1) -> float:
+        """
+        尝试为客户端消耗 cost 个令牌
 
-            # 记录当前请求
-            self.requests[client_id].append(now)
-            return True
+        Args:
+            client_id: 客户端标识（通常是 IP 地址）
+            cost: 本次请求消耗的令牌数（不超过 max_requests）
+
+        Returns:
+            0 表示允许请求；否则为令牌足够前需要等待的秒数
+
+        Raises:
+            ValueError: cost 超过令牌桶容量，永远无法满足
+        """
+        if cost > self.max_requests:
+            raise ValueError(f"cost {cost} 超过令牌桶容量 {self.max_requests}")
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                f"SELECT tokens, updated FROM {self.table} WHERE client_id = ?", (client_id,)
+            ).fetchone()
+            if row is None:
+                tokens = float(self.max_requests)
+            else:
+                tokens = min(self.max_requests, row[0] + max(0.0, now - row[1]) * self.rate)
+
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / self.rate
+
+            conn.execute(
+                f"INSERT INTO {self.table} (client_id, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(client_id) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (client_id, tokens, now)
+            )
+            # 淘汰闲置超过一个窗口的令牌桶
+            if now >= self._next_sweep:
+                conn.execute(f"DELETE FROM {self.table} WHERE updated <= ?", (now - self.window_seconds,))
+                self._next_sweep = now + self.window_seconds
+            conn.execute("COMMIT")
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            if "locked" not in str(e) and "busy" not in str(e):
+                raise
+            # 其它 worker 长时间持有写锁：放行本次请求，限流偶尔漏计比阻塞请求更可接受
+            logger.warning(f"速率限制数据库繁忙，放行请求: {e}")
+            return 0.0
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def is_allowed(self, client_id: str) -> bool:
+        """
+        检查客户端是否被允许发送请求
+
+        Args:
+            client_id: 客户端标识（通常是 IP 地址）
+
+        Returns:
+            是否允许请求
+        """
+        return self.acquire(client_id) == 0.0
+
+    def __len__(self) -> int:
+        return self._connect().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+def create_rate_limiter(
+    max_requests: int = RATE_LIMIT_PER_MINUTE, window_seconds: int = 60, table: str = "rate_limit_buckets"
+) -> Union[RateLimiter, SQLiteRateLimiter]:
+    """根据 RATE_LIMIT_BACKEND 配置创建速率限制器
+
+    Args:
+        max_requests: 时间窗口内允许的最大请求数（令牌桶容量）
+        window_seconds: 时间窗口大小（秒）
+        table: sqlite 后端的令牌桶表名
+
+    Raises:
+        ValueError: 未知的后端名称
+    """
+    if RATE_LIMIT_BACKEND == "memory":
+        return RateLimiter(max_requests=max_requests, window_seconds=window_seconds)
+    if RATE_LIMIT_BACKEND == "sqlite":
+        logger.info(f"速率限制使用共享 SQLite 后端: {RATE_LIMIT_DB_PATH} ({table})")
+        return SQLiteRateLimiter(
+            RATE_LIMIT_DB_PATH, max_requests=max_requests, window_seconds=window_seconds, table=table
+        )
+    raise ValueError(f"未知的速率限制后端: {RATE_LIMIT_BACKEND}")
 
 
 # 创建全局速率限制器实例
-rate_limiter = RateLimiter(max_requests=RATE_LIMIT_PER_MINUTE, window_seconds=60)
+rate_limiter = create_rate_limiter()
+# /chat/batch 按问题数计费的独立限流器（API 密钥随前端公开，不能只按请求数计）；
+# 容量至少为一个最大批次，否则大批次永远无法通过
+batch_rate_limiter = create_rate_limiter(
+    max_requests=max(BATCH_RATE_LIMIT_PER_HOUR, BATCH_MAX_QUESTIONS), window_seconds=3600,
+    table="batch_rate_limit_buckets"
+)
+
+
+async def _acquire(limiter: Union[RateLimiter, SQLiteRateLimiter], client_id: str, cost: int) -> float:
+    """在限流器上消耗 cost 个令牌，返回需要等待的秒数"""
+    if isinstance(limiter, SQLiteRateLimiter):
+        # SQLite 事务可能等待其它 worker 的写锁，不在事件循环中阻塞
+        return await asyncio.to_thread(limiter.acquire, client_id, cost)
+    return limiter.acquire(client_id, cost)
 
 
 async def check_rate_limit(request: Request) -> None:
@@ -113,11 +337,38 @@ async def check_rate_limit(request: Request) -> None:
     """
     client_ip = request.client.host if request.client else "unknown"
 
-    if not rate_limiter.is_allowed(client_ip):
-        logger.warning(f"速率限制: 客户端 {client_ip} 请求过于频繁")
+    retry_after = await _acquire(rate_limiter, client_ip, 1)
+    RATE_LIMIT_DECISIONS.inc(limiter="request", decision="limited" if retry_after > 0 else "allowed")
+    if retry_after > 0:
+        logger.warning("速率限制: 客户端 %s 请求过于频繁", client_ip)
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail=f"Rate limit exceeded. Maximum {RATE_LIMIT_PER_MINUTE} requests per minute."
+            detail=f"Rate limit exceeded. Maximum {RATE_LIMIT_PER_MINUTE} requests per minute.",
+            headers={"Retry-After": str(math.ceil(retry_after))}
         )
 
-    logger.debug(f"速率检查通过: {client_ip}")
+    logger.debug("速率检查通过: %s", client_ip)
+
+
+async def check_batch_rate_limit(request: Request, cost: int) -> None:
+    """
+    按问题数检查批量接口的速率限制（在 check_rate_limit 之外另行计费）
+
+    Args:
+        request: FastAPI 请求对象
+        cost: 本批问题数
+
+    Raises:
+        HTTPException: 超过批量限额时抛出 429 错误
+    """
+    client_ip = request.client.host if request.client else "unknown"
+
+    retry_after = await _acquire(batch_rate_limiter, client_ip, cost)
+    RATE_LIMIT_DECISIONS.inc(limiter="batch", decision="limited" if retry_after > 0 else "allowed")
+    if retry_after > 0:
+        logger.warning("批量速率限制: 客户端 %s 提交 %d 个问题超出限额", client_ip, cost)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Batch rate limit exceeded. Maximum {batch_rate_limiter.max_requests} questions per hour.",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
@@ -1,24 +1,84 @@
-import os
+import asyncio
+import hashlib
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Optional
-import pdfplumber
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import groq
+import httpx
+import numpy as np
+from chromadb.api.client import SharedSystemClient
 from langchain_chroma import Chroma
 from langchain_groq import ChatGroq
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_core.language_models import BaseChatModel
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
 from langchain_core.documents import Document
-
-from app.config import PDF_DIR, PDF_FILES, DB_PATH, LLM_MODEL, EMBED_MODEL, GROQ_API_KEY
+from langchain_core.embeddings import Embeddings
+
+from app.chunk_store import ChunkStore
+from app.cache import CachedAnswer, SemanticAnswerCache, VersionedLRUCache, normalize_question
+from app.context import assemble_context
+from app.embeddings import OnnxEmbeddings, create_embeddings
+from app.config import (
+    DB_PATH, LLM_MODEL, GROQ_API_KEY, RETRIEVAL_WORKERS, SHARED_INDEX, VECTOR_BACKEND,
+    RETRIEVAL_MODE, RETRIEVAL_K, RETRIEVAL_K_PER_COURSE, RRF_K, BATCH_LLM_CONCURRENCY,
+    LLM_REQUEST_TIMEOUT, LLM_MAX_CONNECTIONS, LLM_MAX_KEEPALIVE_CONNECTIONS,
+    ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL_SECONDS, ANSWER_CACHE_SIMILARITY,
+    EMBEDDING_CACHE_SIZE, RETRIEVAL_CACHE_SIZE, COALESCE_REQUESTS, REQUEST_DEADLINE_SECONDS, LLM_MAX_RETRIES,
+    FACT_ANSWERS
+)
+from app.facts import FactIndex
+from app.ingest import MANIFEST_FILE, ingest_running, load_manifest, normalize_course_code, stale_files
+from app.lexical import BM25Index, build_lexical_index, reciprocal_rank_fusion
+from app.llm_scheduler import LLMScheduler, LLMUnavailableError, is_retryable
 from app.logger import setup_logger
+from app.metrics import (
+    CACHE_LOOKUPS, CONTEXT_CHARS, FACT_ANSWER_HITS, RETRIEVED_CHUNKS, StageTimer, record_token_usage
+)
+from app.singleflight import SingleFlight
+from app.snapshot import IndexSnapshot
 
 # 初始化日志
 logger = setup_logger(__name__)
 
+# 向量检索后端（VECTOR_BACKEND）
+VECTOR_BACKENDS = ("chroma", "numpy")
+
+# 回答生成的 Prompt 模板（启动时解析一次）
+ANSWER_PROMPT_TEMPLATE = """
+You are an intelligent teaching assistant with access to multiple course documents and materials.
+
+Answer the student's question based ONLY on the context provided below.
+The context may come from different courses or documents - each piece has metadata showing its source.
+
+IMPORTANT INSTRUCTIONS:
+1. If the answer is in the context, provide a clear and helpful response
+2. At the end of your answer, cite the source(s) by mentioning the course/document name (e.g., "Source: MAT235Y1")
+3. If information comes from multiple sources, list all of them
+4. If the answer is not in any of the provided context, say "I cannot find this information in the available documents."
+5. You can synthesize information from multiple courses if relevant to the question
+
+Context (with source metadata):
+{context}
+
+Question:
+{question}
+
+Answer (remember to cite sources):
+"""
+
+
+@dataclass
+class AnswerResult:
+    """批量问答中单个问题的结果：成功时有 answer，失败时有 error"""
+    answer: Optional[str] = None
+    sources: List[Dict] = field(default_factory=list)
+    cached: bool = False
+    error: Optional[str] = None
+
 
 def extract_course_codes(question: str) -> List[str]:
     """从问题中提取课程代码（基础代码，不包含后缀）
@@ -35,242 +95,724 @@ def extract_course_codes(question: str) -> List[str]:
     Returns:
         提取到的基础课程代码列表（大写，只包含3字母+3数字）
     """
-    # 匹配课程代码模式：3个字母 + 3个数字（忽略后缀）
-    pattern = r'\b([A-Z]{3}\d{3})'
+    # 匹配课程代码模式：3个字母 + 3个数字（忽略后缀）；后面紧跟数字的不是课程代码（例如讲课班级 LEC0201）
+    pattern = r'\b([A-Z]{3}\d{3})(?!\d)'
     matches = re.findall(pattern, question, re.IGNORECASE)
 
     # 转换为大写并去重
     course_codes = list(set(match.upper() for match in matches))
 
     if course_codes:
-        logger.info(f"从问题中提取到课程代码: {course_codes}")
+        logger.info("从问题中提取到课程代码: %s", course_codes)
     else:
         logger.debug("未从问题中提取到课程代码")
 
     return course_codes
 
+
 class RAGService:
     """RAG (Retrieval-Augmented Generation) 服务类"""
 
-    def __init__(self):
+    def __init__(self, llm: Optional[BaseChatModel] = None, initialize: bool = True):
+        """
+        Args:
+            llm: 可选的 Chat 模型实例，默认使用共享连接池的 ChatGroq
+            initialize: 是否立即初始化；为 False 时由调用方（例如应用 lifespan）稍后调用 initialize_rag()
+        """
+        # 向量库目录（摄取清单、片段存储、BM25 索引和快照都在其中）
+        self.db_path = DB_PATH
         self.vector_store: Optional[Chroma] = None
-        self.retriever = None
+        # NumPy 检索后端（VECTOR_BACKEND=numpy 或共享模式）下代替 vector_store 的只读内存映射快照
+        self.snapshot: Optional[IndexSnapshot] = None
+        # 片段文本和元数据的紧凑存储；缺失时（旧向量库）从 Chroma 读取
+        self.chunk_store: Optional[ChunkStore] = None
+        self.embeddings: Optional[Embeddings] = None
+        # 基础课程代码 -> 文档 ID 列表 / 向量库中存储的课程名
+        self.course_index: Dict[str, List[str]] = {}
+        self.course_names: Dict[str, List[str]] = {}
+        # 索引版本，每次摄取导致向量库变化时递增；reload_index() 发现清单中的版本变化时重新加载索引
+        self.index_version = 0
+        self._manifest_mtime: Optional[int] = None
+        self._reload_lock = threading.Lock()
+        # BM25 词法索引（RETRIEVAL_MODE=hybrid 时加载）
+        self.lexical_index: Optional[BM25Index] = None
+        # 结构化课程事实索引（FACT_ANSWERS 开启时从摄取清单加载），高频问题直接回答
+        self.fact_index: Optional[FactIndex] = None
+        self.llm: Optional[BaseChatModel] = llm
+        self.prompt: Optional[ChatPromptTemplate] = None
         self.chain = None
-        self.initialize_rag()
+        # 同步调用（CLI、get_answers）使用的带重试 chain；异步调用的重试、并发和熔断由 llm_scheduler 负责
+        self.sync_chain = None
+        self.llm_scheduler = LLMScheduler()
+        # 检索在有界线程池中执行，避免阻塞事件循环
+        self._executor = ThreadPoolExecutor(
+            max_workers=RETRIEVAL_WORKERS,
+            thread_name_prefix="rag-retrieval"
+        )
+        # 答案缓存：精确匹配 + 语义近邻，向量库重建时清空
+        self.answer_cache = SemanticAnswerCache(
+            max_size=ANSWER_CACHE_SIZE,
+            ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+            similarity_threshold=ANSWER_CACHE_SIMILARITY
+        )
+        # 问题嵌入缓存和检索结果缓存：索引版本不变时结果确定，版本变化时清空
+        self.embedding_cache = VersionedLRUCache("embedding", EMBEDDING_CACHE_SIZE)
+        self.retrieval_cache = VersionedLRUCache("retrieval", RETRIEVAL_CACHE_SIZE)
+        # 进行中的相同问题（/chat）合并为一次计算
+        self._inflight = SingleFlight("answer")
+        # 初始化状态: starting -> ready / failed
+        self.status = "starting"
+        if initialize:
+            self.initialize_rag()
+
+    @property
+    def is_ready(self) -> bool:
+        """是否已完成初始化、可以回答问题"""
+        return self.status == "ready"
 
     def initialize_rag(self) -> None:
-        """初始化 RAG 引擎"""
+        """初始化 RAG 引擎
+
+        以只读方式打开由 `python -m app.ingest` 预先构建的向量库，不解析、不嵌入任何 PDF。
+
+        Raises:
+            RuntimeError: 向量库尚未构建时
+        """
         logger.info("正在初始化 RAG 引擎...")
+        start = time.perf_counter()
 
         try:
             # 1. 模型初始化
-            logger.info(f"初始化嵌入模型: {EMBED_MODEL}")
-            embeddings = HuggingFaceEmbeddings(
-                model_name=EMBED_MODEL,
-                model_kwargs={'device': 'cpu'},
-                encode_kwargs={'normalize_embeddings': True}
+            self.embeddings = create_embeddings()
+
+            if self.llm is None:
+                logger.info(f"初始化 LLM 模型: {LLM_MODEL}")
+                self.llm = self._create_llm()
+
+            # 2. 只读打开预先构建的向量库
+            manifest_mtime = self._manifest_mtime_ns()
+            manifest = load_manifest(self.db_path)
+            if not manifest["files"]:
+                raise RuntimeError(f"向量库尚未构建: {self.db_path}，请先运行 python -m app.ingest")
+            stale = stale_files(manifest)
+            if stale:
+                logger.warning(f"向量库相对以下文档已过期，请运行 python -m app.ingest: {stale}")
+            self._open_index(manifest)
+            self._manifest_mtime = manifest_mtime
+
+            # 3. 预先构建 Prompt 和 Chain，所有请求共享
+            # chain 输出 AIMessage（而不是字符串），以便读取 token 用量
+            self.prompt = ChatPromptTemplate.from_template(ANSWER_PROMPT_TEMPLATE)
+            self.chain = self.prompt | self.llm
+            self.sync_chain = self.chain.with_retry(
+                retry_if_exception_type=(groq.APIConnectionError, groq.RateLimitError, groq.InternalServerError),
+                stop_after_attempt=LLM_MAX_RETRIES + 1
+            )
+            self.status = "ready"
+            logger.info(
+                f"RAG 系统初始化完成（索引版本 {self.index_version}），"
+                f"耗时 {time.perf_counter() - start:.2f}s，系统就绪！"
             )
 
-            logger.info(f"初始化 LLM 模型: {LLM_MODEL}")
-            llm = ChatGroq(
-                groq_api_key=GROQ_API_KEY,
-                model_name=LLM_MODEL,
-                temperature=0
+        except Exception as e:
+            self.status = "failed"
+            logger.error(f"RAG 初始化失败: {str(e)}", exc_info=True)
+            raise
+
+    def _manifest_mtime_ns(self) -> Optional[int]:
+        """摄取清单文件的修改时间（ns），文件不存在时返回 None"""
+        try:
+            return (Path(self.db_path) / MANIFEST_FILE).stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _open_index(self, manifest: Dict) -> None:
+        """按摄取清单打开只读索引并替换当前索引
+
+        向量检索后端、片段存储、课程索引、BM25 索引和事实索引全部加载完成后才一起替换，
+        加载失败时当前索引不受影响；替换后按新的索引版本清空答案、嵌入和检索缓存。
+
+        Args:
+            manifest: 摄取清单
+
+        Raises:
+            RuntimeError: 索引快照缺失或与清单版本不一致时
+            ValueError: 未知的向量检索后端
+        """
+        index_version = manifest["index_version"]
+        vector_store: Optional[Chroma] = None
+        snapshot: Optional[IndexSnapshot] = None
+        if VECTOR_BACKEND not in VECTOR_BACKENDS:
+            raise ValueError(f"未知的向量检索后端: {VECTOR_BACKEND}，可选: {', '.join(VECTOR_BACKENDS)}")
+        if SHARED_INDEX or VECTOR_BACKEND == "numpy":
+            # NumPy 后端：不打开 Chroma（共享模式下 SQLite 连接和 HNSW 索引也不能跨 fork 共享），只映射只读快照
+            snapshot = IndexSnapshot.load(self.db_path)
+            if snapshot is None or snapshot.index_version != index_version:
+                raise RuntimeError(f"索引快照缺失或与向量库版本不一致: {self.db_path}，请运行 python -m app.ingest")
+            chunk_store = snapshot.chunks
+        else:
+            logger.info(f"打开向量库: {self.db_path}")
+            vector_store = Chroma(persist_directory=self.db_path, embedding_function=self.embeddings)
+            # Chroma 只负责向量检索，片段文本和元数据从紧凑存储读取
+            chunk_store = ChunkStore.load(self.db_path)
+            if chunk_store is None or chunk_store.index_version != index_version:
+                logger.warning("片段存储缺失或已过期，从 Chroma 读取片段（运行 python -m app.ingest 可重建）")
+                chunk_store = None
+        course_index, course_names = self._build_course_index(chunk_store, vector_store)
+        lexical_index = None
+        if RETRIEVAL_MODE == "hybrid":
+            lexical_index = self._load_lexical_index(chunk_store, vector_store, index_version)
+        fact_index = None
+        if FACT_ANSWERS:
+            fact_index = FactIndex.from_manifest(manifest)
+            logger.info(f"结构化事实索引加载完成: {fact_index.counts()}")
+
+        self.vector_store, self.snapshot, self.chunk_store = vector_store, snapshot, chunk_store
+        self.course_index, self.course_names = course_index, course_names
+        self.lexical_index, self.fact_index = lexical_index, fact_index
+        self.index_version = index_version
+        self.answer_cache.set_version(index_version)
+        self.embedding_cache.set_version(index_version)
+        self.retrieval_cache.set_version(index_version)
+
+    def reload_index(self) -> bool:
+        """摄取清单中的索引版本变化时（python -m app.ingest 更新了向量库）重新加载索引
+
+        先比较清单文件的修改时间，未变化时不读取清单；摄取进行中时跳过，等待下次检查。
+        新索引加载失败时继续使用当前索引，下次检查时重试。
+        应用 lifespan 中的后台任务每 INDEX_RELOAD_INTERVAL 秒在线程池中调用。
+
+        Returns:
+            是否加载了新版本的索引
+        """
+        if not self.is_ready:
+            return False
+        manifest_mtime = self._manifest_mtime_ns()
+        if manifest_mtime is None or manifest_mtime == self._manifest_mtime:
+            return False
+
+        with self._reload_lock:
+            if ingest_running(self.db_path):
+                logger.info("摄取进行中，稍后再检查索引版本")
+                return False
+            manifest = load_manifest(self.db_path)
+            if not manifest["files"] or manifest["index_version"] == self.index_version:
+                self._manifest_mtime = manifest_mtime
+                return False
+
+            old_version = self.index_version
+            logger.info(f"索引版本 {old_version} -> {manifest['index_version']}，重新加载索引")
+            start = time.perf_counter()
+            try:
+                if self.vector_store is not None:
+                    # chromadb 在进程内按目录复用客户端，其 HNSW 索引不会读到其它进程（摄取）的写入，
+                    # 需要丢弃缓存的客户端才能打开新的索引
+                    SharedSystemClient.clear_system_cache()
+                self._open_index(manifest)
+            except Exception as e:
+                logger.error(f"重新加载索引失败，继续使用索引版本 {old_version}: {e}", exc_info=True)
+                return False
+            self._manifest_mtime = manifest_mtime
+            logger.info(
+                f"索引已重新加载（版本 {old_version} -> {self.index_version}），"
+                f"耗时 {time.perf_counter() - start:.2f}s"
             )
+            return True
 
-            # 2. 检查并建立向量库
-            if not os.path.exists(DB_PATH):
-                logger.info("未发现数据库，正在处理 PDF 文件...")
-                self._load_pdfs_to_vector_store(embeddings)
-            else:
-                logger.info(f"从 {DB_PATH} 加载已有向量库...")
-                self.vector_store = Chroma(
-                    persist_directory=DB_PATH,
-                    embedding_function=embeddings
-                )
+    def after_fork(self) -> None:
+        """在 fork 出的 worker 进程中调用（gunicorn post_fork 钩子）
 
-            # 3. 设置检索器
-            logger.info("配置检索器 (K=5)...")
-            self.retriever = self.vector_store.as_retriever(search_kwargs={"k": 5})
+        torch 模型权重和索引快照以写时复制方式与主进程共享；ONNX Runtime 会话的线程池
+        不能跨 fork 使用，需要在 worker 中重新创建（ONNX 模型较小，加载只需零点几秒）。
+        """
+        if isinstance(self.embeddings, OnnxEmbeddings):
+            self.embeddings = create_embeddings()
 
-            # 4. 设置 Prompt 和 Chain
-            template = """
-            You are an intelligent teaching assistant with access to multiple course documents and materials.
+    def close(self) -> None:
+        """释放检索线程池（应用关闭时调用）"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
 
-            Answer the student's question based ONLY on the context provided below.
-            The context may come from different courses or documents - each piece has metadata showing its source.
+    @staticmethod
+    def _create_llm() -> ChatGroq:
+        """创建长期复用的 ChatGroq 客户端
 
-            IMPORTANT INSTRUCTIONS:
-            1. If the answer is in the context, provide a clear and helpful response
-            2. At the end of your answer, cite the source(s) by mentioning the course/document name (e.g., "Source: MAT235Y")
-            3. If information comes from multiple sources, list all of them
-            4. If the answer is not in any of the provided context, say "I cannot find this information in the available documents."
-            5. You can synthesize information from multiple courses if relevant to the question
+        同步和异步请求各使用一个带 keep-alive 连接池的 httpx 客户端，
+        后续请求复用已建立的 TLS 连接。关闭 SDK 自带的重试，由 sync_chain / llm_scheduler 统一重试。
 
-            Context (with source metadata):
-            {context}
+        Returns:
+            ChatGroq 实例
+        """
+        limits = httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS
+        )
+        return ChatGroq(
+            groq_api_key=GROQ_API_KEY,
+            model_name=LLM_MODEL,
+            temperature=0,
+            request_timeout=LLM_REQUEST_TIMEOUT,
+            max_retries=0,
+            http_client=httpx.Client(limits=limits, timeout=LLM_REQUEST_TIMEOUT),
+            http_async_client=httpx.AsyncClient(limits=limits, timeout=LLM_REQUEST_TIMEOUT)
+        )
 
-            Question:
-            {question}
+    @staticmethod
+    def _build_course_index(
+        chunk_store: Optional[ChunkStore], vector_store: Optional[Chroma]
+    ) -> Tuple[Dict[str, List[str]], Dict[str, List[str]]]:
+        """从向量库元数据构建内存中的课程索引
 
-            Answer (remember to cite sources):
-            """
-            prompt = ChatPromptTemplate.from_template(template)
+        记录每个基础课程代码对应的文档 ID 和向量库中实际存储的课程名，
+        检索时可直接构造命中正确分区的过滤条件。兼容没有 course_base 字段的旧向量库。
 
-            self.chain = (
-                {"context": self.retriever, "question": RunnablePassthrough()}
-                | prompt
-                | llm
-                | StrOutputParser()
-            )
-            logger.info("RAG 系统初始化完成，系统就绪！")
+        Args:
+            chunk_store: 片段存储，缺失时从 vector_store 读取元数据
+            vector_store: Chroma 向量库
 
-        except Exception as e:
-            logger.error(f"RAG 初始化失败: {str(e)}", exc_info=True)
-            raise
+        Returns:
+            (基础课程代码 -> 文档 ID 列表, 基础课程代码 -> 向量库中存储的课程名列表)
+        """
+        if chunk_store is not None:
+            data = {"ids": chunk_store.ids, "metadatas": chunk_store.course_metadatas()}
+        else:
+            data = vector_store.get(include=["metadatas"])
+        course_index: Dict[str, List[str]] = {}
+        course_names: Dict[str, set] = {}
+
+        for doc_id, meta in zip(data["ids"], data["metadatas"]):
+            meta = meta or {}
+            course = meta.get("course", "")
+            course_base = meta.get("course_base") or normalize_course_code(course)
+            if not course_base:
+                continue
+            course_index.setdefault(course_base, []).append(doc_id)
+            course_names.setdefault(course_base, set()).add(course)
+
+        sizes = {base: len(ids) for base, ids in course_index.items()}
+        logger.info(f"课程索引构建完成: {sizes}")
+        return course_index, {base: sorted(names) for base, names in course_names.items()}
+
+    def _load_lexical_index(
+        self, chunk_store: Optional[ChunkStore], vector_store: Optional[Chroma], index_version: int
+    ) -> BM25Index:
+        """加载摄取时持久化的 BM25 索引；缺失或与向量库版本不一致时在内存中重建（不写盘）"""
+        index = BM25Index.load(self.db_path)
+        if index is None or index.index_version != index_version:
+            logger.warning("BM25 索引缺失或已过期，在内存中重建（运行 python -m app.ingest 可持久化）")
+            if chunk_store is not None:
+                index = BM25Index.build(
+                    chunk_store.ids, (chunk_store.text(row) for row in range(len(chunk_store))),
+                    chunk_store.course_metadatas(), index_version
+                )
+            else:
+                index = build_lexical_index(vector_store, index_version)
+        else:
+            logger.info(f"已加载 BM25 索引: {len(index)} 个片段")
+        return index
 
-    def _extract_tables_from_pdf(self, pdf_path: Path) -> List[str]:
-        """从 PDF 中提取所有表格并格式化为文本
+    def _course_filter(self, course_codes: List[str]) -> Optional[Dict]:
+        """根据课程索引构建 Chroma 元数据过滤条件（多个课程合并为一个 $in 过滤）
 
         Args:
-            pdf_path: PDF 文件路径
+            course_codes: 基础课程代码列表
 
         Returns:
-            格式化的表格文本列表
+            过滤条件；没有任何课程在索引中时返回 None
         """
-        tables_text = []
+        names = [name for code in course_codes for name in self.course_names.get(code, [])]
+        if not names:
+            return None
+        if len(names) == 1:
+            return {"course": names[0]}
+        return {"course": {"$in": names}}
+
+    @staticmethod
+    def _cap_per_course(docs: List[Document], course_codes: List[str], per_course: int) -> List[Document]:
+        """按基础课程代码分组，每个课程最多保留 per_course 个文档（保持相似度顺序）"""
+        counts = {code: 0 for code in course_codes}
+        kept = []
+        for doc in docs:
+            code = doc.metadata.get("course_base") or normalize_course_code(doc.metadata.get("course", ""))
+            if code in counts and counts[code] < per_course:
+                counts[code] += 1
+                kept.append(doc)
+        return kept
+
+    def _get_documents(self, ids: List[str]) -> Dict[str, Document]:
+        """按片段 ID 取回文档：优先从紧凑片段存储读取，否则从向量库一次查询
 
-        try:
-            with pdfplumber.open(pdf_path) as pdf:
-                for page_num, page in enumerate(pdf.pages, start=1):
-                    # 提取该页的所有表格
-                    tables = page.extract_tables()
+        Returns:
+            片段 ID -> 文档（ChunkRecord 或 Document，接口相同），不存在的 ID 不出现在结果中
+        """
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return {}
+        if self.chunk_store is not None:
+            return self.chunk_store.get_records(ids)
+        data = self.vector_store.get(ids=ids, include=["documents", "metadatas"])
+        return {
+            chunk_id: Document(id=chunk_id, page_content=text, metadata=meta or {})
+            for chunk_id, text, meta in zip(data["ids"], data["documents"], data["metadatas"])
+        }
+
+    def _query_vectors(
+        self, embeddings: List[List[float]], k: int, course_filter: Optional[Dict] = None
+    ) -> List[List[Tuple[str, Document]]]:
+        """批量向量检索
+
+        langchain 的 Chroma 封装每次只查询一个向量且不返回 ID，这里直接调用底层集合：
+        同一过滤条件下的多个问题只需一次查询。有片段存储时 Chroma 只返回 ID，
+        结果为按需解码的 ChunkRecord，而不是携带完整文本和元数据的 Document。
 
-                    if tables:
-                        logger.debug(f"在第 {page_num} 页找到 {len(tables)} 个表格")
+        Args:
+            embeddings: 问题嵌入向量列表
+            k: 每个问题返回的文档数
+            course_filter: Chroma 元数据过滤条件
 
-                        for table_idx, table in enumerate(tables, start=1):
-                            if not table or len(table) == 0:
-                                continue
+        Returns:
+            每个问题的 (片段 ID, 文档) 列表，按相似度排序
+        """
+        if self.snapshot is not None:
+            return self.snapshot.query(embeddings, k, course_filter)
+        if self.chunk_store is not None:
+            # 只取 ID，片段从紧凑存储按需读取
+            results = self.vector_store._collection.query(
+                query_embeddings=embeddings, n_results=k, where=course_filter, include=["distances"]
+            )
+            return [
+                [(chunk_id, record) for chunk_id, record in self.chunk_store.get_records(ids).items()]
+                for ids in results["ids"]
+            ]
+        results = self.vector_store._collection.query(
+            query_embeddings=embeddings,
+            n_results=k,
+            where=course_filter,
+            include=["documents", "metadatas"]
+        )
+        return [
+            [
+                (chunk_id, Document(id=chunk_id, page_content=text, metadata=meta or {}))
+                for chunk_id, text, meta in zip(ids, texts, metas)
+            ]
+            for ids, texts, metas in zip(results["ids"], results["documents"], results["metadatas"])
+        ]
+
+    def _search(
+        self,
+        questions: List[str],
+        embeddings: List[List[float]],
+        k: int,
+        course_filter: Optional[Dict] = None,
+        course_codes: Optional[List[str]] = None
+    ) -> List[List[Document]]:
+        """向量检索；启用混合检索时与 BM25 检索结果按 RRF 融合
+
+        两路各取 2k 个候选，融合后返回前 k 个：只被其中一路排在前面的片段
+        （例如精确包含课程代码或术语、但向量相似度一般）也能进入结果。
 
-                            # 格式化表格为文本
-                            table_text = f"\n[Table from Page {page_num}, Table {table_idx}]\n"
+        Args:
+            questions: 用户问题列表（词法检索使用）
+            embeddings: 与 questions 一一对应的问题嵌入向量
+            k: 每个问题返回的文档数
+            course_filter: 向量检索的 Chroma 过滤条件
+            course_codes: 词法检索的课程范围，与 course_filter 对应
 
-                            # 处理表头
-                            if len(table) > 0 and table[0]:
-                                header = " | ".join([str(cell) if cell else "" for cell in table[0]])
-                                table_text += header + "\n"
-                                table_text += "-" * len(header) + "\n"
+        Returns:
+            每个问题按融合排名排序的文档列表
+        """
+        if self.lexical_index is None:
+            return [[doc for _, doc in hits] for hits in self._query_vectors(embeddings, k, course_filter)]
+
+        if course_codes:
+            available = sum(len(self.course_index.get(code, [])) for code in course_codes)
+        else:
+            available = len(self.lexical_index)
+        candidates = min(2 * k, available)
+        vector_hits = self._query_vectors(embeddings, candidates, course_filter)
+        lexical_ids = [
+            [chunk_id for chunk_id, _ in self.lexical_index.search(question, candidates, course_codes)]
+            for question in questions
+        ]
+
+        # 只被词法检索命中的片段需要从向量库取回内容
+        docs_by_id = {chunk_id: doc for hits in vector_hits for chunk_id, doc in hits}
+        docs_by_id.update(self._get_documents(
+            [chunk_id for ids in lexical_ids for chunk_id in ids if chunk_id not in docs_by_id]
+        ))
+
+        results = []
+        for hits, ids in zip(vector_hits, lexical_ids):
+            fused = reciprocal_rank_fusion(
+                [[chunk_id for chunk_id, _ in hits], [chunk_id for chunk_id in ids if chunk_id in docs_by_id]],
+                k=RRF_K
+            )
+            results.append([docs_by_id[chunk_id] for chunk_id in fused[:k]])
+        return results
 
-                            # 处理表格内容
-                            for row in table[1:]:
-                                if row:
-                                    row_text = " | ".join([str(cell) if cell else "" for cell in row])
-                                    table_text += row_text + "\n"
+    def _embed_questions(self, questions: List[str]) -> List[List[float]]:
+        """计算问题嵌入，先查嵌入缓存（按规范化问题），只对未命中的问题调用模型
 
-                            tables_text.append(table_text)
-                            logger.debug(f"提取表格: {table_text[:100]}...")
+        Args:
+            questions: 用户问题列表
 
-        except Exception as e:
-            logger.warning(f"提取表格时出错: {str(e)}")
+        Returns:
+            与 questions 一一对应的嵌入向量
+        """
+        keys = [normalize_question(question) for question in questions]
+        vectors = [self.embedding_cache.get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            if len(missing) == 1:
+                computed = [self.embeddings.embed_query(questions[missing[0]])]
+            else:
+                computed = self.embeddings.embed_documents([questions[i] for i in missing])
+            for i, embedding in zip(missing, computed):
+                # 以 float32 数组保存，比 Python float 列表小约 8 倍
+                vectors[i] = np.asarray(embedding, dtype=np.float32)
+                self.embedding_cache.put(keys[i], vectors[i])
+        return [vector.tolist() for vector in vectors]
 
-        return tables_text
+    def _retrieve_batch(
+        self, questions: List[str], embeddings: List[List[float]], course_codes: List[str]
+    ) -> List[List[Document]]:
+        """检索一组课程代码相同的问题的相关文档，先查检索结果缓存
 
-    def _load_pdfs_to_vector_store(self, embeddings: HuggingFaceEmbeddings) -> None:
-        """加载所有 PDF 文件到向量数据库，为每个文档添加元数据
+        缓存键为 (问题嵌入的哈希, 课程过滤, k, 检索模式)，值为片段 ID 列表；
+        命中的问题只需按 ID 从向量库取回片段，未命中的问题走完整检索（见 _retrieve_uncached）。
 
         Args:
-            embeddings: HuggingFace 嵌入模型实例
+            questions: 用户问题列表
+            embeddings: 与 questions 一一对应的问题嵌入向量
+            course_codes: 这组问题共同的课程代码
 
-        Raises:
-            FileNotFoundError: 当未找到任何 PDF 文件时
+        Returns:
+            每个问题检索到的文档列表
         """
-        all_splits: List[Document] = []
+        # 检索期间索引可能被重新加载，结果只写入检索开始时的版本
+        version = self.index_version
+        scope = (tuple(sorted(course_codes or [])), RETRIEVAL_K, RETRIEVAL_K_PER_COURSE, RETRIEVAL_MODE)
+        keys = [
+            (hashlib.blake2b(np.asarray(embedding, dtype=np.float32).tobytes(), digest_size=16).digest(),) + scope
+            for embedding in embeddings
+        ]
+        cached_ids = [self.retrieval_cache.get(key) for key in keys]
+        results: List[Optional[List[Document]]] = [None] * len(questions)
+
+        hits = [i for i, ids in enumerate(cached_ids) if ids is not None]
+        if hits:
+            docs_by_id = self._get_documents([chunk_id for i in hits for chunk_id in cached_ids[i]])
+            for i in hits:
+                results[i] = [docs_by_id[chunk_id] for chunk_id in cached_ids[i] if chunk_id in docs_by_id]
+
+        missing = [i for i, ids in enumerate(cached_ids) if ids is None]
+        if missing:
+            retrieved = self._retrieve_uncached(
+                [questions[i] for i in missing], [embeddings[i] for i in missing], course_codes
+            )
+            for i, docs in zip(missing, retrieved):
+                results[i] = docs
+                self.retrieval_cache.put(keys[i], [doc.id for doc in docs], version)
+        return results
 
-        for pdf_file in PDF_FILES:
-            pdf_path = PDF_DIR / pdf_file
-            if not pdf_path.exists():
-                logger.warning(f"找不到文件: {pdf_path}")
-                continue
+    def _retrieve_uncached(
+        self, questions: List[str], embeddings: List[List[float]], course_codes: List[str]
+    ) -> List[List[Document]]:
+        """检索一组课程代码相同的问题的相关文档，支持智能课程过滤
 
-            # 从文件名提取课程信息（例如：MAT235Y.pdf -> MAT235Y）
-            course_name = pdf_path.stem  # 去掉 .pdf 后缀
-            logger.info(f"正在处理文档: {pdf_file} (课程/文档: {course_name})")
+        每个问题只嵌入一次，所有搜索都基于同一向量进行：多课程问题使用单个 $in 过滤，
+        课程名来自启动时构建的课程索引，第一次搜索即命中正确分区。
+        混合检索模式下每次搜索都与同一范围内的 BM25 结果融合。
 
+        Args:
+            questions: 用户问题列表
+            embeddings: 与 questions 一一对应的问题嵌入向量
+            course_codes: 这组问题共同的课程代码
+
+        Returns:
+            每个问题检索到的文档列表
+        """
+        # 根据是否找到课程代码，使用不同的检索策略
+        if not course_codes:
+            # 未找到课程代码 - 跨课程检索
+            logger.info("未找到课程代码，使用跨课程检索（K=%d）", RETRIEVAL_K)
+            return self._search(questions, embeddings, RETRIEVAL_K)
+
+        # 找到课程代码 - 通过课程索引直接过滤到对应分区，每个课程最多 RETRIEVAL_K_PER_COURSE 个文档
+        logger.info("使用课程过滤检索: %s", course_codes)
+        per_course = RETRIEVAL_K_PER_COURSE
+        course_filter = self._course_filter(course_codes)
+        results: List[List[Document]] = [[] for _ in questions]
+
+        if course_filter is None:
+            logger.warning("课程 %s 不在索引中", course_codes)
+        else:
+            # k 不超过分区内的文档数
+            partition_size = sum(len(self.course_index.get(code, [])) for code in course_codes)
             try:
-                # 1. 使用 PyPDFLoader 加载普通文本
-                loader = PyPDFLoader(str(pdf_path))
-                docs = loader.load()
-                logger.debug(f"从 {pdf_file} 加载了 {len(docs)} 页文本")
-
-                # 为每个文档页添加元数据
-                for doc in docs:
-                    doc.metadata["source_file"] = pdf_file
-                    doc.metadata["course"] = course_name
-                    doc.metadata["content_type"] = "text"
-                    # 保留原有的 page 信息（如果有）
-                    if "page" not in doc.metadata:
-                        doc.metadata["page"] = 0
-
-                # 2. 使用 pdfplumber 提取表格
-                logger.info(f"正在提取 {pdf_file} 中的表格...")
-                tables_text = self._extract_tables_from_pdf(pdf_path)
-
-                if tables_text:
-                    logger.info(f"从 {pdf_file} 中提取了 {len(tables_text)} 个表格")
-                    # 将每个表格创建为独立的文档
-                    for idx, table_text in enumerate(tables_text):
-                        table_doc = Document(
-                            page_content=table_text,
-                            metadata={
-                                "source_file": pdf_file,
-                                "course": course_name,
-                                "content_type": "table",
-                                "table_index": idx + 1
-                            }
-                        )
-                        docs.append(table_doc)
-                else:
-                    logger.debug(f"{pdf_file} 中未找到表格")
-
-                # 3. 分割文档（文本和表格）
-                text_splitter = RecursiveCharacterTextSplitter(
-                    chunk_size=1500,  # 增加 chunk_size 以更好地保留表格
-                    chunk_overlap=300
+                batch = self._search(
+                    questions, embeddings,
+                    k=min(per_course * len(course_codes), partition_size),
+                    course_filter=course_filter,
+                    course_codes=course_codes
                 )
-                splits = text_splitter.split_documents(docs)
+                results = [self._cap_per_course(docs, course_codes, per_course) for docs in batch]
+                logger.info("从 %s 检索到 %d 个文档", course_codes, sum(len(docs) for docs in results))
+            except Exception as e:
+                logger.warning("检索课程 %s 时出错: %s", course_codes, e)
 
-                # 确保分割后的文档也保留元数据
-                for split in splits:
-                    split.metadata["source_file"] = pdf_file
-                    split.metadata["course"] = course_name
+        empty = [i for i, docs in enumerate(results) if not docs]
+        if empty:
+            logger.warning("未找到课程 %s 的文档，尝试全局检索", course_codes)
+            fallback = self._search([questions[i] for i in empty], [embeddings[i] for i in empty], RETRIEVAL_K)
+            for i, docs in zip(empty, fallback):
+                results[i] = docs
 
-                all_splits.extend(splits)
-                logger.info(f"文档 {pdf_file} 处理完成：{len(splits)} 个片段（包含表格）")
+        return results
 
-            except Exception as e:
-                logger.error(f"处理文档 {pdf_file} 时出错: {str(e)}", exc_info=True)
+    def _retrieve_documents(self, question: str, embedding: List[float], course_codes: List[str]) -> List[Document]:
+        """检索单个问题的相关文档（见 _retrieve_batch）"""
+        return self._retrieve_batch([question], [embedding], course_codes)[0]
+
+    def _lookup_and_retrieve(
+        self, question: str, course_codes: List[str], timer: StageTimer
+    ) -> Tuple[List[float], Optional[CachedAnswer], List[Document]]:
+        """计算问题嵌入并查找语义缓存，未命中时检索文档（阻塞操作）
+
+        Args:
+            question: 用户提出的问题
+            course_codes: 从问题中提取到的课程代码
+            timer: 当前请求的分阶段计时器
+
+        Returns:
+            (问题嵌入, 缓存答案或 None, 检索到的文档列表)，缓存命中时文档列表为空
+        """
+        with timer.stage("embed"):
+            embedding = self._embed_questions([question])[0]
+        with timer.stage("cache"):
+            cached = self.answer_cache.get_similar(embedding, course_codes)
+        if cached is not None:
+            CACHE_LOOKUPS.inc(result="semantic")
+            return embedding, cached, []
+        CACHE_LOOKUPS.inc(result="miss")
+        with timer.stage("retrieve"):
+            docs = self._retrieve_documents(question, embedding, course_codes)
+        return embedding, None, docs
+
+    def _lookup_and_retrieve_batch(
+        self, questions: List[str], course_codes: List[List[str]], timer: StageTimer
+    ) -> Tuple[List[List[float]], List[Optional[CachedAnswer]], List[List[Document]]]:
+        """批量计算问题嵌入并查找语义缓存，未命中的问题按课程代码分组检索（阻塞操作）
+
+        所有问题在一次前向计算中嵌入；课程代码相同的问题共享同一个过滤条件，一次向量查询完成。
+
+        Args:
+            questions: 用户问题列表
+            course_codes: 与 questions 一一对应的课程代码
+            timer: 整批请求共享的分阶段计时器
+
+        Returns:
+            (问题嵌入列表, 缓存答案或 None 的列表, 文档列表的列表)，均与 questions 一一对应
+        """
+        with timer.stage("embed"):
+            embeddings = self._embed_questions(questions)
+        with timer.stage("cache"):
+            cached = [self.answer_cache.get_similar(e, codes) for e, codes in zip(embeddings, course_codes)]
+
+        groups: Dict[Tuple[str, ...], List[int]] = {}
+        for i, (hit, codes) in enumerate(zip(cached, course_codes)):
+            CACHE_LOOKUPS.inc(result="semantic" if hit is not None else "miss")
+            if hit is None:
+                groups.setdefault(tuple(sorted(codes)), []).append(i)
+
+        docs: List[List[Document]] = [[] for _ in questions]
+        with timer.stage("retrieve"):
+            for codes, indices in groups.items():
+                batch = self._retrieve_batch(
+                    [questions[i] for i in indices], [embeddings[i] for i in indices], list(codes)
+                )
+                for i, item_docs in zip(indices, batch):
+                    docs[i] = item_docs
+        logger.info("批量检索完成: %d 个问题，%d 个课程分组", len(questions), len(groups))
+        return embeddings, cached, docs
+
+    def _lookup_exact(self, question: str, timer: StageTimer) -> Optional[CachedAnswer]:
+        """按规范化问题查找精确缓存，命中时记录指标"""
+        with timer.stage("cache"):
+            cached = self.answer_cache.get_exact(question)
+        if cached is not None:
+            CACHE_LOOKUPS.inc(result="exact")
+        return cached
+
+    def _lookup_facts(self, question: str, course_codes: List[str], timer: StageTimer) -> Optional[CachedAnswer]:
+        """尝试直接从结构化事实索引回答（评分方案、考核权重/日期、教师等），命中时记录指标"""
+        if self.fact_index is None:
+            return None
+        with timer.stage("facts"):
+            fact = self.fact_index.answer(question, course_codes)
+        if fact is None:
+            return None
+        FACT_ANSWER_HITS.inc(intent=fact.intent)
+        return CachedAnswer(answer=fact.answer, sources=fact.sources)
+
+    @staticmethod
+    def _build_context(docs: List[Document], timer: StageTimer) -> Tuple[str, List[Document]]:
+        """组装 LLM 上下文（合并、去重、按预算截取并加来源标签），并记录片段数和上下文长度
+
+        Returns:
+            (上下文文本, 实际进入上下文的文档列表)
+        """
+        with timer.stage("context"):
+            context, used_docs = assemble_context(docs)
+        RETRIEVED_CHUNKS.observe(len(docs))
+        CONTEXT_CHARS.observe(len(context))
+        logger.debug("上下文: %d/%d 个片段，%d 字符", len(used_docs), len(docs), len(context))
+        return context, used_docs
+
+    @staticmethod
+    def _summarize_sources(docs: List[Document]) -> List[Dict]:
+        """提取检索文档的来源元数据（按检索顺序去重）
+
+        Args:
+            docs: 检索到的文档列表
+
+        Returns:
+            来源信息列表，每项包含课程、文件、页码和内容类型
+        """
+        sources = []
+        seen = set()
+        for doc in docs:
+            meta = doc.metadata
+            key = (meta.get("course"), meta.get("page"), meta.get("content_type"))
+            if key in seen:
                 continue
+            seen.add(key)
+            sources.append({
+                "course": meta.get("course"),
+                "source_file": meta.get("source_file"),
+                "page": meta.get("page"),
+                "content_type": meta.get("content_type"),
+            })
+        return sources
+
+    def _ensure_ready(self) -> None:
+        """检查向量库是否已初始化
 
-        if not all_splits:
-            error_msg = f"未找到任何 PDF 文件在 {PDF_DIR}"
+        Raises:
+            RuntimeError: 当系统未初始化时
+        """
+        if not self.is_ready:
+            error_msg = "RAG 系统未初始化"
             logger.error(error_msg)
-            raise FileNotFoundError(error_msg)
-
-        logger.info(f"共处理 {len(all_splits)} 个文档片段，来自 {len(PDF_FILES)} 个文件")
-        logger.info("正在创建向量库...")
-        self.vector_store = Chroma.from_documents(
-            documents=all_splits,
-            embedding=embeddings,
-            persist_directory=DB_PATH
-        )
-        logger.info("向量库创建完成！支持跨文档搜索")
+            raise RuntimeError(error_msg)
 
-    def get_answer(self, question: str) -> str:
+    def get_answer(self, question: str, timer: Optional[StageTimer] = None) -> str:
         """获取问题的答案，支持智能课程过滤
 
+        依次查找精确缓存、结构化事实索引和语义缓存，均未命中时才检索并调用 LLM。
+
         Args:
             question: 用户提出的问题
+            timer: 可选的分阶段计时器，调用方可在返回后读取各阶段耗时
 
         Returns:
             AI 生成的答案
@@ -278,100 +820,409 @@ class RAGService:
         Raises:
             RuntimeError: 当系统未初始化时
         """
-        if not self.vector_store:
-            error_msg = "RAG 系统未初始化"
-            logger.error(error_msg)
-            raise RuntimeError(error_msg)
+        self._ensure_ready()
+        # 答案只写入开始处理时的索引版本的缓存（处理期间索引可能被重新加载）
+        version = self.index_version
 
         try:
-            logger.info(f"处理问题: {question[:100]}...")
+            logger.info("处理问题: %.100s...", question)
+            timer = timer or StageTimer()
 
-            # 1. 从问题中提取课程代码
+            # 1. 精确缓存
+            cached = self._lookup_exact(question, timer)
+            if cached is not None:
+                logger.info("精确缓存命中，耗时 %.1fms", timer.finish() * 1000)
+                return cached.answer
+
+            # 2. 结构化事实
             course_codes = extract_course_codes(question)
+            fact = self._lookup_facts(question, course_codes, timer)
+            if fact is not None:
+                logger.info("事实索引命中，耗时 %.1fms", timer.finish() * 1000)
+                return fact.answer
+
+            # 3. 语义缓存 + 检索相关文档
+            embedding, cached, all_docs = self._lookup_and_retrieve(question, course_codes, timer)
+            if cached is not None:
+                logger.info("语义缓存命中，耗时 %.1fms", timer.finish() * 1000)
+                return cached.answer
+            context, used_docs = self._build_context(all_docs, timer)
+
+            # 4. 使用共享的 chain 生成答案
+            with timer.stage("llm"):
+                message = self.sync_chain.invoke({"context": context, "question": question})
+            answer = message.content
+            record_token_usage(message.usage_metadata)
+
+            self.answer_cache.put(
+                question, course_codes, embedding,
+                CachedAnswer(answer=answer, sources=self._summarize_sources(used_docs)), version
+            )
+            timer.finish()
+            logger.info("成功生成答案，长度: %d 字符，耗时 %s", len(answer), timer.as_header())
+            logger.debug("生成答案: %.200s...", answer)
 
-            # 2. 根据是否找到课程代码，使用不同的检索策略
-            if course_codes:
-                # 找到课程代码 - 精准检索
-                logger.info(f"使用课程过滤检索: {course_codes}")
-
-                # 从所有匹配的课程中检索
-                all_docs = []
-                for course_code in course_codes:
-                    try:
-                        # 先尝试精确匹配课程代码
-                        docs = self.vector_store.similarity_search(
-                            question,
-                            k=5,  # 每个课程检索 5 个文档
-                            filter={"course": course_code}
-                        )
+            return answer
+
+        except Exception as e:
+            logger.error(f"生成答案时出错: {str(e)}", exc_info=True)
+            raise
+
+    async def aget_answer(self, question: str, timer: Optional[StageTimer] = None) -> str:
+        """异步获取问题的答案，不阻塞事件循环
+
+        检索（嵌入 + 向量搜索）在有界线程池中执行，LLM 调用使用异步客户端，
+        因此同一 worker 上的多个请求可以并发重叠，而不是排队。
+        评分方案、考核权重/日期等问题能从结构化事实索引直接回答时不检索、不调用 LLM。
+        精确缓存和事实索引均未命中时，同时进行中的相同问题（规范化问题 + 课程范围）合并为一次检索和 LLM 调用
+        （COALESCE_REQUESTS），失败和取消同样传递给所有等待者。
+
+        Args:
+            question: 用户提出的问题
+            timer: 可选的分阶段计时器，调用方可在返回后读取各阶段耗时
+
+        Returns:
+            AI 生成的答案
+
+        Raises:
+            RuntimeError: 当系统未初始化时
+        """
+        self._ensure_ready()
+
+        try:
+            logger.info("处理问题: %.100s...", question)
+            timer = timer or StageTimer()
+
+            # 1. 精确缓存（无需进入线程池）
+            cached = self._lookup_exact(question, timer)
+            if cached is not None:
+                logger.info("精确缓存命中，耗时 %.1fms", timer.finish() * 1000)
+                return cached.answer
+
+            # 2. 结构化事实（同样无需进入线程池）
+            course_codes = extract_course_codes(question)
+            fact = self._lookup_facts(question, course_codes, timer)
+            if fact is not None:
+                logger.info("事实索引命中，耗时 %.1fms", timer.finish() * 1000)
+                return fact.answer
+            if not COALESCE_REQUESTS:
+                return await self._agenerate(question, course_codes, timer)
+
+            # 3. 合并进行中的相同问题；计算使用第一个请求的计时器
+            key = (normalize_question(question), tuple(sorted(course_codes)))
+            answer, shared = await self._inflight.do(key, lambda: self._agenerate(question, course_codes, timer))
+            if shared:
+                logger.info("合并到进行中的相同问题，耗时 %.1fms", timer.finish() * 1000)
+            return answer
+
+        except LLMUnavailableError:
+            # 过载拒绝已由调度器记录，不打印堆栈
+            raise
+
+        except Exception as e:
+            logger.error(f"生成答案时出错: {str(e)}", exc_info=True)
+            raise
+
+    async def _agenerate(self, question: str, course_codes: List[str], timer: StageTimer) -> str:
+        """查找语义缓存、检索并异步调用 LLM 生成答案（精确缓存已未命中）"""
+        version = self.index_version
+        # 在线程池中查找语义缓存并检索相关文档
+        loop = asyncio.get_running_loop()
+        embedding, cached, all_docs = await loop.run_in_executor(
+            self._executor, self._lookup_and_retrieve, question, course_codes, timer
+        )
+        if cached is not None:
+            logger.info("语义缓存命中，耗时 %.1fms", timer.finish() * 1000)
+            return cached.answer
+        context, used_docs = self._build_context(all_docs, timer)
+
+        # 使用共享的 chain 和异步 LLM 客户端生成答案（经调度器排队，不超过请求截止时间）
+        message = await self.llm_scheduler.run(
+            lambda: self._ainvoke_llm(context, question, timer), timer.start + REQUEST_DEADLINE_SECONDS, timer
+        )
+        answer = message.content
+        record_token_usage(message.usage_metadata)
+
+        self.answer_cache.put(
+            question, course_codes, embedding,
+            CachedAnswer(answer=answer, sources=self._summarize_sources(used_docs)), version
+        )
+        timer.finish()
+        logger.info("成功生成答案，长度: %d 字符，耗时 %s", len(answer), timer.as_header())
+        logger.debug("生成答案: %.200s...", answer)
 
-                        # 如果精确匹配没有结果，尝试前缀匹配（course_code 是基础代码，metadata 可能有后缀）
-                        if not docs:
-                            logger.debug(f"精确匹配 {course_code} 无结果，尝试检索所有文档并过滤")
-                            # 检索更多文档并手动过滤
-                            temp_docs = self.vector_store.similarity_search(question, k=20)
-                            docs = [doc for doc in temp_docs if doc.metadata.get("course", "").startswith(course_code)]
+        return answer
 
-                        all_docs.extend(docs)
-                        logger.info(f"从 {course_code} 检索到 {len(docs)} 个文档")
-                    except Exception as e:
-                        logger.warning(f"检索课程 {course_code} 时出错: {e}")
-                        continue
+    async def _ainvoke_llm(self, context: str, question: str, timer: StageTimer):
+        """调用一次 LLM（每次重试单独计入 "llm" 阶段）"""
+        with timer.stage("llm"):
+            return await self.chain.ainvoke({"context": context, "question": question})
 
-                if not all_docs:
-                    logger.warning(f"未找到课程 {course_codes} 的文档，尝试全局检索")
-                    all_docs = self.vector_store.similarity_search(question, k=10)
+    def _start_batch(
+        self, questions: List[str], timer: StageTimer
+    ) -> Tuple[List[Optional[AnswerResult]], List[int], List[Tuple[int, int]]]:
+        """按规范化问题去重，查找批量问题的精确缓存和结构化事实
 
-                # 手动构建上下文
-                context = "\n\n".join([doc.page_content for doc in all_docs])
+        重复的问题只处理第一次出现的那个，完成后由调用方复制结果。
 
+        Returns:
+            (结果列表（命中的位置已填好）, 未命中问题的序号列表, [(重复问题的序号, 首次出现的序号)])
+        """
+        self._ensure_ready()
+        results: List[Optional[AnswerResult]] = [None] * len(questions)
+        pending = []
+        duplicates = []
+        first_seen: Dict[str, int] = {}
+        for i, question in enumerate(questions):
+            key = normalize_question(question)
+            if key in first_seen:
+                duplicates.append((i, first_seen[key]))
+                continue
+            first_seen[key] = i
+            cached = self._lookup_exact(question, timer)
+            if cached is not None:
+                results[i] = AnswerResult(answer=cached.answer, sources=cached.sources, cached=True)
+                continue
+            fact = self._lookup_facts(question, extract_course_codes(question), timer)
+            if fact is not None:
+                results[i] = AnswerResult(answer=fact.answer, sources=fact.sources)
             else:
-                # 未找到课程代码 - 跨课程检索
-                logger.info("未找到课程代码，使用跨课程检索（K=10）")
-                all_docs = self.vector_store.similarity_search(question, k=10)
-                context = "\n\n".join([doc.page_content for doc in all_docs])
-
-            # 3. 构建 prompt 并生成答案
-            llm = ChatGroq(
-                groq_api_key=GROQ_API_KEY,
-                model_name=LLM_MODEL,
-                temperature=0
-            )
+                pending.append(i)
+        logger.info("处理批量问题: %d 个（去重后 %d 个）", len(questions), len(first_seen))
+        return results, pending, duplicates
+
+    def _finish_item(
+        self, question: str, course_codes: List[str], embedding: List[float],
+        used_docs: List[Document], message, version: int
+    ) -> AnswerResult:
+        """记录 token 用量、写入缓存（version 为批次开始时的索引版本）并构造单个问题的结果"""
+        answer = message.content
+        record_token_usage(message.usage_metadata)
+        sources = self._summarize_sources(used_docs)
+        self.answer_cache.put(
+            question, course_codes, embedding, CachedAnswer(answer=answer, sources=sources), version
+        )
+        return AnswerResult(answer=answer, sources=sources)
 
-            template = """
-            You are an intelligent teaching assistant with access to multiple course documents and materials.
+    def get_answers(self, questions: List[str], concurrency: int = BATCH_LLM_CONCURRENCY) -> List[AnswerResult]:
+        """批量获取问题的答案
 
-            Answer the student's question based ONLY on the context provided below.
-            The context may come from different courses or documents - each piece has metadata showing its source.
+        规范化后相同的问题只计算一次；先查精确缓存和结构化事实，其余问题一次性嵌入、按课程代码分组检索，
+        然后最多 concurrency 个 LLM 调用并行生成答案。单个问题失败不影响其它问题。
 
-            IMPORTANT INSTRUCTIONS:
-            1. If the answer is in the context, provide a clear and helpful response
-            2. At the end of your answer, cite the source(s) by mentioning the course/document name (e.g., "Source: MAT235Y1")
-            3. If information comes from multiple sources, list all of them
-            4. If the answer is not in any of the provided context, say "I cannot find this information in the available documents."
-            5. You can synthesize information from multiple courses if relevant to the question
+        Args:
+            questions: 用户问题列表
+            concurrency: 同时进行的 LLM 调用数
 
-            Context (with source metadata):
-            {context}
+        Returns:
+            与 questions 顺序一致的结果列表
 
-            Question:
-            {question}
+        Raises:
+            RuntimeError: 当系统未初始化时
+        """
+        start = time.perf_counter()
+        timer = StageTimer()
+        version = self.index_version
+        results, pending, duplicates = self._start_batch(questions, timer)
+        if pending:
+            batch_questions = [questions[i] for i in pending]
+            course_codes = [extract_course_codes(question) for question in batch_questions]
+            embeddings, cached, docs = self._lookup_and_retrieve_batch(batch_questions, course_codes, timer)
+
+            def generate(j: int) -> AnswerResult:
+                if cached[j] is not None:
+                    return AnswerResult(answer=cached[j].answer, sources=cached[j].sources, cached=True)
+                # 每个问题单独计时，阶段耗时仍计入指标
+                item_timer = StageTimer()
+                try:
+                    context, used_docs = self._build_context(docs[j], item_timer)
+                    with item_timer.stage("llm"):
+                        message = self.sync_chain.invoke({"context": context, "question": batch_questions[j]})
+                    return self._finish_item(
+                        batch_questions[j], course_codes[j], embeddings[j], used_docs, message, version
+                    )
+                except Exception as e:
+                    logger.error(f"批量问题生成答案时出错: {str(e)}", exc_info=True)
+                    return AnswerResult(error="处理问题时发生错误")
+
+            with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="rag-batch") as pool:
+                for i, result in zip(pending, pool.map(generate, range(len(pending)))):
+                    results[i] = result
+        for i, first in duplicates:
+            results[i] = results[first]
+
+        logger.info(
+            "批量问题处理完成: %d 个（缓存命中 %d），耗时 %.2fs，%s",
+            len(questions), sum(1 for r in results if r.cached), time.perf_counter() - start, timer.as_header()
+        )
+        return results
 
-            Answer (remember to cite sources):
-            """
+    async def aget_answers(
+        self, questions: List[str], concurrency: int = BATCH_LLM_CONCURRENCY
+    ) -> List[AnswerResult]:
+        """异步批量获取问题的答案，不阻塞事件循环（见 get_answers）
 
-            from langchain_core.prompts import ChatPromptTemplate
-            prompt = ChatPromptTemplate.from_template(template)
+        嵌入和检索在检索线程池中整批执行，LLM 调用使用异步客户端，由信号量限制并发数。
 
-            # 生成答案
-            chain = prompt | llm | StrOutputParser()
-            answer = chain.invoke({"context": context, "question": question})
+        Args:
+            questions: 用户问题列表
+            concurrency: 同时进行的 LLM 调用数
 
-            logger.info(f"成功生成答案，长度: {len(answer)} 字符")
-            logger.debug(f"生成答案: {answer[:200]}...")
+        Returns:
+            与 questions 顺序一致的结果列表
 
-            return answer
+        Raises:
+            RuntimeError: 当系统未初始化时
+        """
+        start = time.perf_counter()
+        timer = StageTimer()
+        version = self.index_version
+        results, pending, duplicates = self._start_batch(questions, timer)
+        if pending:
+            batch_questions = [questions[i] for i in pending]
+            course_codes = [extract_course_codes(question) for question in batch_questions]
+            loop = asyncio.get_running_loop()
+            embeddings, cached, docs = await loop.run_in_executor(
+                self._executor, self._lookup_and_retrieve_batch, batch_questions, course_codes, timer
+            )
+            semaphore = asyncio.Semaphore(max(1, concurrency))
+
+            async def generate(j: int) -> AnswerResult:
+                if cached[j] is not None:
+                    return AnswerResult(answer=cached[j].answer, sources=cached[j].sources, cached=True)
+                item_timer = StageTimer()
+                try:
+                    context, used_docs = self._build_context(docs[j], item_timer)
+                    # 批量问题不设截止时间，但与 /chat 共享调度器的并发上限和熔断
+                    async with semaphore:
+                        message = await self.llm_scheduler.run(
+                            lambda: self._ainvoke_llm(context, batch_questions[j], item_timer), timer=item_timer
+                        )
+                    return self._finish_item(
+                        batch_questions[j], course_codes[j], embeddings[j], used_docs, message, version
+                    )
+                except LLMUnavailableError as e:
+                    logger.warning(f"批量问题被 LLM 调度器拒绝: {e.reason}")
+                    return AnswerResult(error="服务繁忙，请稍后重试")
+                except Exception as e:
+                    logger.error(f"批量问题生成答案时出错: {str(e)}", exc_info=True)
+                    return AnswerResult(error="处理问题时发生错误")
+
+            for i, result in zip(pending, await asyncio.gather(*(generate(j) for j in range(len(pending))))):
+                results[i] = result
+        for i, first in duplicates:
+            results[i] = results[first]
+
+        logger.info(
+            "批量问题处理完成: %d 个（缓存命中 %d），耗时 %.2fs，%s",
+            len(questions), sum(1 for r in results if r.cached), time.perf_counter() - start, timer.as_header()
+        )
+        return results
+
+    async def astream_answer(
+        self, question: str, timer: Optional[StageTimer] = None
+    ) -> AsyncIterator[Tuple[str, Dict]]:
+        """流式生成问题的答案
+
+        先返回检索到的来源元数据，然后随 LLM 生成逐个返回 token，
+        首字节时间约等于检索时间加首 token 延迟。缓存或结构化事实命中时一次性返回完整答案。
+
+        Args:
+            question: 用户提出的问题
+            timer: 可选的分阶段计时器，"done" 事件之前完成计时
+
+        Yields:
+            (事件名, 数据) 元组，事件依次为 "sources"、若干 "token" 和 "done"
+
+        Raises:
+            RuntimeError: 当系统未初始化时
+            LLMUnavailableError: 被调度器拒绝，或生成超过请求截止时间
+        """
+        self._ensure_ready()
+        version = self.index_version
+
+        try:
+            logger.info("处理流式问题: %.100s...", question)
+            timer = timer or StageTimer()
+
+            # 1. 查找缓存；未命中时在线程池中检索相关文档
+            embedding = None
+            all_docs: List[Document] = []
+            course_codes = extract_course_codes(question)
+            cached = self._lookup_exact(question, timer)
+            fact = self._lookup_facts(question, course_codes, timer) if cached is None else None
+            if fact is not None:
+                logger.info("事实索引命中，耗时 %.1fms", timer.finish() * 1000)
+                yield "sources", {"sources": fact.sources}
+                yield "token", {"text": fact.answer}
+                yield "done", {"answer_length": len(fact.answer), "cached": False}
+                return
+            if cached is None:
+                loop = asyncio.get_running_loop()
+                embedding, cached, all_docs = await loop.run_in_executor(
+                    self._executor, self._lookup_and_retrieve, question, course_codes, timer
+                )
+
+            if cached is not None:
+                logger.info("缓存命中，耗时 %.1fms", timer.finish() * 1000)
+                yield "sources", {"sources": cached.sources}
+                yield "token", {"text": cached.answer}
+                yield "done", {"answer_length": len(cached.answer), "cached": True}
+                return
+
+            # 2. 组装上下文，尽早发送实际使用的来源信息
+            context, used_docs = self._build_context(all_docs, timer)
+            sources = self._summarize_sources(used_docs)
+            yield "sources", {"sources": sources}
+
+            # 3. 流式生成答案（"llm" 阶段包含等待客户端消费 token 的时间）
+            # 生成期间占用调度器名额；已发送的 token 无法撤回，因此不重试，只计入熔断。
+            # 截止时间同时限制排队和生成：每个 chunk 最多等到截止时间，超时后放弃生成
+            tokens = []
+            usage = None
+            deadline = timer.start + REQUEST_DEADLINE_SECONDS
+            async with self.llm_scheduler.slot(deadline, timer):
+                llm_start = time.perf_counter()
+                stream = self.chain.astream({"context": context, "question": question})
+                try:
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(stream.__anext__(), deadline - time.perf_counter())
+                        except StopAsyncIteration:
+                            break
+                        usage = chunk.usage_metadata or usage
+                        if not chunk.content:
+                            continue
+                        if not tokens:
+                            timer.record("first_token", time.perf_counter() - llm_start)
+                        tokens.append(chunk.content)
+                        yield "token", {"text": chunk.content}
+                except asyncio.TimeoutError:
+                    # 超过请求截止时间不说明上游故障，不计入熔断；调用方发送 error 事件
+                    raise self.llm_scheduler.deadline_exceeded() from None
+                except Exception as e:
+                    if is_retryable(e):
+                        self.llm_scheduler.record_failure()
+                    raise
+                finally:
+                    await stream.aclose()
+                self.llm_scheduler.record_success()
+            timer.record("llm", time.perf_counter() - llm_start)
+            record_token_usage(usage)
+
+            # 只缓存完整生成的答案（客户端中途断开时不会执行到这里）
+            answer = "".join(tokens)
+            self.answer_cache.put(
+                question, course_codes, embedding, CachedAnswer(answer=answer, sources=sources), version
+            )
+            timer.finish()
+            logger.info("流式答案生成完成，长度: %d 字符，耗时 %s", len(answer), timer.as_header())
+            yield "done", {"answer_length": len(answer), "cached": False}
+
+        except LLMUnavailableError:
+            # 过载拒绝和超时已由调度器记录，不打印堆栈
+            raise
 
         except Exception as e:
-            logger.error(f"生成答案时出错: {str(e)}", exc_info=True)
+            logger.error(f"流式生成答案时出错: {str(e)}", exc_info=True)
             raise
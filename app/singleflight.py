@@ -0,0 +1,84 @@
+"""
+请求合并模块
+同一时刻到达的相同请求只执行一次：第一个请求（leader）启动计算，
+之后的相同请求（follower）等待同一个进行中的计算并共享其结果或异常
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+from app.logger import setup_logger
+from app.metrics import COALESCED_REQUESTS
+
+logger = setup_logger(__name__)
+
+T = TypeVar("T")
+
+
+class _Call:
+    """一个进行中的共享计算及其等待者数量"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """按键合并进行中的异步计算（同一事件循环内使用）
+
+    - 计算在独立的 Task 中执行，每个调用方通过 asyncio.shield 等待：
+      某个调用方被取消（例如客户端断开）不会中断其它调用方共享的计算
+    - 所有调用方都取消后才取消计算本身
+    - 计算抛出的异常传递给全部调用方；计算结束后立即移除该键，失败不会被缓存，下一次请求重新执行
+    - 调用计入 rag_coalesced_requests_total{name, role}
+    """
+
+    def __init__(self, name: str):
+        """
+        Args:
+            name: 合并器名称（指标标签）
+        """
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def _forget(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """执行或加入键为 key 的计算
+
+        Args:
+            key: 合并键，相等的键共享同一次计算
+            func: 无参数的协程函数，只有 leader 会调用
+
+        Returns:
+            (计算结果, 是否共享了其它请求发起的计算)
+
+        Raises:
+            Exception: 计算抛出的异常（所有等待者都会收到）
+            asyncio.CancelledError: 调用方被取消，或计算被取消时
+        """
+        call = self._calls.get(key)
+        shared = call is not None
+        if call is None:
+            call = _Call(asyncio.ensure_future(func()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+        else:
+            logger.debug("合并到进行中的请求: %s", key)
+        COALESCED_REQUESTS.inc(name=self.name, role="follower" if shared else "leader")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), shared
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # 没有调用方还在等待，放弃计算（例如全部客户端都已断开）
+                self._forget(key, call)
+                call.task.cancel()
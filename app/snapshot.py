@@ -0,0 +1,234 @@
+"""
+只读索引快照模块
+摄取时把向量库导出为一组只读文件（chroma_db/snapshot/），作为 NumPy 向量检索后端
+（VECTOR_BACKEND=numpy，多 worker 共享模式 SHARED_INDEX=true 时总是使用）：
+各进程以内存映射方式打开，通过操作系统页缓存共享同一份物理内存，不打开 Chroma 的 HNSW 索引和 SQLite：
+- vectors.npy: 归一化嵌入矩阵（N x D，VECTOR_DTYPE: float32 / float16 / int8），
+  按课程名排序，同一课程的片段连续存放
+- scales.npy: int8 矩阵每行的反量化系数（仅 int8）
+- 片段文本和元数据：与向量同序的紧凑片段存储（见 app.chunk_store），其中的课程序号列用于课程过滤
+
+向量检索为精确搜索（矩阵乘法 + argpartition），嵌入已归一化，
+按内积排序与 Chroma 的 L2 距离排序一致。
+"""
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.chunk_store import STORE_DIR, TEXTS_FILE, ChunkRecord, ChunkStore, write_chunk_store
+from app.config import DB_PATH, VECTOR_DTYPE
+from app.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+VECTORS_FILE = "vectors.npy"
+SCALES_FILE = "scales.npy"
+VECTOR_DTYPES = ("float32", "float16", "int8")
+
+# float16 / int8 矩阵按块转换为 float32 再做矩阵乘法（NumPy 没有半精度和整数的 BLAS），
+# 每块的临时内存约为 块行数 x 维度 x 4 字节
+SCORE_BLOCK_ROWS = 1024
+
+
+def quantize_vectors(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """把归一化的 float32 矩阵转换为存储精度
+
+    int8 先减去全体向量的均值再按行对称量化（每行除以该行的最大绝对值再乘 127），反量化系数单独保存。
+    句向量普遍共享一个很大的公共分量，去掉后量化误差明显减小；内积只差一个与问题有关的常数，
+    同一问题下各片段的排序不变（快照只用于排序，不返回分数）。
+
+    Args:
+        vectors: 归一化嵌入矩阵（float32）
+        dtype: float32 / float16 / int8
+
+    Returns:
+        (转换后的矩阵, 每行的反量化系数（仅 int8，其余为 None）)
+
+    Raises:
+        ValueError: 不支持的精度
+    """
+    if dtype not in VECTOR_DTYPES:
+        raise ValueError(f"不支持的向量精度: {dtype}（可选: {', '.join(VECTOR_DTYPES)}）")
+    if dtype != "int8":
+        return vectors.astype(dtype), None
+    centered = vectors - vectors.mean(axis=0) if len(vectors) else vectors
+    scales = np.clip(np.abs(centered).max(axis=1), 1e-12, None) / 127
+    return np.round(centered / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+def export_snapshot(
+    vector_store, index_version: int, db_path: str = DB_PATH, dtype: str = VECTOR_DTYPE
+) -> Path:
+    """把向量库中的全部片段导出为只读快照（向量 + 紧凑片段存储）
+
+    先写入临时目录再整体替换旧快照：已打开旧快照的进程仍持有原文件的映射，不受影响。
+
+    Args:
+        vector_store: Chroma 向量库（或 chromadb 集合）
+        index_version: 当前索引版本
+        db_path: 向量库目录（快照保存在其中的 snapshot/ 子目录）
+        dtype: 向量存储精度
+
+    Returns:
+        快照目录
+    """
+    start = time.perf_counter()
+    data = vector_store.get(include=["embeddings", "documents", "metadatas"])
+    metas = [meta or {} for meta in data["metadatas"]]
+    # 按课程名排序，课程过滤只需取连续的行范围（零拷贝切片）
+    order = sorted(range(len(data["ids"])), key=lambda i: (metas[i].get("course", ""), data["ids"][i]))
+
+    dim = len(data["embeddings"][0]) if len(data["embeddings"]) else 0
+    vectors = np.asarray(data["embeddings"], dtype=np.float32).reshape(-1, dim)[order]
+    vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    vectors, scales = quantize_vectors(vectors, dtype)
+
+    target = Path(db_path) / STORE_DIR
+    tmp_dir = target.with_name(f"{STORE_DIR}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    np.save(tmp_dir / VECTORS_FILE, vectors)
+    if scales is not None:
+        np.save(tmp_dir / SCALES_FILE, scales)
+    write_chunk_store(
+        tmp_dir,
+        [data["ids"][i] for i in order],
+        (data["documents"][i] for i in order),
+        (metas[i] for i in order),
+        index_version
+    )
+
+    # 目录不能原子覆盖：先移走旧快照再改名，窗口期内读取方会看到快照缺失而不是半写入的快照
+    old_dir = target.with_name(f"{STORE_DIR}.old-{os.getpid()}")
+    if target.exists():
+        os.replace(target, old_dir)
+    os.replace(tmp_dir, target)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+    logger.info(
+        f"索引快照导出完成: {len(order)} 个片段，向量 {vectors.nbytes / 1024 / 1024:.1f}MB（{dtype}），"
+        f"文本 {(target / TEXTS_FILE).stat().st_size / 1024 / 1024:.1f}MB，耗时 {time.perf_counter() - start:.2f}s"
+    )
+    return target
+
+
+class IndexSnapshot:
+    """内存映射的只读索引快照（线程安全）
+
+    向量矩阵和片段存储都是只读映射，多个进程打开同一快照时共享页缓存。
+
+    Attributes:
+        chunks: 与向量同序的片段存储
+        vectors: 归一化嵌入矩阵（只读映射，float32 / float16 / int8）
+        scales: int8 矩阵每行的反量化系数，其余精度为 None
+        course_ids: 每行所属课程在课程表中的序号（只读映射）
+        index_version: 导出时的索引版本
+    """
+
+    def __init__(self, chunks: ChunkStore):
+        """
+        Args:
+            chunks: 快照目录中已打开的片段存储
+
+        Raises:
+            ValueError: 向量与片段数量不一致，或 int8 矩阵缺少反量化系数时
+        """
+        self.chunks = chunks
+        self.index_version = chunks.index_version
+        self.vectors: np.ndarray = np.load(chunks.path / VECTORS_FILE, mmap_mode="r")
+        if len(self.vectors) != len(chunks):
+            raise ValueError(f"快照向量数 {len(self.vectors)} 与片段数 {len(chunks)} 不一致")
+        self.scales: Optional[np.ndarray] = None
+        if self.vectors.dtype == np.int8:
+            if not (chunks.path / SCALES_FILE).exists():
+                raise ValueError("int8 向量缺少反量化系数")
+            self.scales = np.load(chunks.path / SCALES_FILE, mmap_mode="r")
+        self.course_ids: np.ndarray = chunks.records["course"]
+        # 课程名 -> 课程表序号
+        self._course_ids: Dict[str, int] = {course["course"]: i for i, course in enumerate(chunks.courses)}
+
+    @classmethod
+    def load(cls, db_path: str = DB_PATH) -> Optional["IndexSnapshot"]:
+        """打开快照，不存在、损坏或版本不兼容时返回 None"""
+        chunks = ChunkStore.load(db_path)
+        if chunks is None:
+            return None
+        try:
+            snapshot = cls(chunks)
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取索引快照失败: {e}")
+            return None
+        logger.info(
+            f"已映射索引快照: {len(chunks)} 个片段（{snapshot.dtype}），索引版本 {snapshot.index_version}，"
+            f"共 {len(chunks.courses)} 个课程"
+        )
+        return snapshot
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def dtype(self) -> str:
+        """向量存储精度"""
+        return self.vectors.dtype.name
+
+    def _filter_rows(self, course_filter: Optional[Dict]):
+        """把 RAGService._course_filter 生成的过滤条件（{"course": 名称} 或 {"course": {"$in": [...]}}）
+        转换为行选择：无过滤时返回 None，选中的行连续时返回切片（零拷贝），否则返回行号数组"""
+        if not course_filter:
+            return None
+        course = course_filter["course"]
+        names = course["$in"] if isinstance(course, dict) else [course]
+        wanted = [self._course_ids[name] for name in names if name in self._course_ids]
+        rows = np.flatnonzero(np.isin(self.course_ids, wanted))
+        # 导出时按课程排序，单个课程（以及相邻课程）的行是连续的
+        if len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+            return slice(int(rows[0]), int(rows[-1]) + 1)
+        return rows
+
+    def _scores(self, queries: np.ndarray, rows) -> np.ndarray:
+        """计算问题与选中行的内积（问题数 x 行数，float32）"""
+        vectors = self.vectors if rows is None else self.vectors[rows]
+        if vectors.dtype == np.float32:
+            return queries @ vectors.T
+        scores = np.empty((len(queries), len(vectors)), dtype=np.float32)
+        for start in range(0, len(vectors), SCORE_BLOCK_ROWS):
+            block = vectors[start:start + SCORE_BLOCK_ROWS].astype(np.float32)
+            scores[:, start:start + len(block)] = queries @ block.T
+        if self.scales is not None:
+            scores *= self.scales if rows is None else self.scales[rows]
+        return scores
+
+    def query(
+        self, embeddings: List[List[float]], k: int, course_filter: Optional[Dict] = None
+    ) -> List[List[Tuple[str, ChunkRecord]]]:
+        """批量精确向量检索：所有问题一次矩阵乘法
+
+        Args:
+            embeddings: 问题嵌入向量列表
+            k: 每个问题返回的片段数
+            course_filter: 课程过滤条件
+
+        Returns:
+            每个问题的 (片段 ID, 片段记录) 列表，按相似度排序
+        """
+        rows = self._filter_rows(course_filter)
+        scores = self._scores(np.asarray(embeddings, dtype=np.float32), rows)
+        k = min(k, scores.shape[1])
+        if k <= 0:
+            return [[] for _ in embeddings]
+
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top = np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+        if isinstance(rows, slice):
+            top += rows.start
+        elif rows is not None:
+            top = rows[top]
+        return [
+            [(self.chunks.ids[row], self.chunks.record(row)) for row in hits]
+            for hits in top.tolist()
+        ]
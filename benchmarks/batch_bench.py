@@ -0,0 +1,79 @@
+"""
+批量问答基准
+
+使用本地 LLM 替身（关闭答案缓存），对比逐个调用 /chat（夜间任务目前的做法）
+与一次 /chat/batch 处理同样 N 个问题的总耗时和吞吐量。
+
+用法（在项目根目录执行，需要已构建的向量库）:
+    python -m benchmarks.batch_bench --questions 200 --llm-latency 0.3
+    BATCH_LLM_CONCURRENCY=8 python -m benchmarks.batch_bench
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+# app.config 在导入时读取环境变量：关闭答案缓存和结构化事实回答，放开速率限制（否则逐个调用会被限流）
+os.environ["ANSWER_CACHE_SIZE"] = "0"
+os.environ["FACT_ANSWERS"] = "false"
+os.environ["RATE_LIMIT_PER_MINUTE"] = "1000000"
+
+from app.config import API_KEY, BATCH_LLM_CONCURRENCY, BATCH_MAX_QUESTIONS  # noqa: E402
+from app.main import app, rag_service  # noqa: E402
+from benchmarks.stub_llm import StubChatModel  # noqa: E402
+
+QUESTIONS = [
+    "What is the grading scheme for MAT235?",
+    "When are the office hours for STA237?",
+    "What textbook is required for MAT224?",
+    "Tell me about the late submission policy",
+    "Compare the test dates of MAT224 and MAT235",
+]
+
+
+async def run(args: argparse.Namespace) -> None:
+    rag_service.llm = StubChatModel(latency=args.llm_latency)
+    rag_service.initialize_rag()
+    questions = [f"{QUESTIONS[i % len(QUESTIONS)]} (#{i})" for i in range(args.questions)]
+    headers = {"Authorization": f"Bearer {API_KEY}"}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        for question in questions:
+            response = await client.post("/chat", json={"question": question}, headers=headers)
+            response.raise_for_status()
+        sequential = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = []
+        for offset in range(0, len(questions), BATCH_MAX_QUESTIONS):
+            response = await client.post(
+                "/chat/batch", json={"questions": questions[offset:offset + BATCH_MAX_QUESTIONS]}, headers=headers
+            )
+            response.raise_for_status()
+            results.extend(response.json()["results"])
+        batched = time.perf_counter() - start
+
+    errors = sum(1 for result in results if result["error"])
+    print(
+        f"{args.questions} 个问题，LLM 替身延迟 {args.llm_latency:.2f}s，"
+        f"批量 LLM 并发 {BATCH_LLM_CONCURRENCY}，每批最多 {BATCH_MAX_QUESTIONS} 个"
+    )
+    print(f"逐个 /chat:   {sequential:7.2f}s  {args.questions / sequential:7.1f} 问题/秒")
+    print(f"/chat/batch: {batched:7.2f}s  {args.questions / batched:7.1f} 问题/秒（{errors} 个错误）")
+    print(f"加速: {sequential / batched:.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="批量问答基准")
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="LLM 替身的模拟延迟（秒）")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+紧凑片段存储基准
+
+用 data/ 下 PDF 的片段复制出 N 份合成课程大纲（默认 10000 份，约 20 万个片段），
+对比两种片段表示：
+- documents: 上一版快照的布局（片段 ID + 每个片段一个元数据字典，文本内存映射），
+  每次检索为每个候选片段构造 Document 和元数据字典（与从 Chroma 取回文档相同）
+- records: 紧凑片段存储（定长记录数组 + 文本内存映射），每个候选片段只构造一个 ChunkRecord，
+  文本和元数据只在进入上下文时才解码
+
+每种表示在独立子进程中测量：加载后的常驻内存增量、每次查询（15 个候选片段 + 上下文组装 + 来源汇总）
+的 Python 内存分配峰值（tracemalloc）和耗时。
+
+用法（在项目根目录执行）:
+    python -m benchmarks.chunk_store_bench
+    python -m benchmarks.chunk_store_bench --syllabi 2000 --queries 500
+"""
+import argparse
+import json
+import mmap
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+BENCH_DIR = Path(__file__).parent
+RESULT_PREFIX = "RESULT "
+LAYOUTS = ("documents", "records")
+CANDIDATES = 15
+
+
+def build_corpus(output_dir: Path, syllabi: int) -> int:
+    """生成合成语料，同时写出两种布局（共用同一个 texts.bin），返回片段数"""
+    from app.chunk_store import write_chunk_store
+    from app.ingest import parse_pdf_pages
+
+    templates = [parse_pdf_pages(pdf) for pdf in sorted((BENCH_DIR.parent / "data").glob("*.pdf"))]
+    ids: List[str] = []
+    texts: List[str] = []
+    metadatas: List[Dict] = []
+    for i in range(syllabi):
+        course = f"SYN{i:06d}"
+        for j, doc in enumerate(templates[i % len(templates)]):
+            ids.append(f"{course}-{j}")
+            texts.append(doc.page_content.replace(doc.metadata["course_base"], course))
+            metadatas.append({**doc.metadata, "course": course, "course_base": course, "source_file": f"{course}.pdf"})
+
+    write_chunk_store(output_dir, ids, texts, metadatas, index_version=1)
+    # 上一版布局：文本字节偏移 + 元数据字典列表
+    offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    np.cumsum([len(text.encode("utf-8")) for text in texts], out=offsets[1:])
+    np.save(output_dir / "offsets.npy", offsets)
+    (output_dir / "documents.json").write_text(
+        json.dumps({"ids": ids, "metadatas": metadatas}, separators=(",", ":")), encoding="utf-8"
+    )
+    return len(ids)
+
+
+def rss_mb() -> float:
+    for line in Path("/proc/self/status").read_text().splitlines():
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def load_layout(layout: str, corpus_dir: Path) -> Callable[[List[int]], List]:
+    """加载一种布局，返回 “行号列表 -> 候选片段列表” 的函数"""
+    if layout == "records":
+        from app.chunk_store import ChunkStore
+        store = ChunkStore(corpus_dir)
+        return lambda rows: [store.record(row) for row in rows]
+
+    from langchain_core.documents import Document
+    data = json.loads((corpus_dir / "documents.json").read_text(encoding="utf-8"))
+    ids, metadatas = data["ids"], data["metadatas"]
+    offsets = np.load(corpus_dir / "offsets.npy", mmap_mode="r")
+    with open(corpus_dir / "texts.bin", "rb") as f:
+        texts = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def fetch(rows: List[int]) -> List:
+        return [
+            Document(
+                id=ids[row],
+                page_content=texts[int(offsets[row]):int(offsets[row + 1])].decode("utf-8"),
+                metadata=dict(metadatas[row])
+            )
+            for row in rows
+        ]
+    return fetch
+
+
+def run_layout(layout: str, corpus_dir: Path, queries: int) -> Dict:
+    from app.context import assemble_context
+    from app.rag_service import RAGService
+
+    baseline = rss_mb()
+    start = time.perf_counter()
+    fetch = load_layout(layout, corpus_dir)
+    load_seconds = time.perf_counter() - start
+    loaded = rss_mb()
+
+    total = len(json.loads((corpus_dir / "chunks.json").read_text(encoding="utf-8"))["ids"])
+    rng = np.random.default_rng(0)
+    # 同一课程的相邻片段，与课程过滤检索的候选集相似
+    starts = rng.integers(0, total - CANDIDATES, size=queries)
+    batches = [list(range(s, s + CANDIDATES)) for s in starts.tolist()]
+
+    def query(rows: List[int]) -> None:
+        docs = fetch(rows)
+        _, used = assemble_context(docs)
+        RAGService._summarize_sources(used)
+
+    start = time.perf_counter()
+    for rows in batches:
+        query(rows)
+    query_ms = (time.perf_counter() - start) / queries * 1000
+
+    peaks = []
+    tracemalloc.start()
+    for rows in batches[:100]:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        query(rows)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    return {
+        "chunks": total,
+        "load_s": load_seconds,
+        "rss_mb": loaded - baseline,
+        "query_ms": query_ms,
+        "alloc_peak_kb": float(np.mean(peaks)) / 1024,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="紧凑片段存储基准")
+    parser.add_argument("--syllabi", type=int, default=10000, help="合成课程大纲份数")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--layout", choices=LAYOUTS, help="只测量一种布局（内部使用）")
+    parser.add_argument("--corpus-dir", type=Path, help="内部使用")
+    args = parser.parse_args()
+
+    if args.layout:
+        result = run_layout(args.layout, args.corpus_dir, args.queries)
+        print(RESULT_PREFIX + json.dumps(result), flush=True)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        chunks = build_corpus(Path(tmp), args.syllabi)
+        size_mb = sum(f.stat().st_size for f in Path(tmp).iterdir()) / 1024 / 1024
+        print(f"{args.syllabi} 份合成大纲，{chunks} 个片段（生成 {time.perf_counter() - start:.1f}s，两种布局共 {size_mb:.0f}MB）")
+        print(f"{'layout':>10} {'load s':>7} {'RSS MB':>7} {'query ms':>9} {'alloc KB/query':>15}")
+        for layout in LAYOUTS:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.chunk_store_bench", "--layout", layout,
+                 "--corpus-dir", tmp, "--queries", str(args.queries)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            line = next(line for line in output.splitlines() if line.startswith(RESULT_PREFIX))
+            r = json.loads(line[len(RESULT_PREFIX):])
+            print(
+                f"{layout:>10} {r['load_s']:>7.2f} {r['rss_mb']:>7.0f} {r['query_ms']:>9.3f} "
+                f"{r['alloc_peak_kb']:>15.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
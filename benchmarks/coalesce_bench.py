@@ -0,0 +1,123 @@
+"""
+请求合并基准
+
+模拟课堂公告后的提问高峰：每轮同时发出 N 个请求，覆盖少数几个热门问题
+（每个请求带大小写/空白/标点不同的变体），用 LLM 替身统计关闭与开启请求合并（COALESCE_REQUESTS）时
+实际的 LLM 调用次数和请求延迟。每轮之前清空答案缓存，即每轮都是缓存冷启动的高峰。
+
+另外检查合并后的语义：
+- LLM 失败时同一批等待者全部收到异常，之后的请求重新执行（不缓存失败）
+- 第一个请求被取消（客户端断开）时，其余等待者仍然拿到答案
+
+用法（在项目根目录执行，需要已构建的向量库）:
+    python -m benchmarks.coalesce_bench --concurrency 50 --rounds 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import Dict, List
+
+# app.config 在导入时读取环境变量：关闭结构化事实回答，热门问题都经过检索和 LLM
+os.environ["FACT_ANSWERS"] = "false"
+
+import app.rag_service as rag_module  # noqa: E402
+from app.rag_service import RAGService  # noqa: E402
+from benchmarks.stub_llm import StubChatModel  # noqa: E402
+
+HOT_QUESTIONS = [
+    "When is the MAT235 midterm?",
+    "Is the STA237 problem set deadline extended?",
+    "What is the grading scheme for MAT224?",
+]
+VARIANTS = [str, str.lower, str.upper, lambda q: f"  {q}  ", lambda q: q.rstrip("?")]
+
+
+class FailingChatModel(StubChatModel):
+    """每次调用都失败的 LLM 替身（模拟上游错误）"""
+
+    def _result(self, messages):
+        self.calls += 1
+        raise ConnectionError("stub upstream failure")
+
+
+def burst_questions(concurrency: int) -> List[str]:
+    return [
+        VARIANTS[i % len(VARIANTS)](HOT_QUESTIONS[i % len(HOT_QUESTIONS)])
+        for i in range(concurrency)
+    ]
+
+
+async def timed(service: RAGService, question: str) -> float:
+    start = time.perf_counter()
+    await service.aget_answer(question)
+    return time.perf_counter() - start
+
+
+async def run_bursts(service: RAGService, concurrency: int, rounds: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    service.llm.calls = 0
+    for _ in range(rounds):
+        service.answer_cache.invalidate()
+        latencies += await asyncio.gather(*(timed(service, q) for q in burst_questions(concurrency)))
+    latencies.sort()
+    return {
+        "llm_calls": service.llm.calls,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+async def check_semantics(service: RAGService, llm_latency: float) -> None:
+    # 失败传递给全部等待者，且不会被缓存
+    service.llm = FailingChatModel(latency=llm_latency)
+    service.initialize_rag()
+    service.answer_cache.invalidate()
+    results = await asyncio.gather(
+        *(service.aget_answer(HOT_QUESTIONS[0]) for _ in range(10)), return_exceptions=True
+    )
+    failed = sum(isinstance(r, ConnectionError) for r in results)
+    calls = service.llm.calls
+    await asyncio.gather(service.aget_answer(HOT_QUESTIONS[0]), return_exceptions=True)
+    print(f"失败传递: {failed}/10 个等待者收到异常，LLM 调用 {calls} 次；之后的请求重新调用: {service.llm.calls > calls}")
+
+    # 第一个请求被取消，其余等待者不受影响
+    service.llm = StubChatModel(latency=llm_latency)
+    service.initialize_rag()
+    service.answer_cache.invalidate()
+    leader = asyncio.ensure_future(service.aget_answer(HOT_QUESTIONS[1]))
+    await asyncio.sleep(0)
+    followers = [asyncio.ensure_future(service.aget_answer(HOT_QUESTIONS[1])) for _ in range(5)]
+    await asyncio.sleep(llm_latency / 2)
+    leader.cancel()
+    results = await asyncio.gather(*followers, return_exceptions=True)
+    answered = sum(isinstance(r, str) for r in results)
+    print(f"取消传递: leader 已取消={leader.cancelled()}，{answered}/5 个 follower 拿到答案，LLM 调用 {service.llm.calls} 次")
+
+
+async def run(args: argparse.Namespace) -> None:
+    service = RAGService(llm=StubChatModel(latency=args.llm_latency))
+    print(f"每轮 {args.concurrency} 个并发请求（{len(HOT_QUESTIONS)} 个热门问题），{args.rounds} 轮，"
+          f"LLM 替身延迟 {args.llm_latency:.2f}s")
+    print(f"{'coalesce':>9} {'LLM calls':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for enabled in (False, True):
+        # COALESCE_REQUESTS 在导入时读取，这里直接切换模块变量以在同一进程内对比
+        rag_module.COALESCE_REQUESTS = enabled
+        r = await run_bursts(service, args.concurrency, args.rounds)
+        print(f"{'on' if enabled else 'off':>9} {r['llm_calls']:>10} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f}")
+    await check_semantics(service, args.llm_latency)
+    service.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="请求合并基准")
+    parser.add_argument("--concurrency", type=int, default=50, help="每轮同时发出的请求数")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="LLM 替身的模拟延迟（秒）")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
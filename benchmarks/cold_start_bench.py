@@ -0,0 +1,87 @@
+"""
+冷启动基准
+
+以子进程启动 uvicorn，轮询 /health 和 /ready，报告进程启动后多久开始接受请求（存活）
+以及多久可以回答问题（就绪）。向量库放在临时目录中：第一轮从空库启动，
+之后各轮复用已构建的向量库。
+
+用法（在项目根目录执行）:
+    python -m benchmarks.cold_start_bench --rounds 3
+    python -m benchmarks.cold_start_bench --rounds 3 --prebuild   # 先用 python -m app.ingest 离线构建
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+
+import httpx
+
+from app.config import BASE_DIR
+
+PORT = 8765
+
+
+def wait_for(url: str, deadline: float) -> Optional[float]:
+    """轮询 URL 直到返回 200，返回到达时刻；超时或初始化失败时返回 None
+
+    旧版本没有 /ready（404），进程能响应时即已就绪，同样返回到达时刻。
+    """
+    while time.perf_counter() < deadline:
+        try:
+            response = httpx.get(url, timeout=1)
+            if response.status_code in (200, 404):
+                return time.perf_counter()
+            if response.json().get("status") == "failed":
+                return None
+        except httpx.TransportError:
+            pass
+        time.sleep(0.05)
+    return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="冷启动基准")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--prebuild", action="store_true", help="启动 API 之前先离线摄取")
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            CHROMA_DB_PATH=tmp,
+            PDF_FILES=",".join(sorted(p.name for p in (BASE_DIR / "data").glob("*.pdf"))),
+            GROQ_API_KEY=os.getenv("GROQ_API_KEY") or "benchmark",
+            LOG_FILE=os.path.join(tmp, "app.log"),
+        )
+
+        if args.prebuild:
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-m", "app.ingest"], env=env, check=True, cwd=BASE_DIR)
+            print(f"离线摄取: {time.perf_counter() - start:.2f}s")
+
+        for round_idx in range(args.rounds):
+            start = time.perf_counter()
+            server = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(PORT)],
+                env=env, cwd=BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            try:
+                deadline = start + args.timeout
+                live = wait_for(f"http://127.0.0.1:{PORT}/health", deadline)
+                ready = wait_for(f"http://127.0.0.1:{PORT}/ready", deadline)
+            finally:
+                server.terminate()
+                server.wait()
+
+            label = "空库" if round_idx == 0 and not args.prebuild else "已构建"
+            live_s = f"{live - start:.2f}s" if live else "超时"
+            ready_s = f"{ready - start:.2f}s" if ready else "未就绪"
+            print(f"第 {round_idx + 1} 轮（{label}）: 存活 {live_s}，就绪 {ready_s}")
+
+
+if __name__ == "__main__":
+    main()
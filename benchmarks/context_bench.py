@@ -0,0 +1,86 @@
+"""
+上下文组装基准
+
+对检索到的同一批片段，对比旧实现（直接拼接全部片段）与上下文组装
+（合并重叠、去重、token 预算、来源标签）的上下文大小、组装耗时，
+以及标注答案是否仍然出现在上下文中（benchmarks/questions.json，作为答案准确率的代理指标）。
+
+用法（在项目根目录执行，需要已构建的向量库）:
+    python -m benchmarks.context_bench
+    python -m benchmarks.context_bench --budget 2000
+"""
+import argparse
+import json
+import re
+import statistics
+import time
+from pathlib import Path
+from typing import List
+
+from langchain_core.documents import Document
+
+from app.context import assemble_context, estimate_tokens
+from app.rag_service import RAGService, extract_course_codes
+from benchmarks.stub_llm import StubChatModel
+
+# 额外的多课程问题，检索结果最多 15 个片段，最能体现预算的作用
+MULTI_COURSE_QUESTIONS = [
+    "Compare the test dates of MAT224 and MAT235",
+    "Do MAT235, MAT224 and STA237 allow calculators?",
+    "What are the late policies for MAT224 and STA237?",
+]
+
+
+def legacy_context(docs: List[Document]) -> str:
+    """旧实现：直接拼接所有片段"""
+    return "\n\n".join([doc.page_content for doc in docs])
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).lower()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="上下文组装基准")
+    parser.add_argument("--questions", type=Path, default=Path(__file__).parent / "questions.json")
+    parser.add_argument("--budget", type=int, default=None, help="token 预算，默认使用 CONTEXT_TOKEN_BUDGET")
+    args = parser.parse_args()
+
+    cases = json.loads(args.questions.read_text(encoding="utf-8"))
+    cases += [{"question": question, "answers": []} for question in MULTI_COURSE_QUESTIONS]
+    service = RAGService(llm=StubChatModel(latency=0))
+    kwargs = {"budget_tokens": args.budget} if args.budget else {}
+
+    legacy_tokens, new_tokens, assemble_ms = [], [], []
+    legacy_found = new_found = labeled = 0
+    for case in cases:
+        question = case["question"]
+        embedding = service.embeddings.embed_query(question)
+        docs = service._retrieve_documents(question, embedding, extract_course_codes(question))
+
+        old = legacy_context(docs)
+        start = time.perf_counter()
+        new, used = assemble_context(docs, **kwargs)
+        assemble_ms.append((time.perf_counter() - start) * 1000)
+        legacy_tokens.append(estimate_tokens(old))
+        new_tokens.append(estimate_tokens(new))
+        print(
+            f"{question[:60]:<60} 片段 {len(docs):>2} -> {len(used):>2}  "
+            f"tokens {legacy_tokens[-1]:>5} -> {new_tokens[-1]:>5}"
+        )
+
+        if case["answers"]:
+            labeled += 1
+            legacy_found += any(_normalize(a) in _normalize(old) for a in case["answers"])
+            new_found += any(_normalize(a) in _normalize(new) for a in case["answers"])
+
+    print(
+        f"\n平均上下文 tokens: {statistics.mean(legacy_tokens):.0f} -> {statistics.mean(new_tokens):.0f} "
+        f"（最大 {max(legacy_tokens)} -> {max(new_tokens)}）"
+    )
+    print(f"组装耗时: 平均 {statistics.mean(assemble_ms):.2f}ms，最大 {max(assemble_ms):.2f}ms")
+    print(f"标注答案仍在上下文中: 旧 {legacy_found}/{labeled}，新 {new_found}/{labeled}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+课程过滤检索基准
+
+对比旧检索策略（每个课程一次精确过滤搜索，因课程名带后缀总是落空，
+再做一次未过滤的 k=20 搜索并按前缀过滤）与基于课程索引的单次过滤搜索，
+输出每个问题的平均检索延迟和每个课程实际拿到的文档数。
+
+用法（在项目根目录执行，需要已构建的向量库）:
+    python -m benchmarks.course_filter_bench --rounds 20
+"""
+import argparse
+import os
+import statistics
+import time
+from typing import List
+
+# 检索延迟测量需要每次都走完整检索路径，关闭检索结果缓存（app.config 在导入时读取）
+os.environ["RETRIEVAL_CACHE_SIZE"] = "0"
+
+from langchain_core.documents import Document  # noqa: E402
+
+from app.rag_service import RAGService, extract_course_codes  # noqa: E402
+from benchmarks.stub_llm import StubChatModel  # noqa: E402
+
+QUESTIONS = [
+    "What is the grading scheme for MAT235?",
+    "When are the office hours for STA237?",
+    "What textbook is required for MAT224?",
+    "How is the final exam weighted in STA237?",
+    "Compare the test dates of MAT224 and MAT235",
+    "Do MAT235, MAT224 and STA237 allow calculators?",
+]
+
+
+def legacy_retrieve(service: RAGService, question: str, course_codes: List[str]) -> List[Document]:
+    """旧实现：逐课程搜索，精确匹配落空后回退到未过滤的 k=20 搜索"""
+    all_docs = []
+    for course_code in course_codes:
+        docs = service.vector_store.similarity_search(question, k=5, filter={"course": course_code})
+        if not docs:
+            temp_docs = service.vector_store.similarity_search(question, k=20)
+            docs = [doc for doc in temp_docs if doc.metadata.get("course", "").startswith(course_code)]
+        all_docs.extend(docs)
+    return all_docs
+
+
+def indexed_retrieve(service: RAGService, question: str, course_codes: List[str]) -> List[Document]:
+    """新实现：嵌入一次，通过课程索引单次过滤搜索"""
+    embedding = service.embeddings.embed_query(question)
+    return service._retrieve_documents(question, embedding, course_codes)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="课程过滤检索基准")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    service = RAGService(llm=StubChatModel(latency=0))
+    cases = [(question, extract_course_codes(question)) for question in QUESTIONS]
+
+    for name, retrieve in (("legacy", legacy_retrieve), ("indexed", indexed_retrieve)):
+        latencies = []
+        per_course = []
+        for _ in range(args.rounds):
+            for question, course_codes in cases:
+                start = time.perf_counter()
+                docs = retrieve(service, question, course_codes)
+                latencies.append(time.perf_counter() - start)
+                per_course.append(len(docs) / len(course_codes))
+        print(
+            f"{name:>8}: 平均 {statistics.mean(latencies) * 1000:.2f}ms/问题，"
+            f"p95 {sorted(latencies)[int(len(latencies) * 0.95) - 1] * 1000:.2f}ms，"
+            f"平均每课程 {statistics.mean(per_course):.2f} 个文档"
+        )
+
+
+if __name__ == "__main__":
+    main()
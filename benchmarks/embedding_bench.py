@@ -0,0 +1,146 @@
+"""
+嵌入后端基准与一致性检查
+
+每个后端（torch / onnx / onnx-int8）在独立子进程中运行，分别报告：
+模型加载耗时、加载后常驻内存、单条问题嵌入延迟（p50/p99）、批量编码吞吐量。
+然后以 torch 后端为基准检查一致性：同一文本向量的余弦相似度，以及问题与片段之间的
+相似度分数的最大偏差（超过 --tolerance 时返回码为 1），和前 5 个片段的重合率。
+
+用法（在项目根目录执行；ONNX 后端需先运行 python -m app.embeddings --export）:
+    python -m benchmarks.embedding_bench
+    EMBED_THREADS=2 python -m benchmarks.embedding_bench --backends torch onnx-int8 --tolerance 0.03
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+
+BENCH_DIR = Path(__file__).parent
+RESULT_PREFIX = "RESULT "
+
+
+def rss_mb() -> float:
+    """当前进程的常驻内存（MB）"""
+    for line in Path("/proc/self/status").read_text().splitlines():
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_backend(backend: str, texts_file: Path, output_dir: Path, rounds: int) -> Dict:
+    """在当前进程中测量一个后端，并把问题和片段的向量写入 output_dir"""
+    data = json.loads(texts_file.read_text(encoding="utf-8"))
+    questions, chunks = data["questions"], data["chunks"]
+
+    baseline_rss = rss_mb()
+    start = time.perf_counter()
+    from app.embeddings import create_embeddings
+    embeddings = create_embeddings(backend)
+    embeddings.embed_query("warmup")
+    load_seconds = time.perf_counter() - start
+    loaded_rss = rss_mb()
+
+    latencies = []
+    for _ in range(rounds):
+        for question in questions:
+            start = time.perf_counter()
+            embeddings.embed_query(question)
+            latencies.append(time.perf_counter() - start)
+    latencies.sort()
+
+    start = time.perf_counter()
+    chunk_vectors = np.array(embeddings.embed_documents(chunks), dtype=np.float32)
+    batch_seconds = time.perf_counter() - start
+    question_vectors = np.array(embeddings.embed_documents(questions), dtype=np.float32)
+    np.save(output_dir / f"{backend}-questions.npy", question_vectors)
+    np.save(output_dir / f"{backend}-chunks.npy", chunk_vectors)
+
+    return {
+        "load_s": load_seconds,
+        "rss_mb": loaded_rss - baseline_rss,
+        "query_p50_ms": latencies[len(latencies) // 2] * 1000,
+        "query_p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "batch_chunks_per_s": len(chunks) / batch_seconds,
+    }
+
+
+def parity(output_dir: Path, backend: str) -> Dict:
+    """与 torch 后端的一致性"""
+    ref_q = np.load(output_dir / "torch-questions.npy")
+    ref_c = np.load(output_dir / "torch-chunks.npy")
+    q = np.load(output_dir / f"{backend}-questions.npy")
+    c = np.load(output_dir / f"{backend}-chunks.npy")
+    self_cosine = np.concatenate([(q * ref_q).sum(axis=1), (c * ref_c).sum(axis=1)])
+    ref_scores, scores = ref_q @ ref_c.T, q @ c.T
+    ref_top = np.argsort(-ref_scores, axis=1)[:, :5]
+    top = np.argsort(-scores, axis=1)[:, :5]
+    overlap = np.mean([len(set(a) & set(b)) / 5 for a, b in zip(ref_top, top)])
+    return {
+        "min_cosine": float(self_cosine.min()),
+        "max_score_delta": float(np.abs(scores - ref_scores).max()),
+        "top5_overlap": float(overlap),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="嵌入后端基准与一致性检查")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--rounds", type=int, default=20, help="问题集重复测量的轮数")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="相似度分数允许的最大偏差")
+    parser.add_argument("--backend", help="只运行一个后端（内部使用）")
+    parser.add_argument("--texts-file", type=Path, help="内部使用")
+    parser.add_argument("--output-dir", type=Path, help="内部使用")
+    args = parser.parse_args()
+
+    if args.backend:
+        result = run_backend(args.backend, args.texts_file, args.output_dir, args.rounds)
+        print(RESULT_PREFIX + json.dumps(result), flush=True)
+        return
+
+    from app.config import EMBED_MODEL, EMBED_THREADS
+    from app.ingest import parse_pdf_pages
+
+    questions = [case["question"] for case in json.loads((BENCH_DIR / "questions.json").read_text(encoding="utf-8"))]
+    chunks = [doc.page_content for pdf in sorted((BENCH_DIR.parent / "data").glob("*.pdf")) for doc in parse_pdf_pages(pdf)]
+
+    print(f"模型 {EMBED_MODEL}，线程数 {EMBED_THREADS or '默认'}，{len(questions)} 个问题，{len(chunks)} 个片段")
+    print(f"{'backend':>10} {'load s':>7} {'RSS MB':>7} {'p50 ms':>7} {'p99 ms':>7} {'chunks/s':>9}")
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        texts_file = Path(tmp) / "texts.json"
+        texts_file.write_text(json.dumps({"questions": questions, "chunks": chunks}), encoding="utf-8")
+        for backend in args.backends:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.embedding_bench", "--backend", backend,
+                 "--texts-file", str(texts_file), "--output-dir", tmp, "--rounds", str(args.rounds)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            line = next(line for line in output.splitlines() if line.startswith(RESULT_PREFIX))
+            r = json.loads(line[len(RESULT_PREFIX):])
+            print(
+                f"{backend:>10} {r['load_s']:>7.2f} {r['rss_mb']:>7.0f} {r['query_p50_ms']:>7.2f} "
+                f"{r['query_p99_ms']:>7.2f} {r['batch_chunks_per_s']:>9.1f}"
+            )
+
+        if "torch" in args.backends:
+            print(f"\n与 torch 的一致性（容差 {args.tolerance}）:")
+            for backend in (b for b in args.backends if b != "torch"):
+                p = parity(Path(tmp), backend)
+                ok = p["max_score_delta"] <= args.tolerance
+                failed = failed or not ok
+                print(
+                    f"{backend:>10} 最小余弦 {p['min_cosine']:.4f}  分数最大偏差 {p['max_score_delta']:.4f}  "
+                    f"top5 重合 {p['top5_overlap']:.2f}  {'通过' if ok else '未通过'}"
+                )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+结构化事实回答基准
+
+用 LLM 替身（模拟 Groq 延迟）回放 benchmarks/questions.json 和一组常见的大纲问题
+（评分方案、考核权重/日期、任课教师），对比关闭与开启结构化事实回答（FACT_ANSWERS）时：
+- 事实索引命中率（按意图统计）
+- 命中问题的延迟（事实索引 vs 检索 + LLM）、全部问题的延迟和 LLM 调用次数
+
+答案缓存关闭，每个问题都走完整路径。--show 打印事实索引给出的答案，便于人工核对。
+
+用法（在项目根目录执行，需要已用当前解析器构建的向量库）:
+    python -m benchmarks.fact_bench
+    python -m benchmarks.fact_bench --llm-latency 1.5 --show
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+
+# app.config 在导入时读取环境变量：关闭答案缓存
+os.environ["ANSWER_CACHE_SIZE"] = "0"
+
+from app.rag_service import RAGService, extract_course_codes  # noqa: E402
+from benchmarks.stub_llm import StubChatModel  # noqa: E402
+
+BENCH_DIR = Path(__file__).parent
+
+COMMON_QUESTIONS = [
+    "What is the grading scheme for STA237?",
+    "How are we graded in MAT235?",
+    "How much is the final exam worth in MAT224?",
+    "What percentage of the grade is the MAT235 final exam?",
+    "How much are the quizzes worth in STA237?",
+    "When is Test 2 in MAT224?",
+    "When is the final exam for STA237?",
+    "When are the LearnR modules due in STA237?",
+    "Who teaches STA237?",
+    "Who is the STA237 course coordinator?",
+    "Who teaches MAT235 LEC0201?",
+    "What happens if I miss the STA237 midterm?",
+]
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def replay(service: RAGService, questions: List[str], repeat: int) -> Dict[str, List[float]]:
+    latencies: Dict[str, List[float]] = {question: [] for question in questions}
+    for _ in range(repeat):
+        for question in questions:
+            start = time.perf_counter()
+            await service.aget_answer(question)
+            latencies[question].append(time.perf_counter() - start)
+    return latencies
+
+
+def summarize(latencies: Dict[str, List[float]], questions: List[str]) -> str:
+    values = [v for question in questions for v in latencies[question]]
+    return f"p50 {percentile(values, 0.5) * 1000:9.2f}ms  p99 {percentile(values, 0.99) * 1000:9.2f}ms"
+
+
+async def run(args: argparse.Namespace) -> None:
+    questions = [item["question"] for item in json.loads((BENCH_DIR / "questions.json").read_text())]
+    questions += COMMON_QUESTIONS
+    service = RAGService(llm=StubChatModel(latency=args.llm_latency))
+    fact_index = service.fact_index
+    if fact_index is None or not len(fact_index):
+        raise SystemExit("事实索引为空：请确认 FACT_ANSWERS 开启，并用当前解析器重新运行 python -m app.ingest")
+    print(f"事实索引: {fact_index.counts()}，LLM 替身延迟 {args.llm_latency:.2f}s，每个问题 {args.repeat} 次")
+
+    answers = {question: fact_index.answer(question, extract_course_codes(question)) for question in questions}
+    hits = [question for question in questions if answers[question] is not None]
+    intents = Counter(answers[question].intent for question in hits)
+    print(f"命中 {len(hits)}/{len(questions)} 个问题: {dict(intents)}")
+    if args.show:
+        for question in hits:
+            print(f"\nQ: {question}\n{answers[question].answer}")
+        print()
+
+    results = {}
+    for mode in ("rag", "facts"):
+        service.fact_index = fact_index if mode == "facts" else None
+        service.llm.calls = 0
+        results[mode] = await replay(service, questions, args.repeat)
+        results[mode + "_calls"] = service.llm.calls
+
+    print(f"{'mode':>6} {'命中问题':>34} {'全部问题':>34} {'LLM 调用':>9}")
+    for mode in ("rag", "facts"):
+        print(
+            f"{mode:>6} {summarize(results[mode], hits):>34} {summarize(results[mode], questions):>34} "
+            f"{results[mode + '_calls']:>9}"
+        )
+    speedup = statistics.median(v for q in hits for v in results["rag"][q]) / statistics.median(
+        v for q in hits for v in results["facts"][q]
+    )
+    print(f"命中问题的中位延迟降低 {speedup:.0f} 倍")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="结构化事实回答基准")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="LLM 替身的模拟延迟（秒）")
+    parser.add_argument("--repeat", type=int, default=3, help="每个问题回放的次数")
+    parser.add_argument("--show", action="store_true", help="打印事实索引给出的答案")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+混合检索基准
+
+在 benchmarks/questions.json 的标注问题上，对比三种检索方式的 recall@k：
+vector（只用向量）、lexical（只用 BM25）、hybrid（RRF 融合），检索范围与线上一致
+（识别到课程代码时限定在这些课程内）；同时测量 BM25 单次查询和完整混合检索的延迟。
+
+用法（在项目根目录执行，需要已构建的向量库）:
+    python -m benchmarks.hybrid_bench --rounds 50
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from pathlib import Path
+from typing import Dict, List
+
+# 检索延迟测量需要每次都走完整检索路径，关闭检索结果缓存；加载 BM25 索引需要 hybrid 模式（app.config 在导入时读取）
+os.environ["RETRIEVAL_CACHE_SIZE"] = "0"
+os.environ["RETRIEVAL_MODE"] = "hybrid"
+
+from langchain_core.documents import Document  # noqa: E402
+
+from app.rag_service import RAGService, extract_course_codes  # noqa: E402
+from benchmarks.stub_llm import StubChatModel  # noqa: E402
+from benchmarks.suite import RECALL_KS, is_relevant  # noqa: E402
+
+MODES = ("vector", "lexical", "hybrid")
+
+
+def rank_documents(service: RAGService, mode: str, question: str, embedding: List[float]) -> List[Document]:
+    """按指定方式检索前 max(RECALL_KS) 个文档"""
+    k = max(RECALL_KS)
+    course_codes = [code for code in extract_course_codes(question) if code in service.course_index] or None
+    course_filter = service._course_filter(course_codes) if course_codes else None
+    if mode == "lexical":
+        ids = [chunk_id for chunk_id, _ in service.lexical_index.search(question, k, course_codes)]
+        if not ids:
+            return []
+        data = service.vector_store.get(ids=ids, include=["documents", "metadatas"])
+        by_id = dict(zip(data["ids"], zip(data["documents"], data["metadatas"])))
+        return [Document(page_content=by_id[i][0], metadata=by_id[i][1]) for i in ids if i in by_id]
+    if mode == "vector":
+        return [doc for _, doc in service._query_vectors([embedding], k, course_filter)[0]]
+    return service._search([question], [embedding], k, course_filter, course_codes)[0]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="混合检索基准")
+    parser.add_argument("--questions", type=Path, default=Path(__file__).parent / "questions.json")
+    parser.add_argument("--rounds", type=int, default=50, help="延迟测量的轮数")
+    args = parser.parse_args()
+
+    cases = json.loads(args.questions.read_text(encoding="utf-8"))
+    service = RAGService(llm=StubChatModel(latency=0))
+    embeddings = {case["question"]: service.embeddings.embed_query(case["question"]) for case in cases}
+
+    print(f"{'mode':>8} " + " ".join(f"{f'recall@{k}':>10}" for k in RECALL_KS))
+    for mode in MODES:
+        first_ranks: List[int] = []
+        for case in cases:
+            docs = rank_documents(service, mode, case["question"], embeddings[case["question"]])
+            ranks = [i for i, doc in enumerate(docs, start=1) if is_relevant(doc, case)]
+            first_ranks.append(ranks[0] if ranks else 0)
+        recalls: Dict[int, float] = {
+            k: sum(1 for rank in first_ranks if 0 < rank <= k) / len(cases) for k in RECALL_KS
+        }
+        print(f"{mode:>8} " + " ".join(f"{recalls[k]:>10.2f}" for k in RECALL_KS))
+
+    lexical_us, hybrid_ms = [], []
+    for _ in range(args.rounds):
+        for case in cases:
+            question = case["question"]
+            codes = extract_course_codes(question)
+            start = time.perf_counter()
+            service.lexical_index.search(question, max(RECALL_KS), codes or None)
+            lexical_us.append((time.perf_counter() - start) * 1e6)
+            start = time.perf_counter()
+            service._retrieve_documents(question, embeddings[question], codes)
+            hybrid_ms.append((time.perf_counter() - start) * 1000)
+    lexical_us.sort()
+    print(
+        f"\nBM25 查询（{len(service.lexical_index)} 个片段）: 平均 {statistics.mean(lexical_us):.1f}µs，"
+        f"p99 {lexical_us[int(len(lexical_us) * 0.99) - 1]:.1f}µs"
+    )
+    print(f"完整混合检索（不含问题嵌入）: 平均 {statistics.mean(hybrid_ms):.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+并行摄取基准
+
+将 data/ 中的 PDF 复制为 N 份（模拟整个院系的课程大纲），在临时目录中从零摄取，
+分别用不同的解析进程数运行，报告耗时、吞吐量和峰值内存。
+
+用法（在项目根目录执行）:
+    python -m benchmarks.ingest_bench --copies 100 --workers 1 4 8
+    python -m benchmarks.ingest_bench --copies 100 --workers 1 4 --parse-only
+"""
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from langchain_chroma import Chroma
+
+from app.config import BASE_DIR
+from app.embeddings import create_embeddings
+from app.ingest import _peak_rss_mb, _plan_parse_tasks, _run_parse_tasks, file_sha256, sync_vector_store
+
+
+def make_corpus(target: Path, copies: int) -> list:
+    """复制 data/ 中的 PDF，生成 copies 份不同课程代码的文件"""
+    sources = sorted((BASE_DIR / "data").glob("*.pdf"))
+    pdf_files = []
+    for i in range(copies):
+        source = sources[i % len(sources)]
+        # 例如 MAT235Y1.pdf -> MAT007Y1.pdf，保持课程代码格式
+        name = f"{source.stem[:3]}{i % 1000:03d}{source.stem[6:]}-{i}.pdf"
+        shutil.copyfile(source, target / name)
+        pdf_files.append(name)
+    return pdf_files
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="并行摄取基准")
+    parser.add_argument("--copies", type=int, default=60, help="PDF 份数")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--parse-only", action="store_true", help="只测解析阶段，不嵌入不写库")
+    args = parser.parse_args()
+
+    embeddings = None
+    if not args.parse_only:
+        embeddings = create_embeddings()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_dir = Path(tmp) / "pdfs"
+        pdf_dir.mkdir()
+        pdf_files = make_corpus(pdf_dir, args.copies)
+
+        for workers in args.workers:
+            start = time.perf_counter()
+            if args.parse_only:
+                tasks = [
+                    task for name in pdf_files
+                    for task in _plan_parse_tasks(name, pdf_dir / name, file_sha256(pdf_dir / name))
+                ]
+                chunks = sum(len(docs) for _, (docs, _facts) in _run_parse_tasks(tasks, workers))
+            else:
+                db_path = str(Path(tmp) / f"db-{workers}")
+                vector_store = Chroma(persist_directory=db_path, embedding_function=embeddings)
+                sync_vector_store(
+                    vector_store, pdf_files=pdf_files, pdf_dir=pdf_dir, db_path=db_path,
+                    workers=workers, batch_size=args.batch_size
+                )
+                chunks = vector_store._collection.count()
+            elapsed = time.perf_counter() - start
+            peak_self, peak_children = _peak_rss_mb()
+            print(
+                f"workers={workers:>2}: {len(pdf_files)} 个 PDF，{chunks} 个片段，耗时 {elapsed:.2f}s，"
+                f"{len(pdf_files) / elapsed:.1f} PDF/秒，峰值内存 主进程 {peak_self:.0f}MB / 子进程 {peak_children:.0f}MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+/chat 并发负载测试
+
+使用本地 LLM 替身（模拟上游延迟）压测 /chat，统计 1、8、32 个并发客户端下的
+requests/sec 和延迟分位数，同时探测 /health 在负载下的响应时间。
+
+用法（在项目根目录执行，需要已构建的向量库）:
+    python -m benchmarks.load_bench
+    python -m benchmarks.load_bench --llm-latency 0.5 --requests 64 --concurrency 1 8 32
+    python -m benchmarks.load_bench --blocking   # 对比旧的同步 get_answer 路径
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import List
+
+# 必须在导入 app 之前设置，避免压测被速率限制拦截；关闭结构化事实回答，所有问题都经过检索和 LLM
+os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "1000000")
+os.environ.setdefault("FACT_ANSWERS", "false")
+
+import httpx
+
+from benchmarks.stub_llm import StubChatModel
+
+QUESTIONS = [
+    "What is the grading scheme for MAT235?",
+    "When are the office hours for STA237?",
+    "What textbook is required for MAT224?",
+    "Tell me about the late submission policy",
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """计算分位数（最近秩法）"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+async def run_level(client: httpx.AsyncClient, headers: dict, concurrency: int, total: int) -> dict:
+    """以指定并发度发送 total 个 /chat 请求
+
+    Returns:
+        包含吞吐量和延迟统计的字典
+    """
+    latencies: List[float] = []
+    health_latencies: List[float] = []
+    remaining = iter(range(total))
+    done = asyncio.Event()
+
+    async def worker() -> None:
+        for i in remaining:
+            start = time.perf_counter()
+            response = await client.post(
+                "/chat", json={"question": QUESTIONS[i % len(QUESTIONS)]}, headers=headers
+            )
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    async def probe_health() -> None:
+        while not done.is_set():
+            start = time.perf_counter()
+            await client.get("/health")
+            health_latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(0.05)
+
+    prober = asyncio.create_task(probe_health())
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await prober
+
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "rps": total / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "health_max_ms": max(health_latencies) * 1000 if health_latencies else 0.0,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="/chat 并发负载测试")
+    parser.add_argument("--requests", type=int, default=64, help="每个并发级别的请求总数")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="LLM 替身的模拟延迟（秒）")
+    parser.add_argument("--blocking", action="store_true", help="在事件循环中直接调用同步 get_answer")
+    args = parser.parse_args()
+
+    from app.config import API_KEY
+    from app.main import app, rag_service
+
+    # ASGITransport 不会触发 lifespan：用本地替身作为 LLM，直接初始化 RAG 服务
+    rag_service.llm = StubChatModel(latency=args.llm_latency)
+    rag_service.initialize_rag()
+
+    if args.blocking:
+        async def blocking_answer(question: str, timer=None) -> str:
+            return rag_service.get_answer(question, timer)
+        rag_service.aget_answer = blocking_answer
+
+    headers = {"Authorization": f"Bearer {API_KEY}"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        print(f"LLM 替身延迟: {args.llm_latency:.2f}s, 模式: {'blocking' if args.blocking else 'async'}")
+        print(f"{'clients':>8} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'/health max ms':>15}")
+        for concurrency in args.concurrency:
+            result = await run_level(client, headers, concurrency, args.requests)
+            print(
+                f"{result['concurrency']:>8} {result['rps']:>8.2f} {result['p50_ms']:>9.1f} "
+                f"{result['p95_ms']:>9.1f} {result['health_max_ms']:>15.1f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
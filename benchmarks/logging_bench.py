@@ -0,0 +1,122 @@
+"""
+日志开销基准
+
+使用本地 LLM 替身压测 /chat（关闭答案缓存），对比三种日志模式下的延迟分位数：
+off（禁用日志）、sync（请求线程直接写控制台和文件）、async（队列 + 后台写入线程）。
+每种模式在独立的子进程中运行，因为日志模式在导入 app 时确定。
+
+用法（在项目根目录执行，需要已构建的向量库）:
+    python -m benchmarks.logging_bench --requests 2000 --concurrency 16 --llm-latency 0
+    python -m benchmarks.logging_bench --disk-latency-ms 2   # 模拟慢磁盘
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+RESULT_PREFIX = "RESULT "
+
+QUESTIONS = [
+    "What is the grading scheme for MAT235?",
+    "When are the office hours for STA237?",
+    "What textbook is required for MAT224?",
+    "Tell me about the late submission policy",
+]
+
+
+async def run_mode(args: argparse.Namespace) -> dict:
+    """在当前进程中按 LOG_* 环境变量运行一轮压测"""
+    from app.config import API_KEY
+    from app.main import app, rag_service
+    from benchmarks.stub_llm import StubChatModel
+
+    rag_service.llm = StubChatModel(latency=args.llm_latency)
+    rag_service.initialize_rag()
+    if args.mode == "off":
+        logging.disable(logging.CRITICAL)
+    if args.disk_latency_ms:
+        # 模拟慢磁盘（例如 EBS 突发额度耗尽）：每次写文件额外阻塞
+        file_emit = logging.FileHandler.emit
+
+        def slow_emit(handler, record):
+            time.sleep(args.disk_latency_ms / 1000)
+            file_emit(handler, record)
+        logging.FileHandler.emit = slow_emit
+
+    headers = {"Authorization": f"Bearer {API_KEY}"}
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def worker(remaining, record: bool) -> None:
+            for i in remaining:
+                start = time.perf_counter()
+                response = await client.post(
+                    "/chat", json={"question": f"{QUESTIONS[i % len(QUESTIONS)]} ({i})"}, headers=headers
+                )
+                response.raise_for_status()
+                if record:
+                    latencies.append(time.perf_counter() - start)
+
+        # 预热：不计入结果
+        warmup = iter(range(args.concurrency * 4))
+        await asyncio.gather(*(worker(warmup, False) for _ in range(args.concurrency)))
+        remaining = iter(range(args.requests))
+        await asyncio.gather(*(worker(remaining, True) for _ in range(args.concurrency)))
+
+    latencies.sort()
+    return {
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "max_ms": latencies[-1] * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="日志开销基准")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="LLM 替身的模拟延迟（秒）")
+    parser.add_argument("--disk-latency-ms", type=float, default=0, help="每次写日志文件额外阻塞的毫秒数")
+    parser.add_argument("--mode", choices=["off", "sync", "async"], help="只运行一种模式（内部使用）")
+    args = parser.parse_args()
+
+    if args.mode:
+        print(RESULT_PREFIX + json.dumps(asyncio.run(run_mode(args))), flush=True)
+        return
+
+    print(
+        f"LLM 替身延迟: {args.llm_latency:.2f}s, 磁盘写延迟: {args.disk_latency_ms:.1f}ms, "
+        f"{args.concurrency} 个并发客户端, {args.requests} 个请求"
+    )
+    print(f"{'mode':>6} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("off", "sync", "async"):
+            env = dict(
+                os.environ,
+                LOG_ASYNC="false" if mode == "sync" else "true",
+                LOG_FILE=os.path.join(tmp, f"{mode}.log"),
+                ANSWER_CACHE_SIZE="0",
+                FACT_ANSWERS="false",
+                RATE_LIMIT_PER_MINUTE="1000000",
+            )
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.logging_bench", "--mode", mode,
+                 "--requests", str(args.requests), "--concurrency", str(args.concurrency),
+                 "--llm-latency", str(args.llm_latency), "--disk-latency-ms", str(args.disk_latency_ms)],
+                env=env, check=True, capture_output=True, text=True
+            ).stdout
+            # 控制台日志也写到 stdout（异步模式下可能在结果之后才写出）
+            line = next(line for line in output.splitlines() if line.startswith(RESULT_PREFIX))
+            result = json.loads(line[len(RESULT_PREFIX):])
+            print(f"{mode:>6} {result['p50_ms']:>9.1f} {result['p99_ms']:>9.1f} {result['max_ms']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
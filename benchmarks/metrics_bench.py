@@ -0,0 +1,69 @@
+"""
+指标开销基准
+
+测量分阶段计时和指标记录的单次开销，并换算为一次完整 /chat 请求
+（缓存查找、嵌入、检索、拼接上下文、LLM、总耗时 6 个阶段 + 4 次计数/直方图记录）
+的插桩总开销；同时测量导出 /metrics 的耗时。
+
+用法（在项目根目录执行）:
+    python -m benchmarks.metrics_bench --iterations 200000
+"""
+import argparse
+import time
+
+from app.metrics import (
+    CACHE_LOOKUPS, CONTEXT_CHARS, RETRIEVED_CHUNKS, StageTimer, record_token_usage, render_metrics
+)
+
+STAGES = ("cache", "embed", "retrieve", "context", "llm")
+
+
+def instrumented_request() -> None:
+    """一次缓存未命中请求的全部插桩操作（阶段本身不做任何工作）"""
+    timer = StageTimer()
+    for stage in STAGES:
+        with timer.stage(stage):
+            pass
+    CACHE_LOOKUPS.inc(result="miss")
+    RETRIEVED_CHUNKS.observe(5)
+    CONTEXT_CHARS.observe(6000)
+    record_token_usage({"input_tokens": 1500, "output_tokens": 200})
+    timer.finish()
+    timer.as_header()
+
+
+def per_call_us(func, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="指标开销基准")
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--request-ms", type=float, default=500, help="用于换算占比的典型请求耗时（毫秒）")
+    args = parser.parse_args()
+
+    timer = StageTimer()
+
+    def one_stage() -> None:
+        with timer.stage("embed"):
+            pass
+
+    stage_us = per_call_us(one_stage, args.iterations)
+    inc_us = per_call_us(lambda: CACHE_LOOKUPS.inc(result="miss"), args.iterations)
+    request_us = per_call_us(instrumented_request, args.iterations // 10)
+    render_ms = per_call_us(render_metrics, 1000) / 1000
+
+    print(f"单个阶段计时（含直方图记录）: {stage_us:.2f}µs")
+    print(f"单次计数器递增: {inc_us:.2f}µs")
+    print(
+        f"每个请求的插桩总开销: {request_us:.1f}µs，"
+        f"占 {args.request_ms:.0f}ms 请求的 {request_us / (args.request_ms * 1000) * 100:.4f}%"
+    )
+    print(f"导出 /metrics: {render_ms:.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
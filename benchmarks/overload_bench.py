@@ -0,0 +1,137 @@
+"""
+过载基准
+
+用上游并发能力有限的 LLM 替身模拟 Groq（超过上游并发数的调用在上游排队），
+以高于处理能力的固定速率（开环）向 /chat 发送互不相同的问题，对比：
+- unbounded: 不限制并发、不排队、不设截止时间（调度器之前的行为）
+- scheduler: 默认的 LLM 调度配置（LLM_MAX_CONCURRENCY / LLM_QUEUE_SIZE / REQUEST_DEADLINE_SECONDS）
+
+输出成功请求的 p50 / p99 延迟、吞吐量，以及 503 的数量和返回速度。
+
+用法（在项目根目录执行，需要已构建的向量库）:
+    python -m benchmarks.overload_bench --rate 40 --seconds 10
+    LLM_MAX_CONCURRENCY=4 LLM_QUEUE_SIZE=8 python -m benchmarks.overload_bench
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+# app.config 在导入时读取环境变量：关闭答案缓存和结构化事实回答（所有问题都经过 LLM），放开速率限制
+os.environ["ANSWER_CACHE_SIZE"] = "0"
+os.environ["FACT_ANSWERS"] = "false"
+os.environ["RATE_LIMIT_PER_MINUTE"] = "1000000"
+
+import app.rag_service as rag_module  # noqa: E402
+from app.config import API_KEY, LLM_MAX_CONCURRENCY, LLM_QUEUE_SIZE, REQUEST_DEADLINE_SECONDS  # noqa: E402
+from app.llm_scheduler import LLMScheduler  # noqa: E402
+from app.main import app, rag_service  # noqa: E402
+from benchmarks.stub_llm import StubChatModel  # noqa: E402
+
+UNBOUNDED = 10 ** 9
+
+
+class UpstreamStub(StubChatModel):
+    """上游同时只处理 capacity 个调用的 LLM 替身，其余调用在上游排队"""
+
+    capacity: int = 8
+    active: int = 0
+
+    async def _agenerate(self, messages: List[Any], stop=None, run_manager=None, **kwargs: Any):
+        while self.active >= self.capacity:
+            await asyncio.sleep(0.005)
+        self.active += 1
+        try:
+            return await super()._agenerate(messages, stop, run_manager, **kwargs)
+        finally:
+            self.active -= 1
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def run_mode(client: httpx.AsyncClient, rate: float, seconds: float) -> Dict[str, float]:
+    headers = {"Authorization": f"Bearer {API_KEY}"}
+    ok: List[float] = []
+    rejected: List[float] = []
+    retry_after: List[int] = []
+
+    async def send(i: int) -> None:
+        start = time.perf_counter()
+        response = await client.post("/chat", json={"question": f"What is the grading scheme for MAT235? (#{i})"},
+                                     headers=headers)
+        elapsed = time.perf_counter() - start
+        if response.status_code == 200:
+            ok.append(elapsed)
+        elif response.status_code == 503:
+            rejected.append(elapsed)
+            retry_after.append(int(response.headers.get("Retry-After", 0)))
+
+    start = time.perf_counter()
+    tasks = []
+    for i in range(int(rate * seconds)):
+        # 开环到达：按计划时间发送，不等待之前的请求完成
+        await asyncio.sleep(max(0.0, start + i / rate - time.perf_counter()))
+        tasks.append(asyncio.create_task(send(i)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    return {
+        "ok": len(ok),
+        "rejected": len(rejected),
+        "throughput": len(ok) / elapsed,
+        "p50_ms": percentile(ok, 0.5) * 1000,
+        "p99_ms": percentile(ok, 0.99) * 1000,
+        "reject_p50_ms": percentile(rejected, 0.5) * 1000,
+        "retry_after": percentile(retry_after, 0.5) if retry_after else 0,
+    }
+
+
+async def run(args: argparse.Namespace) -> None:
+    rag_service.llm = UpstreamStub(latency=args.llm_latency, capacity=args.upstream_capacity)
+    rag_service.initialize_rag()
+    # 每个问题都不同，请求合并不起作用，关闭以免干扰对比
+    rag_module.COALESCE_REQUESTS = False
+    modes = {
+        "unbounded": (LLMScheduler(max_concurrency=UNBOUNDED, max_queue=UNBOUNDED), UNBOUNDED),
+        "scheduler": (LLMScheduler(), REQUEST_DEADLINE_SECONDS),
+    }
+    capacity = args.upstream_capacity / args.llm_latency
+    print(
+        f"到达速率 {args.rate:.0f}/s，持续 {args.seconds:.0f}s；上游并发 {args.upstream_capacity}、"
+        f"延迟 {args.llm_latency:.2f}s（处理能力约 {capacity:.0f}/s）"
+    )
+    print(
+        f"调度配置: 并发上限 {LLM_MAX_CONCURRENCY}，队列 {LLM_QUEUE_SIZE}，截止时间 {REQUEST_DEADLINE_SECONDS:.0f}s"
+    )
+    print(f"{'mode':>10} {'ok':>5} {'503':>5} {'ok/s':>6} {'p50 ms':>8} {'p99 ms':>8} {'503 ms':>7} {'Retry-After':>12}")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for name, (scheduler, deadline) in modes.items():
+            rag_service.llm_scheduler = scheduler
+            rag_module.REQUEST_DEADLINE_SECONDS = deadline
+            r = await run_mode(client, args.rate, args.seconds)
+            print(
+                f"{name:>10} {r['ok']:>5} {r['rejected']:>5} {r['throughput']:>6.1f} {r['p50_ms']:>8.0f} "
+                f"{r['p99_ms']:>8.0f} {r['reject_p50_ms']:>7.1f} {r['retry_after']:>12}"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="过载基准")
+    parser.add_argument("--rate", type=float, default=40, help="每秒到达的请求数")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="LLM 替身的模拟延迟（秒）")
+    parser.add_argument("--upstream-capacity", type=int, default=8, help="上游同时处理的调用数")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+速率限制器微基准
+
+对比旧实现（每个 IP 一个 datetime 列表，每次检查重建列表，单个全局锁，从不淘汰）
+与令牌桶实现，在不同的客户端 IP 数量下测量每次检查的平均耗时和限制器占用的内存。
+
+用法（在项目根目录执行）:
+    python -m benchmarks.rate_limit_bench --clients 1000 10000 100000
+    python -m benchmarks.rate_limit_bench --sqlite   # 同时测量共享 SQLite 后端
+"""
+import argparse
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict
+
+from app.middleware import RateLimiter, SQLiteRateLimiter
+
+
+class LegacyRateLimiter:
+    """旧实现"""
+
+    def __init__(self, max_requests: int, window_seconds: int = 60):
+        self.max_requests = max_requests
+        self.window_seconds = window_seconds
+        self.requests: Dict[str, list] = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def is_allowed(self, client_id: str) -> bool:
+        now = datetime.now()
+        cutoff = now - timedelta(seconds=self.window_seconds)
+        with self.lock:
+            self.requests[client_id] = [t for t in self.requests[client_id] if t > cutoff]
+            if len(self.requests[client_id]) >= self.max_requests:
+                return False
+            self.requests[client_id].append(now)
+            return True
+
+
+def measure(limiter, clients: int, checks: int, warmup_per_client: int) -> Dict[str, float]:
+    """先让每个客户端发送 warmup_per_client 次请求，再随机抽取客户端计时"""
+    ips = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(clients)]
+
+    tracemalloc.start()
+    for _ in range(warmup_per_client):
+        for ip in ips:
+            limiter.is_allowed(ip)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    sample = random.Random(0).choices(ips, k=checks)
+    start = time.perf_counter()
+    for ip in sample:
+        limiter.is_allowed(ip)
+    elapsed = time.perf_counter() - start
+    return {"ns_per_check": elapsed / checks * 1e9, "memory_mb": memory / 1024 / 1024}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="速率限制器微基准")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--checks", type=int, default=100000)
+    parser.add_argument("--max-requests", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=5, help="计时前每个客户端的请求数")
+    parser.add_argument("--sqlite", action="store_true", help="同时测量 SQLite 共享后端")
+    args = parser.parse_args()
+
+    print(f"{'limiter':>14} {'clients':>8} {'ns/check':>10} {'memory MB':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for clients in args.clients:
+            limiters = {
+                "legacy": LegacyRateLimiter(args.max_requests),
+                "token-bucket": RateLimiter(args.max_requests),
+            }
+            if args.sqlite:
+                db_path = str(Path(tmp) / f"rate_limit_{clients}.sqlite3")
+                limiters["sqlite"] = SQLiteRateLimiter(db_path, args.max_requests)
+            for name, limiter in limiters.items():
+                checks = args.checks if name != "sqlite" else args.checks // 10
+                result = measure(limiter, clients, checks, args.warmup)
+                print(f"{name:>14} {clients:>8} {result['ns_per_check']:>10.0f} {result['memory_mb']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
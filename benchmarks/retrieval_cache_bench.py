@@ -0,0 +1,65 @@
+"""
+检索缓存基准
+
+关闭答案缓存（模拟修改 Prompt 或更换 LLM 后答案缓存失效的情况），用 LLM 替身回放
+benchmarks/questions.json 中的问题（每轮附带大小写/空白不同的变体），对比关闭与开启
+问题嵌入缓存 + 检索结果缓存时，每次请求在 LLM 之前的耗时（嵌入 + 检索）和缓存命中率。
+
+用法（在项目根目录执行，需要已构建的向量库）:
+    python -m benchmarks.retrieval_cache_bench --rounds 5
+"""
+import argparse
+import json
+import os
+import statistics
+from pathlib import Path
+from typing import Dict, List
+
+# app.config 在导入时读取环境变量：关闭答案缓存，只测嵌入和检索缓存
+os.environ["ANSWER_CACHE_SIZE"] = "0"
+
+from app.metrics import StageTimer  # noqa: E402
+from app.rag_service import RAGService  # noqa: E402
+from benchmarks.stub_llm import StubChatModel  # noqa: E402
+
+
+def replay(service: RAGService, questions: List[str]) -> Dict[str, float]:
+    """逐个回放问题，返回嵌入和检索阶段的平均耗时（毫秒）"""
+    totals: List[float] = []
+    for question in questions:
+        timer = StageTimer()
+        service.get_answer(question, timer=timer)
+        totals.append((timer.stages.get("embed", 0.0) + timer.stages.get("retrieve", 0.0)) * 1000)
+    return {"mean_ms": statistics.mean(totals), "p50_ms": sorted(totals)[len(totals) // 2]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="检索缓存基准")
+    parser.add_argument("--questions", type=Path, default=Path(__file__).parent / "questions.json")
+    parser.add_argument("--rounds", type=int, default=5, help="问题集回放轮数")
+    args = parser.parse_args()
+
+    base = [case["question"] for case in json.loads(args.questions.read_text(encoding="utf-8"))]
+    questions = []
+    for round_idx in range(args.rounds):
+        # 奇数轮使用大小写/空白不同的变体，规范化后应命中同一缓存条目
+        questions += base if round_idx % 2 == 0 else [f"  {q.lower()} " for q in base]
+
+    service = RAGService(llm=StubChatModel(latency=0))
+    sizes = (service.embedding_cache.max_size, service.retrieval_cache.max_size)
+
+    service.embedding_cache.max_size = service.retrieval_cache.max_size = 0
+    uncached = replay(service, questions)
+    service.embedding_cache.max_size, service.retrieval_cache.max_size = sizes
+    cached = replay(service, questions)
+
+    print(f"{len(questions)} 次请求（{len(base)} 个不同问题 x {args.rounds} 轮），答案缓存关闭")
+    print(f"无缓存:   嵌入+检索 平均 {uncached['mean_ms']:.2f}ms  p50 {uncached['p50_ms']:.2f}ms")
+    print(f"开启缓存: 嵌入+检索 平均 {cached['mean_ms']:.2f}ms  p50 {cached['p50_ms']:.2f}ms")
+    for cache in (service.embedding_cache, service.retrieval_cache):
+        stats = cache.stats()
+        print(f"  {cache.name} 缓存: {stats['size']} 条，命中率 {stats['hit_rate']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+基准测试用的本地 LLM 替身
+模拟 ChatGroq 的网络延迟，返回确定性的答案，不访问任何外部服务
+"""
+import asyncio
+import time
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+class StubChatModel(BaseChatModel):
+    """确定性的 Chat 模型替身
+
+    Attributes:
+        latency: 每次调用模拟的上游延迟（秒）
+        answer: 固定返回的答案文本
+        calls: 累计调用次数
+    """
+
+    latency: float = 0.5
+    answer: str = "This is a stubbed answer.\n\nSource: STUB"
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat"
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        self.calls += 1
+        # 按约 4 个字符一个 token 估算用量，与 ChatGroq 一样写入 usage_metadata
+        input_tokens = sum(len(str(message.content)) for message in messages) // 4
+        output_tokens = len(self.answer) // 4
+        message = AIMessage(
+            content=self.answer,
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            }
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.latency)
+        return self._result(messages)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._result(messages)
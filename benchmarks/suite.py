@@ -0,0 +1,264 @@
+"""
+检索 + 端到端基准套件
+
+在临时目录中用 data/ 下的 PDF（可选再加 N 份合成课程大纲）从零构建向量库，
+然后用 benchmarks/questions.json 中带标注的问题集：
+1. 测量检索延迟分位数和 recall@k（前 k 个片段中是否有包含标注答案、且属于正确课程的片段）
+2. 用确定性的 LLM 替身通过 RAGService.get_answer 回放问题，测量端到端 QPS、延迟和每次 LLM 调用的 prompt tokens
+
+结果写入 JSON，可与之前的结果对比（分块参数、k、缓存等改动的回归检查）。
+
+用法（在项目根目录执行）:
+    python -m benchmarks.suite
+    python -m benchmarks.suite --synthetic 1000 --rounds 3 --concurrency 8
+    python -m benchmarks.suite --cache --baseline benchmarks/results/suite-20250101-120000.json
+    RETRIEVAL_MODE=hybrid RETRIEVAL_K_PER_COURSE=3 python -m benchmarks.suite   # 对比检索配置
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+BENCH_DIR = Path(__file__).parent
+DATA_DIR = BENCH_DIR.parent / "data"
+RECALL_KS = (1, 3, 5, 10)
+
+# 与基线对比时输出的指标：(路径, 是否越大越好)
+COMPARED_METRICS = [
+    (("ingest", "seconds"), False),
+    (("ingest", "chunks"), None),
+    (("ingest", "index_bytes"), False),
+    (("retrieval", "p50_ms"), False),
+    (("retrieval", "p95_ms"), False),
+    (("retrieval", "p99_ms"), False),
+    *((("retrieval", f"recall@{k}"), True) for k in RECALL_KS),
+    (("end_to_end", "qps"), True),
+    (("end_to_end", "p50_ms"), False),
+    (("end_to_end", "p99_ms"), False),
+    (("end_to_end", "prompt_tokens_per_call"), False),
+]
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """最近秩法分位数"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def latency_summary(seconds: Sequence[float]) -> Dict[str, float]:
+    return {
+        "p50_ms": round(percentile(seconds, 50) * 1000, 2),
+        "p95_ms": round(percentile(seconds, 95) * 1000, 2),
+        "p99_ms": round(percentile(seconds, 99) * 1000, 2),
+    }
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).lower()
+
+
+def is_relevant(doc, case: Dict) -> bool:
+    """片段是否包含标注答案之一，且（指定课程时）属于该课程"""
+    if case["course"] and doc.metadata.get("course_base") != case["course"]:
+        return False
+    content = _normalize(doc.page_content)
+    return any(_normalize(answer) in content for answer in case["answers"])
+
+
+def make_synthetic_corpus(target: Path, copies: int) -> List[str]:
+    """复制 data/ 中的 PDF，生成 copies 份不同课程代码的课程大纲（代码从 900 开始，避免与真实课程冲突）"""
+    sources = sorted(DATA_DIR.glob("*.pdf"))
+    names = []
+    for i in range(copies):
+        source = sources[i % len(sources)]
+        name = f"SYN{900 + i // 1000:03d}{i % 1000:03d}-{source.name}"
+        shutil.copyfile(source, target / name)
+        names.append(name)
+    return names
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR.parent,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def directory_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def compare(result: Dict, baseline: Dict) -> None:
+    """打印与基线结果的对比"""
+    print(f"\n与基线对比（{baseline.get('git_commit')} @ {baseline.get('timestamp')}）:")
+    for path, higher_is_better in COMPARED_METRICS:
+        old = baseline.get(path[0], {}).get(path[1])
+        new = result.get(path[0], {}).get(path[1])
+        if old is None or new is None:
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        flag = ""
+        if higher_is_better is not None and abs(change) >= 5:
+            flag = "  ✓" if (change > 0) == higher_is_better else "  ✗ 回归"
+        print(f"  {'.'.join(path):<24} {old:>12} -> {new:<12} ({change:+.1f}%){flag}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="检索 + 端到端基准套件")
+    parser.add_argument("--questions", type=Path, default=BENCH_DIR / "questions.json")
+    parser.add_argument("--synthetic", type=int, default=0, help="额外生成的合成课程大纲份数")
+    parser.add_argument("--rounds", type=int, default=3, help="问题集回放轮数")
+    parser.add_argument("--concurrency", type=int, default=1, help="端到端回放的并发线程数")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="LLM 替身的模拟延迟（秒）")
+    parser.add_argument("--cache", action="store_true", help="启用答案、问题嵌入和检索结果缓存（默认关闭，只测检索和生成路径）")
+    parser.add_argument("--workers", type=int, default=None, help="摄取解析进程数")
+    parser.add_argument("--output", type=Path, default=None, help="结果 JSON 路径")
+    parser.add_argument("--baseline", type=Path, default=None, help="用于对比的历史结果 JSON")
+    args = parser.parse_args()
+
+    cases = json.loads(args.questions.read_text(encoding="utf-8"))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_dir = Path(tmp) / "pdfs"
+        pdf_dir.mkdir()
+        pdf_files = []
+        for source in sorted(DATA_DIR.glob("*.pdf")):
+            shutil.copyfile(source, pdf_dir / source.name)
+            pdf_files.append(source.name)
+        pdf_files += make_synthetic_corpus(pdf_dir, args.synthetic)
+        db_path = Path(tmp) / "chroma_db"
+
+        # app.config 在导入时读取环境变量，必须先设置
+        os.environ.update(
+            CHROMA_DB_PATH=str(db_path),
+            PDF_DIRECTORY=str(pdf_dir),
+            PDF_FILES=",".join(pdf_files),
+            ANSWER_CACHE_SIZE=os.environ.get("ANSWER_CACHE_SIZE", "1000") if args.cache else "0",
+            EMBEDDING_CACHE_SIZE=os.environ.get("EMBEDDING_CACHE_SIZE", "2000") if args.cache else "0",
+            RETRIEVAL_CACHE_SIZE=os.environ.get("RETRIEVAL_CACHE_SIZE", "2000") if args.cache else "0",
+            LOG_FILE=str(Path(tmp) / "suite.log"),
+            # 回放测量的是检索 + LLM 路径，不让结构化事实回答短路
+            FACT_ANSWERS="false",
+        )
+        from langchain_chroma import Chroma
+
+        from app import config
+        from app.embeddings import create_embeddings
+        from app.ingest import CHUNK_OVERLAP, CHUNK_SIZE, EXTRACTOR_VERSION, sync_vector_store
+        from app.metrics import LLM_TOKENS
+        from app.rag_service import RAGService, extract_course_codes
+        from benchmarks.stub_llm import StubChatModel
+
+        # 1. 摄取
+        embeddings = create_embeddings()
+        vector_store = Chroma(persist_directory=str(db_path), embedding_function=embeddings)
+        start = time.perf_counter()
+        sync_vector_store(vector_store, workers=args.workers or config.INGEST_WORKERS)
+        ingest = {
+            "seconds": round(time.perf_counter() - start, 3),
+            "pdfs": len(pdf_files),
+            "chunks": vector_store._collection.count(),
+            "index_bytes": directory_size(db_path),
+        }
+        print(f"摄取: {ingest}")
+
+        llm = StubChatModel(latency=args.llm_latency)
+        service = RAGService(llm=llm)
+
+        # 2. 检索延迟与 recall@k
+        retrieval_latencies = []
+        per_question = []
+        for round_idx in range(args.rounds):
+            for case in cases:
+                question = case["question"]
+                start = time.perf_counter()
+                embedding = service.embeddings.embed_query(question)
+                docs = service._retrieve_documents(question, embedding, extract_course_codes(question))
+                retrieval_latencies.append(time.perf_counter() - start)
+                if round_idx == 0:
+                    ranks = [i for i, doc in enumerate(docs, start=1) if is_relevant(doc, case)]
+                    per_question.append({
+                        "question": question,
+                        "retrieved": len(docs),
+                        "first_relevant_rank": ranks[0] if ranks else None,
+                    })
+        retrieval = latency_summary(retrieval_latencies)
+        for k in RECALL_KS:
+            hits = sum(1 for item in per_question if item["first_relevant_rank"] and item["first_relevant_rank"] <= k)
+            retrieval[f"recall@{k}"] = round(hits / len(per_question), 3)
+        retrieval["per_question"] = per_question
+        print(f"检索: { {key: value for key, value in retrieval.items() if key != 'per_question'} }")
+
+        # 3. 端到端回放（get_answer + LLM 替身）
+        questions = [case["question"] for _ in range(args.rounds) for case in cases]
+        latencies = []
+
+        def answer(question: str) -> None:
+            start = time.perf_counter()
+            service.get_answer(question)
+            latencies.append(time.perf_counter() - start)
+
+        prompt_tokens = LLM_TOKENS.value(kind="prompt")
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(answer, questions))
+        elapsed = time.perf_counter() - start
+        end_to_end = {
+            "requests": len(questions),
+            "qps": round(len(questions) / elapsed, 2),
+            **latency_summary(latencies),
+            "prompt_tokens_per_call": round((LLM_TOKENS.value(kind="prompt") - prompt_tokens) / max(llm.calls, 1)),
+            "cache": service.answer_cache.stats(),
+            "embedding_cache": service.embedding_cache.stats(),
+            "retrieval_cache": service.retrieval_cache.stats(),
+        }
+        print(f"端到端: {end_to_end}")
+
+    result = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "config": {
+            "embed_model": config.EMBED_MODEL,
+            "embed_backend": config.EMBED_BACKEND,
+            "chunk_size": CHUNK_SIZE,
+            "chunk_overlap": CHUNK_OVERLAP,
+            "extractor_version": EXTRACTOR_VERSION,
+            "retrieval_mode": config.RETRIEVAL_MODE,
+            "retrieval_k": config.RETRIEVAL_K,
+            "retrieval_k_per_course": config.RETRIEVAL_K_PER_COURSE,
+            "context_token_budget": config.CONTEXT_TOKEN_BUDGET,
+            "answer_cache": args.cache,
+            "synthetic": args.synthetic,
+            "rounds": args.rounds,
+            "concurrency": args.concurrency,
+            "llm_latency": args.llm_latency,
+            "questions": len(cases),
+        },
+        "ingest": ingest,
+        "retrieval": retrieval,
+        "end_to_end": end_to_end,
+    }
+
+    output = args.output or BENCH_DIR / "results" / f"suite-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"结果已写入 {output}")
+
+    if args.baseline:
+        compare(result, json.loads(args.baseline.read_text(encoding="utf-8")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+向量检索后端基准
+
+在不同规模的合成语料上对比 Chroma（HNSW + SQLite 元数据过滤）与 NumPy 精确搜索
+（内存映射快照，float32 / float16 / int8）的检索延迟和 recall@k：
+- 合成嵌入模拟句向量的分布：所有向量共享一个公共分量，同一课程的片段围绕课程中心聚集
+- 查询为随机片段加噪声，一半带课程过滤（与 RAGService._course_filter 相同的条件）
+- 以 float32 暴力搜索结果为准计算 recall@k；batch 列为一次检索 32 个问题时每个问题的平均耗时
+
+用法（在项目根目录执行）:
+    python -m benchmarks.vector_backend_bench
+    python -m benchmarks.vector_backend_bench --sizes 2000 20000 --queries 100
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import chromadb
+import numpy as np
+
+from app.snapshot import VECTOR_DTYPES, IndexSnapshot, export_snapshot
+
+DIM = 384
+CHUNKS_PER_COURSE = 50
+BATCH = 32
+
+
+def synthetic_corpus(size: int, rng: np.random.Generator) -> tuple:
+    """生成归一化的合成嵌入和每个片段的课程名"""
+    courses = max(1, size // CHUNKS_PER_COURSE)
+    common = rng.normal(size=DIM)
+    centers = rng.normal(size=(courses, DIM))
+    course_of = rng.integers(0, courses, size=size)
+    vectors = (
+        0.6 * common / np.linalg.norm(common)
+        + 0.5 * centers[course_of] / np.sqrt(DIM)
+        + 0.6 * rng.normal(size=(size, DIM)) / np.sqrt(DIM)
+    ).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors, [f"SYN{c:05d}" for c in course_of]
+
+
+def build_chroma(path: Path, vectors: np.ndarray, courses: List[str]):
+    client = chromadb.PersistentClient(path=str(path))
+    collection = client.create_collection("bench")
+    ids = [f"chunk-{i}" for i in range(len(vectors))]
+    for start in range(0, len(vectors), 5000):
+        end = start + 5000
+        collection.add(
+            ids=ids[start:end],
+            embeddings=vectors[start:end].tolist(),
+            metadatas=[{"course": course} for course in courses[start:end]],
+            documents=[f"chunk {i}" for i in range(start, min(end, len(vectors)))]
+        )
+    return collection
+
+
+def exact_top_k(vectors: np.ndarray, courses: np.ndarray, query: np.ndarray, k: int, course: Optional[str]) -> List[str]:
+    scores = vectors @ query
+    if course is not None:
+        scores = np.where(courses == course, scores, -np.inf)
+    top = np.argsort(-scores)[:k]
+    return [f"chunk-{i}" for i in top if np.isfinite(scores[i])]
+
+
+def measure(
+    search: Callable[[List[np.ndarray], Optional[Dict]], List[List[str]]],
+    queries: np.ndarray, filters: List[Optional[Dict]], truth: List[List[str]]
+) -> Dict[str, float]:
+    """逐个检索测延迟和召回率，再按 BATCH 个一批（同一过滤条件）测批量检索的平均耗时"""
+    single = {"all": [], "course": []}
+    recalls = []
+    for query, course_filter, expected in zip(queries, filters, truth):
+        start = time.perf_counter()
+        found = search([query], course_filter)[0]
+        single["course" if course_filter else "all"].append(time.perf_counter() - start)
+        recalls.append(len(set(found) & set(expected)) / max(1, len(expected)))
+
+    unfiltered = queries[[i for i, f in enumerate(filters) if f is None]]
+    batches = [unfiltered[i:i + BATCH] for i in range(0, len(unfiltered), BATCH)]
+    start = time.perf_counter()
+    for batch in batches:
+        search(list(batch), None)
+    batch_ms = (time.perf_counter() - start) / max(1, len(unfiltered)) * 1000
+    return {
+        "all_ms": statistics.median(single["all"]) * 1000,
+        "course_ms": statistics.median(single["course"]) * 1000,
+        "batch_ms": batch_ms,
+        "recall": statistics.mean(recalls),
+    }
+
+
+def run_size(size: int, num_queries: int, k: int, rng: np.random.Generator) -> None:
+    vectors, courses = synthetic_corpus(size, rng)
+    course_array = np.asarray(courses)
+    picks = rng.integers(0, size, size=num_queries)
+    queries = vectors[picks] + 0.5 * rng.normal(size=(num_queries, DIM)).astype(np.float32) / np.sqrt(DIM)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    filters = [{"course": courses[p]} if i % 2 else None for i, p in enumerate(picks)]
+    truth = [
+        exact_top_k(vectors, course_array, q, k, f["course"] if f else None)
+        for q, f in zip(queries, filters)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        collection = build_chroma(Path(tmp) / "chroma", vectors, courses)
+        build_s = time.perf_counter() - start
+        backends = {
+            "chroma": lambda qs, f: collection.query(
+                query_embeddings=[q.tolist() for q in qs], n_results=k, where=f, include=["distances"]
+            )["ids"],
+        }
+        snapshots = {}
+        for dtype in VECTOR_DTYPES:
+            export_snapshot(collection, 1, str(Path(tmp) / dtype), dtype=dtype)
+            snapshots[dtype] = IndexSnapshot.load(str(Path(tmp) / dtype))
+            backends[f"numpy-{dtype}"] = (
+                lambda qs, f, snap=snapshots[dtype]: [[chunk_id for chunk_id, _ in hits] for hits in snap.query(qs, k, f)]
+            )
+
+        print(f"\n{size} 个片段，{size // CHUNKS_PER_COURSE} 个课程（Chroma 构建 {build_s:.1f}s）")
+        print(f"{'backend':>14} {'MB':>6} {'all ms':>8} {'course ms':>10} {'batch ms/q':>11} {f'recall@{k}':>10}")
+        for name, search in backends.items():
+            r = measure(search, queries, filters, truth)
+            snapshot = snapshots.get(name.removeprefix("numpy-"))
+            size_mb = snapshot.vectors.nbytes / 1024 / 1024 if snapshot else float("nan")
+            print(
+                f"{name:>14} {size_mb:>6.1f} {r['all_ms']:>8.3f} {r['course_ms']:>10.3f} "
+                f"{r['batch_ms']:>11.3f} {r['recall']:>10.3f}"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="向量检索后端基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000, 50000], help="语料片段数")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for size in args.sizes:
+        run_size(size, args.queries, args.k, rng)
+
+
+if __name__ == "__main__":
+    main()
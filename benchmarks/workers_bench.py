@@ -0,0 +1,109 @@
+"""
+多 worker 内存基准
+
+分别以 uvicorn --workers N（每个 worker 独立加载模型、打开 Chroma）和
+gunicorn 共享模式（主进程预加载模型、各 worker 内存映射同一索引快照）启动 API，
+就绪后发送若干 /chat 请求让每个 worker 都完成一次嵌入和检索，
+然后统计整个进程树的 PSS（按共享进程数分摊后的实际内存）和 RSS。
+
+只统计内存，LLM 调用失败（例如未配置 GROQ_API_KEY）不影响结果。Linux 专用（读取 /proc）。
+
+用法（在项目根目录执行，需先运行 python -m app.ingest）:
+    python -m benchmarks.workers_bench --workers 4
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+MODES = {
+    "uvicorn": lambda port, workers: [
+        sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--workers", str(workers)
+    ],
+    "gunicorn-shared": lambda port, workers: [
+        sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app.main:app"
+    ],
+}
+
+
+def smaps_kb(pid: int) -> Dict[str, int]:
+    """读取进程的 Pss / Rss（KB）"""
+    values = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+        key, _, rest = line.partition(":")
+        if key in ("Pss", "Rss"):
+            values[key] = int(rest.split()[0])
+    return values
+
+
+def process_tree(pid: int) -> List[int]:
+    """pid 及其全部子进程"""
+    children = Path(f"/proc/{pid}/task/{pid}/children").read_text().split()
+    return [pid] + [p for child in children for p in process_tree(int(child))]
+
+
+def measure(mode: str, port: int, workers: int, requests: int) -> Dict[str, float]:
+    env = dict(
+        os.environ, API_PORT=str(port), WEB_WORKERS=str(workers), RATE_LIMIT_PER_MINUTE="1000000", FACT_ANSWERS="false"
+    )
+    env["SHARED_INDEX"] = "true" if mode == "gunicorn-shared" else "false"
+    proc = subprocess.Popen(MODES[mode](port, workers), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        start = time.perf_counter()
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f"{mode} 启动失败（返回码 {proc.returncode}）")
+            try:
+                if httpx.get(f"{base_url}/ready", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.5)
+        ready_seconds = time.perf_counter() - start
+
+        headers = {"Authorization": f"Bearer {os.getenv('API_KEY', 'dev-secret-key-change-in-production')}"}
+        for i in range(requests):
+            try:
+                httpx.post(
+                    f"{base_url}/chat", json={"question": f"What is the grading scheme for MAT235? ({i})"},
+                    headers=headers, timeout=30
+                )
+            except httpx.HTTPError:
+                pass
+
+        pids = process_tree(proc.pid)
+        usage = [smaps_kb(pid) for pid in pids]
+        return {
+            "processes": len(pids),
+            "ready_s": ready_seconds,
+            "pss_mb": sum(u["Pss"] for u in usage) / 1024,
+            "rss_mb": sum(u["Rss"] for u in usage) / 1024,
+        }
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="多 worker 内存基准")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=40, help="就绪后发送的 /chat 请求数")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    args = parser.parse_args()
+
+    print(f"{args.workers} 个 worker，{args.requests} 个请求")
+    print(f"{'mode':>16} {'procs':>6} {'ready s':>8} {'PSS MB':>8} {'RSS MB':>8}")
+    for mode in args.modes:
+        r = measure(mode, args.port, args.workers, args.requests)
+        print(f"{mode:>16} {r['processes']:>6} {r['ready_s']:>8.1f} {r['pss_mb']:>8.0f} {r['rss_mb']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
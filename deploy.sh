@@ -23,14 +23,19 @@ source venv/bin/activate
 echo "步骤 3: 更新 Python 依赖..."
 pip install -r requirements.txt --upgrade
 
-# 4. 重启服务
-echo "步骤 4: 重启服务..."
+# 4. 增量更新向量库（服务启动时只读加载，不再摄取 PDF）
+echo "步骤 4: 更新向量库..."
+python -m app.ingest
+
+# 5. 重启服务
+echo "步骤 5: 重启服务..."
 sudo systemctl restart uoft-assistant
 
-# 5. 检查服务状态
-echo "步骤 5: 检查服务状态..."
+# 6. 检查服务状态
+echo "步骤 6: 检查服务状态..."
 sleep 3
 sudo systemctl status uoft-assistant --no-pager
+curl -sf http://localhost:8000/ready || echo "服务尚未就绪，请查看日志"
 
 echo "================================"
 echo "部署完成！"
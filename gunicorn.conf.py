@@ -0,0 +1,38 @@
+"""
+gunicorn 配置：多 worker 共享模式
+
+主进程预先导入应用（preload_app），在导入时加载嵌入模型并内存映射只读索引快照，
+然后 fork 出 WEB_WORKERS 个 uvicorn worker：模型权重以写时复制方式共享，
+索引快照通过页缓存共享，增加 worker 几乎不增加内存。
+
+用法（在项目根目录执行，需先运行 python -m app.ingest 导出快照）:
+    gunicorn -c gunicorn.conf.py app.main:app
+"""
+import gc
+import os
+
+# 共享模式依赖导入时初始化，这里默认开启（app.config 在导入时读取，必须先设置）
+os.environ.setdefault("SHARED_INDEX", "true")
+
+from app.config import API_HOST, API_PORT, WEB_WORKERS  # noqa: E402
+
+bind = f"{API_HOST}:{API_PORT}"
+workers = WEB_WORKERS
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# LLM 调用可能较慢，超时需大于 LLM_REQUEST_TIMEOUT
+timeout = 120
+graceful_timeout = 30
+
+
+def pre_fork(server, worker):
+    """fork 前冻结主进程中已有的对象：worker 中的垃圾回收不再遍历它们，
+    不会因为写入 GC 头而复制这些对象所在的内存页"""
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """在 worker 中重建不能跨 fork 使用的资源"""
+    from app.main import rag_service
+    rag_service.after_fork()
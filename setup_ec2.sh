@@ -134,8 +134,9 @@ echo ""
 echo "下一步操作:"
 echo "1. 编辑 .env 文件: nano /home/ubuntu/uoft-assistant/.env"
 echo "2. 填入 GROQ_API_KEY 和其他配置"
-echo "3. 启动服务: sudo systemctl start uoft-assistant"
-echo "4. 查看状态: sudo systemctl status uoft-assistant"
-echo "5. 查看日志: sudo journalctl -u uoft-assistant -f"
+echo "3. 构建向量库: cd /home/ubuntu/uoft-assistant && venv/bin/python -m app.ingest"
+echo "4. 启动服务: sudo systemctl start uoft-assistant"
+echo "5. 查看状态: sudo systemctl status uoft-assistant"
+echo "6. 查看日志: sudo journalctl -u uoft-assistant -f"
 echo ""
 echo "你的应用将运行在: http://YOUR_EC2_PUBLIC_IP"
@@ -75,7 +75,35 @@ function addMessage(text, sender, save = true) {
     chatBox.scrollTop = chatBox.scrollHeight;
 }
 
-// 发送消息的主逻辑
+// 解析一条 SSE 报文，返回 { event, data }
+function parseSseEvent(raw) {
+    let event = 'message';
+    const dataLines = [];
+    raw.split('\n').forEach(line => {
+        if (line.startsWith('event:')) {
+            event = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+            dataLines.push(line.slice(5).trim());
+        }
+    });
+    if (dataLines.length === 0) return null;
+    return { event: event, data: JSON.parse(dataLines.join('\n')) };
+}
+
+// 在 AI 消息下方显示来源标签
+function renderSources(messageDiv, sources) {
+    if (!sources || sources.length === 0) return;
+    const labels = sources.map(src => {
+        const page = (src.page !== null && src.page !== undefined) ? ` p.${src.page + 1}` : '';
+        return `${src.course}${page}`;
+    });
+    const sourcesDiv = document.createElement('div');
+    sourcesDiv.className = 'sources';
+    sourcesDiv.innerText = `Sources: ${[...new Set(labels)].join(', ')}`;
+    messageDiv.appendChild(sourcesDiv);
+}
+
+// 发送消息的主逻辑（流式接收答案）
 async function sendMessage() {
     const question = userInput.value.trim();
     if (!question) return;
@@ -91,10 +119,22 @@ async function sendMessage() {
     loadingDiv.innerText = 'AI is thinking...';
     chatBox.appendChild(loadingDiv);
 
+    // AI 消息容器：收到第一个 token 时创建，之后增量追加
+    let answerDiv = null;
+    let answerText = null;
+    let answer = '';
+    let sources = [];
+
+    const removeLoading = () => {
+        if (loadingDiv.parentNode) {
+            chatBox.removeChild(loadingDiv);
+        }
+    };
+
     try {
-        // 3. 调用后端 FastAPI 接口
+        // 3. 调用后端流式接口
         console.log('Sending question:', question);
-        const response = await fetch(`${API_BASE_URL}/chat`, {
+        const response = await fetch(`${API_BASE_URL}/chat/stream`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -104,7 +144,6 @@ async function sendMessage() {
         });
 
         console.log('Response status:', response.status);
-        console.log('Response headers:', response.headers);
 
         if (!response.ok) {
             const errorData = await response.json().catch(() => ({ detail: 'Unknown error' }));
@@ -121,28 +160,55 @@ async function sendMessage() {
             }
         }
 
-        const data = await response.json();
-        console.log('Received data:', data);
-        console.log('Answer field:', data.answer);
-
-        // 4. 移除加载文字，显示 AI 回答
-        if (loadingDiv.parentNode) {
-            chatBox.removeChild(loadingDiv);
+        // 4. 逐块读取 SSE 流并增量渲染
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const message = parseSseEvent(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+                if (!message) continue;
+
+                if (message.event === 'sources') {
+                    sources = message.data.sources;
+                } else if (message.event === 'token') {
+                    if (!answerDiv) {
+                        removeLoading();
+                        answerDiv = document.createElement('div');
+                        answerDiv.classList.add('message', 'ai');
+                        answerText = document.createElement('span');
+                        answerDiv.appendChild(answerText);
+                        chatBox.appendChild(answerDiv);
+                    }
+                    answer += message.data.text;
+                    answerText.innerText = answer;
+                    chatBox.scrollTop = chatBox.scrollHeight;
+                } else if (message.event === 'error') {
+                    throw new Error(message.data.detail);
+                }
+            }
         }
 
-        if (data && data.answer) {
-            addMessage(data.answer, 'ai');
-            // 保存对话到历史记录
-            saveChatHistory(question, data.answer);
+        // 5. 完成：显示来源并保存历史
+        removeLoading();
+        if (answer) {
+            renderSources(answerDiv, sources);
+            chatBox.scrollTop = chatBox.scrollHeight;
+            saveChatHistory(question, answer);
         } else {
             addMessage('Error: No answer received from server', 'ai');
         }
 
     } catch (error) {
         console.error('Error details:', error);
-        if (loadingDiv.parentNode) {
-            chatBox.removeChild(loadingDiv);
-        }
+        removeLoading();
         addMessage(`Error: ${error.message}. Check console for details.`, 'ai');
     } finally {
         sendBtn.disabled = false;
@@ -0,0 +1,6 @@
+"""测试配置：app.config 在导入时读取环境变量，需在导入 app 模块之前设置"""
+import os
+import tempfile
+
+# 测试日志写入临时目录
+os.environ.setdefault("LOG_FILE", os.path.join(tempfile.mkdtemp(prefix="uoft-assistant-tests-"), "app.log"))
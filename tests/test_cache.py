@@ -0,0 +1,125 @@
+"""答案缓存（精确匹配 + 语义近邻）与按索引版本失效的 LRU 缓存测试"""
+import time
+
+import pytest
+
+from app.cache import CachedAnswer, SemanticAnswerCache, VersionedLRUCache
+
+# 余弦相似度: (1, 0) 与 (0.99, 0.14) 约 0.990，与 (0.9, 0.44) 约 0.898
+QUERY = [1.0, 0.0]
+NEAR = [0.99, 0.14]
+FAR = [0.9, 0.44]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    fake = FakeClock()
+    monkeypatch.setattr(time, "monotonic", fake)
+    return fake
+
+
+def make_cache(**kwargs) -> SemanticAnswerCache:
+    options = {"max_size": 10, "ttl_seconds": 60, "similarity_threshold": 0.95}
+    options.update(kwargs)
+    return SemanticAnswerCache(**options)
+
+
+def test_exact_hit_uses_normalized_question(clock):
+    cache = make_cache()
+    cache.put("What is the MAT235 textbook?", ["MAT235"], QUERY, CachedAnswer("Stewart"))
+    assert cache.get_exact("  what is the mat235 textbook ").answer == "Stewart"
+    assert cache.get_exact("Who teaches MAT235?") is None
+    assert cache.stats()["exact_hits"] == 1
+
+
+def test_similar_hit_is_scoped_to_course_codes(clock):
+    cache = make_cache()
+    cache.put("MAT235 textbook?", ["MAT235"], NEAR, CachedAnswer("Stewart"))
+    assert cache.get_similar(QUERY, ["MAT235"]).answer == "Stewart"
+    # 同样的嵌入，不同的课程范围不命中
+    assert cache.get_similar(QUERY, ["STA237"]) is None
+    assert cache.get_similar(QUERY, []) is None
+    # 低于阈值不命中
+    cache.put("MAT235 tests?", ["MAT235"], FAR, CachedAnswer("two tests"))
+    assert cache.get_similar([0.0, 1.0], ["MAT235"]) is None
+    stats = cache.stats()
+    assert (stats["semantic_hits"], stats["misses"]) == (1, 3)
+
+
+def test_expired_entries_miss_and_are_evicted(clock):
+    cache = make_cache(ttl_seconds=60)
+    cache.put("MAT235 textbook?", ["MAT235"], NEAR, CachedAnswer("Stewart"))
+    clock.now += 61
+    assert cache.get_exact("MAT235 textbook?") is None
+    cache.put("MAT235 syllabus?", ["MAT235"], NEAR, CachedAnswer("old"))
+    clock.now += 61
+    assert cache.get_similar(QUERY, ["MAT235"]) is None
+    assert len(cache) == 0
+
+
+def test_expired_nearest_neighbour_does_not_hide_fresh_match(clock):
+    cache = make_cache(ttl_seconds=60, similarity_threshold=0.95)
+    cache.put("MAT235 textbook?", ["MAT235"], QUERY, CachedAnswer("stale"))
+    clock.now += 30
+    cache.put("MAT235 textbook please", ["MAT235"], NEAR, CachedAnswer("fresh"))
+    clock.now += 31
+    # 最相似的条目已过期：跳过它并淘汰，返回仍有效的次近邻
+    assert cache.get_similar(QUERY, ["MAT235"]).answer == "fresh"
+    assert len(cache) == 1
+    assert cache.get_exact("MAT235 textbook?") is None
+
+
+def test_version_change_invalidates_entries(clock):
+    cache = make_cache()
+    cache.set_version(1)
+    cache.put("MAT235 textbook?", ["MAT235"], NEAR, CachedAnswer("Stewart"))
+    cache.set_version(1)
+    assert cache.get_exact("MAT235 textbook?") is not None
+    cache.set_version(2)
+    assert len(cache) == 0
+    assert cache.get_exact("MAT235 textbook?") is None
+    assert cache.get_similar(QUERY, ["MAT235"]) is None
+
+
+def test_lru_eviction_keeps_recently_used(clock):
+    cache = make_cache(max_size=2)
+    cache.put("a", [], None, CachedAnswer("a"))
+    cache.put("b", [], None, CachedAnswer("b"))
+    cache.get_exact("a")
+    cache.put("c", [], None, CachedAnswer("c"))
+    assert cache.get_exact("b") is None
+    assert cache.get_exact("a").answer == "a"
+    assert cache.get_exact("c").answer == "c"
+
+
+def test_versioned_lru_cache_evicts_and_invalidates_by_version():
+    cache = VersionedLRUCache("test", max_size=2)
+    cache.set_version(1)
+    cache.put(("q1", ()), [1])
+    cache.put(("q2", ()), [2])
+    assert cache.get(("q1", ())) == [1]
+    cache.put(("q3", ()), [3])
+    # q2 最久未使用，被淘汰
+    assert cache.get(("q2", ())) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    cache.set_version(1)
+    assert len(cache) == 2
+    cache.set_version(2)
+    assert len(cache) == 0
+    assert cache.get(("q1", ())) is None
+
+
+def test_versioned_lru_cache_disabled_with_zero_size():
+    cache = VersionedLRUCache("test", max_size=0)
+    cache.put("q", [1])
+    assert cache.get("q") is None
+    assert len(cache) == 0
@@ -0,0 +1,63 @@
+"""上下文组装（合并重叠、去重、token 预算）测试"""
+from langchain_core.documents import Document
+
+from app.context import assemble_context, estimate_tokens, source_tag
+
+
+def doc(text: str, page: int = 0, course: str = "MAT235Y1", content_type: str = "text") -> Document:
+    return Document(page_content=text, metadata={
+        "course": course, "source_file": f"{course}.pdf", "page": page, "content_type": content_type,
+    })
+
+
+def paragraph(topic: str, words: int) -> str:
+    return " ".join(f"{topic}{i}" for i in range(words))
+
+
+def test_context_stays_within_budget_and_skips_whole_chunks():
+    docs = [
+        doc(paragraph("grading", 40), page=0),
+        doc(paragraph("textbook", 200), page=1),  # 放不下，整段跳过
+        doc(paragraph("office", 30), page=2),
+        doc(paragraph("tests", 30), page=3),
+    ]
+    budget = 240  # 放下第 1、3、4 段（含分隔）共 239 token
+    context, used = assemble_context(docs, budget_tokens=budget)
+
+    assert estimate_tokens(context) <= budget
+    assert [d.metadata["page"] for d in used] == [0, 2, 3]
+    # 进入上下文的片段完整保留，放不下的片段一个词都不出现
+    for d in used:
+        assert f"{source_tag(d.metadata)}\n{d.page_content}" in context
+    assert "textbook0" not in context
+
+
+def test_budget_counts_separators_between_blocks():
+    docs = [doc("x" * 60, page=page) for page in range(5)]
+    for budget in range(20, 120):
+        context, _ = assemble_context(docs, budget_tokens=budget, dedup_threshold=1.1)
+        assert estimate_tokens(context) <= budget
+
+
+def test_oversized_top_chunk_is_truncated_to_budget():
+    context, used = assemble_context([doc(paragraph("grading", 500))], budget_tokens=50)
+    assert len(used) == 1
+    assert estimate_tokens(context) <= 50
+    assert context.startswith("[Source: MAT235Y1 p.1]\ngrading0 grading1")
+
+
+def test_overlapping_chunks_are_merged_and_duplicates_dropped():
+    text = paragraph("word", 120)
+    first, second = text[:500], text[400:]
+    docs = [
+        doc(second, page=4),
+        doc(first, page=4),
+        doc(first, page=4, course="MAT235Y1", content_type="table"),  # 不同内容块，不合并，但与合并结果近似重复
+        doc(paragraph("other", 20), page=5),
+    ]
+    context, used = assemble_context(docs, budget_tokens=10_000)
+
+    assert context.count(text) == 1
+    assert context.count("[Source:") == 2
+    assert len(used) == 3
+    assert context.index(text) < context.index("other0")
@@ -0,0 +1,194 @@
+"""结构化事实抽取与 FactIndex 问答测试（小型大纲表格和文本）"""
+import pytest
+
+from app.facts import ASSESSMENT, INSTRUCTOR, FactIndex, extract_table_facts, extract_text_facts
+
+# 没有表头的评分表，期中考试的第二个考试时间在续行中
+STA237_GRADING = [
+    ["Syllabus Quiz", "0.5%", "Available from Sept. 8 to 21"],
+    ["LearnR Modules", "10%", "Due weekly on Fridays"],
+    ["Midterm (*See note below*)", "25%", "Tues/Thurs LEC: Oct. 24, 5:10 - 6:40 PM*"],
+    [None, None, "Mon/Wed LEC: Nov. 7, 5:10 - 6:40 PM*"],
+    ["Final Exam", "40%", "Scheduled by FAS"],
+]
+# 教师表：空的教师单元格继承上一行
+STA237_INSTRUCTORS = [
+    ["Instructor", "Section", "Lecture Time & Location", "Office Hours"],
+    ["Course Coordinator: Jane Doe", "LEC0101", "Tue 10-12 SS2117", "Mon 2-3 PM"],
+    [None, "LEC0201", "Thu 1-3 MS2158", "Mon 2-3 PM"],
+    ["John Roe", "LEC0301", "Wed 6-9 BA1130", "Wed 5-6 PM"],
+]
+# 考试日期表（只有日期，没有权重）
+MAT224_TESTS = [
+    ["Test", "date", "Tentative time"],
+    ["Test 1", "Oct 15\nWednesday", "Regular Sitting 6-8 PM"],
+    ["Test 2", "Nov 19\nWednesday", "Regular Sitting 6-8 PM"],
+]
+MAT235_TEXTBOOK = [["Textbook", "Author"], ["Calculus: Early Transcendentals", "Stewart"]]
+MAT235_TEXT = (
+    "Marking scheme\n"
+    "• Final Exam (cumulative) (40%)\n"
+    "• 2 tests (cumulative) (40%): drop the lowest score\n"
+    "6% Pre-class 14% Tutorials\n"
+)
+
+
+def metadata(course: str, page: int, content_type: str = "table"):
+    return {
+        "course": course, "course_base": course[:6], "source_file": f"{course}.pdf",
+        "page": page, "content_type": content_type,
+    }
+
+
+@pytest.fixture(scope="module")
+def index() -> FactIndex:
+    facts = (
+        extract_table_facts(STA237_GRADING, metadata("STA237H1", 2))
+        + extract_table_facts(STA237_INSTRUCTORS, metadata("STA237H1", 0))
+        + extract_table_facts(MAT224_TESTS, metadata("MAT224H1", 1))
+        + extract_table_facts(MAT235_TEXTBOOK, metadata("MAT235Y1", 0))
+        + extract_text_facts(MAT235_TEXT, metadata("MAT235Y1", 1, "text"))
+    )
+    return FactIndex(facts)
+
+
+def test_headless_grading_table_merges_continuation_rows():
+    facts = extract_table_facts(STA237_GRADING, metadata("STA237H1", 2))
+    assert [fact["kind"] for fact in facts] == [ASSESSMENT] * 4
+    midterm = facts[2]
+    assert midterm["course"] == "STA237"
+    assert midterm["attrs"] == {
+        "weight": "25%",
+        "date": "Tues/Thurs LEC: Oct. 24, 5:10 - 6:40 PM*; Mon/Wed LEC: Nov. 7, 5:10 - 6:40 PM*",
+    }
+
+
+def test_instructor_rows_inherit_previous_name():
+    facts = extract_table_facts(STA237_INSTRUCTORS, metadata("STA237H1", 0))
+    assert [fact["kind"] for fact in facts] == [INSTRUCTOR] * 3
+    assert [fact["name"] for fact in facts] == ["Course Coordinator: Jane Doe"] * 2 + ["John Roe"]
+    assert facts[1]["attrs"]["Section"] == "LEC0201"
+
+
+def test_text_bullets_and_grid_lines():
+    facts = extract_text_facts(MAT235_TEXT, metadata("MAT235Y1", 1, "text"))
+    assert [(fact["name"], fact["attrs"]["weight"]) for fact in facts] == [
+        ("Final Exam (cumulative)", "40%"),
+        ("2 tests (cumulative)", "40%"),
+        ("Pre-class", "6%"),
+        ("Tutorials", "14%"),
+    ]
+    assert facts[1]["attrs"]["notes"] == "drop the lowest score"
+
+
+def test_unrelated_tables_yield_no_facts():
+    calendar = [["Week", "Topic"], ["1", "Vector spaces"], ["2", "Linear maps"]]
+    assert extract_table_facts(calendar, metadata("MAT224H1", 4)) == []
+    assert extract_table_facts([["Only one row", "10%"]], metadata("MAT224H1", 4)) == []
+
+
+def test_grading_intent(index):
+    answer = index.answer("What is the grading scheme for STA237?", ["STA237"])
+    assert answer.intent == "grading"
+    assert answer.answer == (
+        "Grading scheme for STA237H1:\n"
+        "- Syllabus Quiz: 0.5%\n"
+        "- LearnR Modules: 10%\n"
+        "- Midterm: 25%\n"
+        "- Final Exam: 40%\n"
+        "\n"
+        "Source: STA237H1 (page 3)"
+    )
+    assert answer.sources == [
+        {"course": "STA237H1", "source_file": "STA237H1.pdf", "page": 2, "content_type": "table"}
+    ]
+
+
+def test_weight_intent(index):
+    answer = index.answer("How much is the midterm worth in STA237?", ["STA237"])
+    assert answer.intent == "weight"
+    assert answer.answer.startswith("Assessment weight in STA237H1:\n- Midterm: 25%\n\nSource: STA237H1 (page 3)")
+
+    # 文本中的评分列表
+    answer = index.answer("How much is the final exam worth in MAT235?", ["MAT235"])
+    assert "- Final Exam (cumulative): 40%" in answer.answer
+    assert answer.sources[0]["content_type"] == "text"
+
+
+def test_date_intent(index):
+    answer = index.answer("When is Test 2 in MAT224?", ["MAT224"])
+    assert answer.intent == "date"
+    assert "- Test 2: Nov 19 Wednesday (Tentative time: Regular Sitting 6-8 PM)" in answer.answer
+    assert "Test 1" not in answer.answer
+
+
+def test_instructor_intent(index):
+    answer = index.answer("Who teaches STA237 LEC0301?", ["STA237"])
+    assert answer.intent == "instructor"
+    assert "- John Roe: Section: LEC0301" in answer.answer
+    assert "Jane Doe" not in answer.answer
+
+    answer = index.answer("Who is the STA237 course coordinator?", ["STA237"])
+    assert "John Roe" not in answer.answer
+    assert "Jane Doe" in answer.answer
+
+
+def test_office_hours_intent(index):
+    answer = index.answer("What are the office hours for STA237?", ["STA237"])
+    assert answer.intent == "office_hours"
+    assert "- John Roe: Wed 5-6 PM" in answer.answer
+    assert "- Course Coordinator: Jane Doe: Mon 2-3 PM" in answer.answer
+
+
+def test_textbook_intent(index):
+    answer = index.answer("What is the textbook for MAT235?", ["MAT235"])
+    assert answer.intent == "textbook"
+    assert "- Calculus: Early Transcendentals: Author: Stewart" in answer.answer
+
+
+@pytest.mark.parametrize("question, course_codes", [
+    # 没有或有多门课程
+    ("What is the grading scheme?", []),
+    ("Compare the grading schemes of STA237 and MAT235", ["STA237", "MAT235"]),
+    # 索引中没有的课程
+    ("What is the grading scheme for CSC108?", ["CSC108"]),
+])
+def test_requires_exactly_one_indexed_course(index, question, course_codes):
+    assert index.answer(question, course_codes) is None
+
+
+@pytest.mark.parametrize("question", [
+    "What happens if I miss the STA237 midterm?",
+    "Is there a late policy for STA237 LearnR modules?",
+    "How long is the STA237 final exam?",
+    "Who do I contact about the STA237 midterm?",
+    "Why is the STA237 final exam worth 40%?",
+])
+def test_excluded_phrasing_falls_back(index, question):
+    assert index.answer(question, ["STA237"]) is None
+
+
+@pytest.mark.parametrize("question, course", [
+    # 没有评分事实
+    ("What is the grading scheme for MAT224?", "MAT224"),
+    # 没有教材表
+    ("What is the textbook for STA237?", "STA237"),
+    # 没有教师表
+    ("Who teaches MAT224?", "MAT224"),
+    # 考核名称对不上
+    ("How much is the project worth in STA237?", "STA237"),
+    # 只重合数字不算匹配
+    ("When is assignment 1 due in MAT224?", "MAT224"),
+    # 没有对应的讲课班级
+    ("Who teaches STA237 LEC9999?", "STA237"),
+    # 无法识别的意图
+    ("What topics does STA237 cover?", "STA237"),
+])
+def test_missing_facts_fall_back(index, question, course):
+    assert index.answer(question, [course]) is None
+
+
+def test_counts(index):
+    assert index.counts() == {"STA237": 7, "MAT224": 2, "MAT235": 5}
+    assert len(index) == 14
+    assert len(FactIndex.from_manifest({"files": {"a.pdf": {}, "b.pdf": {"facts": []}}})) == 0
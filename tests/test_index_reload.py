@@ -0,0 +1,87 @@
+"""运行中的 RAGService 在摄取更新索引后重新加载索引、按版本清空缓存的测试"""
+import shutil
+from pathlib import Path
+
+import pytest
+from langchain_chroma import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import FakeListChatModel
+
+from app import rag_service as rag_service_module
+from app.cache import CachedAnswer
+from app.ingest import ingest_lock, sync_vector_store
+from app.rag_service import RAGService
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+PDF_FILES = ["MAT224H1.pdf", "STA237H1.pdf"]
+QUESTION = "How does STA237 handle missed work?"
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    for pdf_file in PDF_FILES:
+        shutil.copy(DATA_DIR / pdf_file, pdf_dir / pdf_file)
+    db_path = str(tmp_path / "chroma_db")
+    embeddings = DeterministicFakeEmbedding(size=16)
+    monkeypatch.setattr(rag_service_module, "create_embeddings", lambda: embeddings)
+    vector_store = Chroma(persist_directory=db_path, embedding_function=embeddings)
+    return pdf_dir, db_path, vector_store
+
+
+@pytest.fixture
+def service(workspace):
+    pdf_dir, db_path, vector_store = workspace
+    sync_vector_store(vector_store, pdf_files=PDF_FILES, pdf_dir=pdf_dir, db_path=db_path, workers=1)
+    service = RAGService(llm=FakeListChatModel(responses=["old answer", "new answer"]), initialize=False)
+    service.db_path = db_path
+    service.initialize_rag()
+    yield service
+    service.close()
+
+
+def test_reload_after_ingest_clears_populated_caches(workspace, service):
+    pdf_dir, db_path, vector_store = workspace
+    assert service.index_version == 1
+    assert service.get_answer(QUESTION) == "old answer"
+    assert len(service.answer_cache) == len(service.embedding_cache) == len(service.retrieval_cache) == 1
+    assert service.get_answer(QUESTION) == "old answer"
+
+    # 清单未变化：不重新加载，缓存保留
+    assert not service.reload_index()
+    assert len(service.answer_cache) == 1
+
+    # 摄取移除 MAT224H1.pdf，索引版本变为 2
+    sync_vector_store(vector_store, pdf_files=["STA237H1.pdf"], pdf_dir=pdf_dir, db_path=db_path, workers=1)
+    assert service.reload_index()
+    assert service.index_version == 2
+    assert sorted(service.course_index) == ["STA237"]
+    assert len(service.answer_cache) == len(service.embedding_cache) == len(service.retrieval_cache) == 0
+
+    # 重新检索并调用 LLM，而不是返回旧索引上的答案
+    assert service.get_answer(QUESTION) == "new answer"
+    assert not service.reload_index()
+
+
+def test_results_computed_before_reload_are_not_cached(workspace, service):
+    pdf_dir, db_path, vector_store = workspace
+    sync_vector_store(vector_store, pdf_files=["STA237H1.pdf"], pdf_dir=pdf_dir, db_path=db_path, workers=1)
+    assert service.reload_index()
+
+    # 重新加载前开始的请求在重新加载后才写入缓存：按旧版本写入的结果被丢弃
+    service.answer_cache.put(QUESTION, ["STA237"], None, CachedAnswer("stale"), version=1)
+    service.retrieval_cache.put(("key",), ["chunk"], version=1)
+    assert len(service.answer_cache) == len(service.retrieval_cache) == 0
+    service.answer_cache.put(QUESTION, ["STA237"], None, CachedAnswer("fresh"), version=2)
+    assert service.answer_cache.get_exact(QUESTION).answer == "fresh"
+
+
+def test_reload_waits_for_running_ingest(workspace, service):
+    pdf_dir, db_path, vector_store = workspace
+    with ingest_lock(db_path):
+        sync_vector_store(vector_store, pdf_files=["STA237H1.pdf"], pdf_dir=pdf_dir, db_path=db_path, workers=1)
+        assert not service.reload_index()
+        assert service.index_version == 1
+    assert service.reload_index()
+    assert service.index_version == 2
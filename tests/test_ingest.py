@@ -0,0 +1,129 @@
+"""基于内容哈希清单的增量摄取测试（使用 data/ 中的大纲 PDF 和确定性的假嵌入）"""
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+from langchain_chroma import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app import ingest
+from app.ingest import load_manifest, stale_files, sync_vector_store, verify_index
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+PDF_FILES = ["MAT224H1.pdf", "STA237H1.pdf"]
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    for pdf_file in PDF_FILES:
+        shutil.copy(DATA_DIR / pdf_file, pdf_dir / pdf_file)
+    db_path = str(tmp_path / "chroma_db")
+    vector_store = Chroma(persist_directory=db_path, embedding_function=DeterministicFakeEmbedding(size=16))
+    return pdf_dir, db_path, vector_store
+
+
+def sync(workspace, pdf_files=PDF_FILES) -> bool:
+    pdf_dir, db_path, vector_store = workspace
+    return sync_vector_store(vector_store, pdf_files=pdf_files, pdf_dir=pdf_dir, db_path=db_path, workers=1)
+
+
+def stored_ids(vector_store) -> set:
+    return set(vector_store.get(include=[])["ids"])
+
+
+def test_second_sync_reports_no_change(workspace):
+    pdf_dir, db_path, vector_store = workspace
+    assert sync(workspace)
+    manifest = load_manifest(db_path)
+    assert manifest["index_version"] == 1
+    assert set(manifest["files"]) == set(PDF_FILES)
+    assert stale_files(manifest, PDF_FILES, pdf_dir) == []
+
+    ids = stored_ids(vector_store)
+    assert not sync(workspace)
+    assert load_manifest(db_path)["index_version"] == 1
+    assert stored_ids(vector_store) == ids
+
+
+def test_changed_pdf_is_reingested(workspace):
+    pdf_dir, db_path, vector_store = workspace
+    sync(workspace)
+    before = load_manifest(db_path)["files"]
+
+    # 用另一份大纲覆盖 MAT224H1.pdf，模拟内容变化
+    shutil.copy(DATA_DIR / "MAT235Y1.pdf", pdf_dir / "MAT224H1.pdf")
+    assert stale_files(load_manifest(db_path), PDF_FILES, pdf_dir) == ["MAT224H1.pdf"]
+
+    assert sync(workspace)
+    manifest = load_manifest(db_path)
+    after = manifest["files"]
+    assert manifest["index_version"] == 2
+    assert after["MAT224H1.pdf"]["sha256"] != before["MAT224H1.pdf"]["sha256"]
+    assert after["STA237H1.pdf"] == before["STA237H1.pdf"]
+    # 旧片段被删除，未变化的文件的片段保留
+    ids = stored_ids(vector_store)
+    assert not ids & set(before["MAT224H1.pdf"]["chunk_ids"])
+    assert ids == set(after["MAT224H1.pdf"]["chunk_ids"]) | set(after["STA237H1.pdf"]["chunk_ids"])
+
+
+def test_removed_pdf_is_deleted(workspace):
+    pdf_dir, db_path, vector_store = workspace
+    sync(workspace)
+    removed_ids = set(load_manifest(db_path)["files"]["MAT224H1.pdf"]["chunk_ids"])
+    assert stale_files(load_manifest(db_path), ["STA237H1.pdf"], pdf_dir) == ["MAT224H1.pdf"]
+
+    assert sync(workspace, ["STA237H1.pdf"])
+    manifest = load_manifest(db_path)
+    assert set(manifest["files"]) == {"STA237H1.pdf"}
+    assert not stored_ids(vector_store) & removed_ids
+
+
+def test_verify_index_removes_orphans_and_detects_missing_chunks(workspace):
+    _, db_path, vector_store = workspace
+    sync(workspace)
+    manifest = load_manifest(db_path)
+
+    # 摄取中断时写入的孤立片段被清理
+    vector_store.add_texts(["orphan"], metadatas=[{"course": "X"}], ids=["orphan-0"])
+    assert verify_index(vector_store, manifest)
+    assert "orphan-0" not in stored_ids(vector_store)
+
+    # 清单中的片段缺失时需要全量重建
+    vector_store.delete(ids=manifest["files"]["STA237H1.pdf"]["chunk_ids"][:1])
+    assert not verify_index(vector_store, manifest)
+    assert sync(workspace)
+    assert verify_index(vector_store, load_manifest(db_path))
+
+
+def test_stale_check_hashes_only_files_whose_size_or_mtime_changed(workspace, monkeypatch):
+    pdf_dir, db_path, _ = workspace
+    sync(workspace)
+    hashed = []
+    real_sha256 = ingest.file_sha256
+
+    def counting_sha256(path):
+        hashed.append(path.name)
+        return real_sha256(path)
+
+    monkeypatch.setattr(ingest, "file_sha256", counting_sha256)
+
+    # 大小和修改时间都与清单一致：不读取文件
+    assert stale_files(load_manifest(db_path), PDF_FILES, pdf_dir) == []
+    assert hashed == []
+
+    # 只改修改时间（内容不变）：计算哈希后仍判定为最新
+    path = pdf_dir / "STA237H1.pdf"
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert stale_files(load_manifest(db_path), PDF_FILES, pdf_dir) == []
+    assert hashed == ["STA237H1.pdf"]
+
+    # 同步时记录新的修改时间，不重新摄取、不改变索引版本，之后的检查不再计算哈希
+    assert not sync(workspace)
+    assert load_manifest(db_path)["index_version"] == 1
+    hashed.clear()
+    assert stale_files(load_manifest(db_path), PDF_FILES, pdf_dir) == []
+    assert hashed == []
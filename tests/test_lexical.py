@@ -0,0 +1,91 @@
+"""BM25 词法索引与混合检索（RRF 融合）测试"""
+from langchain_core.documents import Document
+
+from app.lexical import BM25Index, reciprocal_rank_fusion, tokenize
+from app.rag_service import RAGService
+
+CHUNKS = {
+    "mat224-0": ("MAT224H1 textbook: Linear Algebra Done Right by Axler", "MAT224"),
+    "mat224-1": ("Tests are written in the evening, 6-8 PM", "MAT224"),
+    "sta237-0": ("STA237H1 final exam is worth 40% of the grade", "STA237"),
+    "sta237-1": ("LearnR modules are due weekly; the textbook is optional", "STA237"),
+}
+
+
+def build_index() -> BM25Index:
+    ids = list(CHUNKS)
+    return BM25Index.build(
+        ids,
+        [text for text, _ in CHUNKS.values()],
+        [{"course_base": course} for _, course in CHUNKS.values()],
+        index_version=3,
+    )
+
+
+def test_tokenize_adds_base_course_code_and_drops_stopwords():
+    assert tokenize("What is the MAT224H1 textbook?") == ["mat224h1", "mat224", "textbook"]
+
+
+def test_search_ranks_exact_terms_and_respects_course_filter():
+    index = build_index()
+    assert index.search("MAT224 textbook", 2)[0][0] == "mat224-0"
+    assert [chunk_id for chunk_id, _ in index.search("textbook", 10, ["STA237"])] == ["sta237-1"]
+    assert index.search("textbook", 10, ["CSC108"]) == []
+    assert index.search("unrelated words", 10) == []
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = build_index()
+    index.save(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path))
+    assert loaded is not None and loaded.index_version == 3
+    assert loaded.search("final exam", 4) == index.search("final exam", 4)
+    assert BM25Index.load(str(tmp_path / "missing")) is None
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b"], ["b", "c"]], k=60)
+    assert fused == ["b", "a", "c"]
+    # 同分时保持先出现的顺序
+    assert reciprocal_rank_fusion([["x"], ["y"]]) == ["x", "y"]
+
+
+def test_search_fuses_vector_and_lexical_hits(monkeypatch):
+    service = RAGService(initialize=False)
+    try:
+        service.lexical_index = build_index()
+        service.course_index = {"MAT224": ["mat224-0", "mat224-1"], "STA237": ["sta237-0", "sta237-1"]}
+        docs = {chunk_id: Document(id=chunk_id, page_content=text) for chunk_id, (text, _) in CHUNKS.items()}
+        requested = {}
+
+        def query_vectors(embeddings, k, course_filter=None):
+            requested["k"] = k
+            # 向量检索把包含课程代码的片段排在最后
+            return [[(chunk_id, docs[chunk_id]) for chunk_id in ("mat224-1", "mat224-0")][:k]]
+
+        def get_documents(ids):
+            requested["fetched"] = list(ids)
+            return {chunk_id: docs[chunk_id] for chunk_id in ids}
+
+        monkeypatch.setattr(service, "_query_vectors", query_vectors)
+        monkeypatch.setattr(service, "_get_documents", get_documents)
+
+        results = service._search(["MAT224 textbook"], [[0.0]], 1, {"course": "MAT224H1"}, ["MAT224"])
+        # 两路候选数都是 min(2k, 课程内片段数)
+        assert requested["k"] == 2
+        # 词法检索把 mat224-0 排在第一，融合后超过只被向量检索排第一的 mat224-1
+        assert [doc.id for doc in results[0]] == ["mat224-0"]
+        # 两路都命中的片段不需要再取回
+        assert requested["fetched"] == []
+    finally:
+        service.close()
+
+
+def test_search_without_lexical_index_is_vector_only(monkeypatch):
+    service = RAGService(initialize=False)
+    try:
+        doc = Document(id="mat224-1", page_content=CHUNKS["mat224-1"][0])
+        monkeypatch.setattr(service, "_query_vectors", lambda embeddings, k, course_filter=None: [[("mat224-1", doc)]])
+        assert service._search(["MAT224 textbook"], [[0.0]], 5) == [[doc]]
+    finally:
+        service.close()
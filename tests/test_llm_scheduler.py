@@ -0,0 +1,299 @@
+"""LLMScheduler 准入控制与熔断测试"""
+import asyncio
+import time
+
+import pytest
+
+from app.llm_scheduler import CLOSED, HALF_OPEN, OPEN, LLMScheduler, LLMUnavailableError
+
+
+class UpstreamError(Exception):
+    """带 HTTP 状态码的上游错误（与 groq.APIStatusError 一样通过 status_code 判断是否可重试）"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"upstream {status_code}")
+        self.status_code = status_code
+
+
+def fail_with(status_code: int):
+    async def func():
+        raise UpstreamError(status_code)
+    return func
+
+
+async def succeed():
+    return "ok"
+
+
+def test_release_hands_off_slots_in_fifo_order():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=10)
+        release_first = asyncio.Event()
+        order = []
+        peak = 0
+
+        async def request(name, hold=None):
+            nonlocal peak
+            async with scheduler.slot():
+                peak = max(peak, scheduler.active)
+                order.append(name)
+                if hold is not None:
+                    await hold.wait()
+
+        first = asyncio.create_task(request("first", release_first))
+        await asyncio.sleep(0)
+        queued = []
+        for name in ("b", "c", "d"):
+            queued.append(asyncio.create_task(request(name)))
+            await asyncio.sleep(0)
+        assert scheduler.queue_depth == 3
+        # 名额直接转交，排队期间 active 保持不变
+        assert scheduler.active == 1
+
+        release_first.set()
+        await asyncio.gather(first, *queued)
+        return order, peak, scheduler.active, scheduler.queue_depth
+
+    order, peak, active, depth = asyncio.run(scenario())
+    assert order == ["first", "b", "c", "d"]
+    assert peak == 1
+    assert (active, depth) == (0, 0)
+
+
+def test_cancelled_waiter_is_skipped_by_handoff():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=10)
+        scheduler.active = 1  # 模拟一个正在进行的调用
+        entered = []
+
+        async def request(name):
+            async with scheduler.slot():
+                entered.append(name)
+
+        b = asyncio.create_task(request("b"))
+        await asyncio.sleep(0)
+        c = asyncio.create_task(request("c"))
+        await asyncio.sleep(0)
+        b.cancel()
+        await asyncio.sleep(0)
+        assert scheduler.queue_depth == 1
+
+        scheduler._release()
+        await c
+        return entered, b.cancelled(), scheduler.active
+
+    entered, b_cancelled, active = asyncio.run(scenario())
+    assert entered == ["c"]
+    assert b_cancelled
+    assert active == 0
+
+
+def test_timeout_racing_handoff_passes_slot_on(monkeypatch):
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=10)
+        scheduler.active = 1  # 模拟一个正在进行的调用
+        real_wait_for = asyncio.wait_for
+        raced = False
+
+        async def racing_wait_for(fut, timeout):
+            nonlocal raced
+            if raced:
+                return await real_wait_for(fut, timeout)
+            raced = True
+            # 截止时间到达的同一时刻，正在进行的调用结束并把名额转交给本请求
+            await asyncio.sleep(0)
+            scheduler._release()
+            fut.cancel()
+            raise asyncio.TimeoutError
+
+        monkeypatch.setattr(asyncio, "wait_for", racing_wait_for)
+        entered = []
+
+        async def request(name, deadline):
+            async with scheduler.slot(deadline):
+                entered.append(name)
+
+        racing = asyncio.create_task(request("racing", time.perf_counter() + 60))
+        behind = asyncio.create_task(request("behind", None))
+        with pytest.raises(LLMUnavailableError) as error:
+            await racing
+        await behind
+        return error.value, entered, scheduler.active, scheduler.queue_depth
+
+    error, entered, active, depth = asyncio.run(scenario())
+    assert error.reason == "deadline"
+    # 已转交的名额没有泄漏，而是继续交给排在后面的请求
+    assert entered == ["behind"]
+    assert (active, depth) == (0, 0)
+
+
+def test_queue_full_rejects_with_retry_after():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=1)
+        scheduler.active = 1  # 模拟一个正在进行的调用
+
+        async def request():
+            async with scheduler.slot():
+                pass
+
+        queued = asyncio.create_task(request())
+        await asyncio.sleep(0)
+        assert scheduler.queue_depth == 1
+        with pytest.raises(LLMUnavailableError) as error:
+            await request()
+        scheduler._release()
+        await queued
+        return error.value
+
+    error = asyncio.run(scenario())
+    assert error.reason == "queue_full"
+    # 初始平均调用耗时 2 秒，排在第 2 位、并发 1：预计等待 4 秒
+    assert error.retry_after == 4
+
+
+def test_expired_deadline_rejects_before_queueing():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=10)
+        scheduler.active = 1
+        with pytest.raises(LLMUnavailableError) as error:
+            async with scheduler.slot(deadline=time.perf_counter() - 1):
+                pass
+        return error.value, scheduler.queue_depth
+
+    error, depth = asyncio.run(scenario())
+    assert (error.reason, error.retry_after) == ("deadline", 2)
+    assert depth == 0
+
+
+def test_deadline_while_queued_rejects_and_leaves_queue():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=10)
+        scheduler.active = 1
+        with pytest.raises(LLMUnavailableError) as error:
+            async with scheduler.slot(deadline=time.perf_counter() + 0.01):
+                pass
+        return error.value, scheduler.queue_depth, scheduler.active
+
+    error, depth, active = asyncio.run(scenario())
+    assert error.reason == "deadline"
+    assert error.retry_after >= 1
+    assert (depth, active) == (0, 1)
+
+
+def test_deadline_during_call_does_not_trip_breaker():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, breaker_threshold=1)
+
+        async def slow():
+            await asyncio.sleep(1)
+
+        with pytest.raises(LLMUnavailableError) as error:
+            await scheduler.run(slow, deadline=time.perf_counter() + 0.01)
+        return error.value, scheduler.state, scheduler.active
+
+    error, state, active = asyncio.run(scenario())
+    assert error.reason == "deadline"
+    assert (state, active) == (CLOSED, 0)
+
+
+def test_breaker_opens_then_admits_a_single_probe():
+    async def scenario():
+        scheduler = LLMScheduler(max_retries=0, breaker_threshold=2, breaker_reset_seconds=30)
+        for _ in range(2):
+            with pytest.raises(UpstreamError):
+                await scheduler.run(fail_with(503))
+        assert scheduler.state == OPEN
+
+        with pytest.raises(LLMUnavailableError) as rejected:
+            await scheduler.run(succeed)
+        assert (rejected.value.reason, rejected.value.retry_after) == ("circuit_open", 30)
+
+        # 冷却结束：只放行一个试探请求，其余请求仍被拒绝
+        scheduler._opened_at -= 30
+        release_probe = asyncio.Event()
+
+        async def probe():
+            await release_probe.wait()
+            return "probe"
+
+        probe_task = asyncio.create_task(scheduler.run(probe))
+        await asyncio.sleep(0)
+        assert scheduler.state == HALF_OPEN
+        with pytest.raises(LLMUnavailableError) as concurrent:
+            await scheduler.run(succeed)
+        assert concurrent.value.reason == "circuit_open"
+
+        release_probe.set()
+        assert await probe_task == "probe"
+        assert scheduler.state == CLOSED
+        return await scheduler.run(succeed)
+
+    assert asyncio.run(scenario()) == "ok"
+
+
+def test_failed_probe_reopens_breaker():
+    async def scenario():
+        scheduler = LLMScheduler(max_retries=0, breaker_threshold=1, breaker_reset_seconds=30)
+        with pytest.raises(UpstreamError):
+            await scheduler.run(fail_with(500))
+        scheduler._opened_at -= 30
+        with pytest.raises(UpstreamError):
+            await scheduler.run(fail_with(500))
+        assert scheduler.state == OPEN
+        with pytest.raises(LLMUnavailableError) as rejected:
+            await scheduler.run(succeed)
+        return rejected.value.reason
+
+    assert asyncio.run(scenario()) == "circuit_open"
+
+
+def test_non_retryable_errors_leave_breaker_state_unchanged():
+    async def scenario():
+        scheduler = LLMScheduler(max_retries=0, breaker_threshold=2, breaker_reset_seconds=30)
+        with pytest.raises(UpstreamError):
+            await scheduler.run(fail_with(503))
+        # 401 不说明上游已恢复：不清零连续失败次数
+        with pytest.raises(UpstreamError):
+            await scheduler.run(fail_with(401))
+        with pytest.raises(UpstreamError):
+            await scheduler.run(fail_with(503))
+        assert scheduler.state == OPEN
+
+        # 试探请求遇到 400 时保持半开，下一个请求继续试探
+        scheduler._opened_at -= 30
+        with pytest.raises(UpstreamError):
+            await scheduler.run(fail_with(400))
+        assert scheduler.state == HALF_OPEN
+        await scheduler.run(succeed)
+        return scheduler.state
+
+    assert asyncio.run(scenario()) == CLOSED
+
+
+def test_overload_rejects_without_opening_breaker():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=2, max_queue=32, breaker_threshold=5)
+
+        async def upstream():
+            await asyncio.sleep(0.4)
+            return "ok"
+
+        async def request():
+            try:
+                return await scheduler.run(upstream, deadline=time.perf_counter() + 0.6)
+            except LLMUnavailableError as e:
+                return e.reason
+
+        tasks = []
+        for _ in range(20):
+            tasks.append(asyncio.create_task(request()))
+            await asyncio.sleep(0.02)
+        results = await asyncio.gather(*tasks)
+        return results, scheduler.state, scheduler.active, scheduler.queue_depth
+
+    results, state, active, depth = asyncio.run(scenario())
+    assert results.count("ok") >= 2
+    assert "deadline" in results
+    # 上游一直健康：请求超时只是过载，熔断器保持关闭
+    assert state == CLOSED
+    assert (active, depth) == (0, 0)
@@ -0,0 +1,145 @@
+"""令牌桶速率限制器测试（进程内分片实现和共享 SQLite 实现）"""
+import asyncio
+import sqlite3
+import time
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app import middleware
+from app.middleware import RateLimiter, SQLiteRateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    fake = FakeClock()
+    # 进程内实现用单调时钟，SQLite 实现跨进程比较时间，用墙上时钟
+    monkeypatch.setattr(time, "monotonic", fake)
+    monkeypatch.setattr(time, "time", fake)
+    return fake
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_limiter(request, tmp_path):
+    def make(max_requests: int, window_seconds: int):
+        if request.param == "memory":
+            return RateLimiter(max_requests=max_requests, window_seconds=window_seconds)
+        return SQLiteRateLimiter(
+            str(tmp_path / "rate_limit.sqlite3"), max_requests=max_requests, window_seconds=window_seconds
+        )
+    return make
+
+
+def test_burst_up_to_capacity_then_limited(clock, make_limiter):
+    limiter = make_limiter(5, 60)
+    assert [limiter.is_allowed("1.2.3.4") for _ in range(6)] == [True] * 5 + [False]
+    # 其它客户端有各自的令牌桶
+    assert limiter.is_allowed("5.6.7.8")
+
+
+def test_refill_and_retry_after(clock, make_limiter):
+    limiter = make_limiter(6, 60)  # 每 10 秒补充一个令牌
+    for _ in range(6):
+        assert limiter.acquire("client") == 0.0
+    assert limiter.acquire("client") == pytest.approx(10.0)
+    clock.now += 4
+    assert limiter.acquire("client") == pytest.approx(6.0)
+    clock.now += 6
+    assert limiter.acquire("client") == 0.0
+    assert limiter.acquire("client") == pytest.approx(10.0)
+    # 闲置足够久后补满，但不超过容量
+    clock.now += 600
+    assert [limiter.is_allowed("client") for _ in range(7)] == [True] * 6 + [False]
+
+
+def test_cost_greater_than_one(clock, make_limiter):
+    limiter = make_limiter(100, 3600)  # 每 36 秒补充一个令牌
+    assert limiter.acquire("client", 60) == 0.0
+    assert limiter.acquire("client", 40) == 0.0
+    # 余额为 0，再提交 10 个问题需要等待 10 个令牌
+    assert limiter.acquire("client", 10) == pytest.approx(360.0)
+    clock.now += 360
+    assert limiter.acquire("client", 10) == 0.0
+    with pytest.raises(ValueError):
+        limiter.acquire("client", 101)
+
+
+@pytest.mark.parametrize("limiter_type", ["memory", "sqlite"])
+def test_idle_buckets_are_swept(clock, tmp_path, limiter_type):
+    if limiter_type == "memory":
+        # 进程内实现只清扫被访问的分片，单分片时所有客户端在同一分片
+        limiter = RateLimiter(max_requests=5, window_seconds=60, shards=1)
+    else:
+        limiter = SQLiteRateLimiter(str(tmp_path / "rate_limit.sqlite3"), max_requests=5, window_seconds=60)
+    for client in ("a", "b", "c"):
+        limiter.acquire(client)
+    assert len(limiter) == 3
+    # 闲置超过一个窗口的令牌桶已补满，与新客户端等价，下次清扫时淘汰
+    clock.now += 61
+    limiter.acquire("a")
+    assert len(limiter) == 1
+
+
+def test_sqlite_limiter_is_shared_between_instances(clock, tmp_path):
+    db_path = str(tmp_path / "rate_limit.sqlite3")
+    first = SQLiteRateLimiter(db_path, max_requests=3, window_seconds=60)
+    second = SQLiteRateLimiter(db_path, max_requests=3, window_seconds=60)
+    assert first.is_allowed("client")
+    assert second.is_allowed("client")
+    assert first.is_allowed("client")
+    assert not second.is_allowed("client")
+
+
+def test_sqlite_limiter_fails_open_when_locked(clock, tmp_path):
+    db_path = str(tmp_path / "rate_limit.sqlite3")
+    limiter = SQLiteRateLimiter(db_path, max_requests=1, window_seconds=60, busy_timeout=0.05)
+    assert limiter.acquire("client") == 0.0
+    assert limiter.acquire("client") > 0
+
+    # 另一个 worker 持有写锁超过 busy_timeout：放行请求而不是阻塞或报错
+    other = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        other.execute("BEGIN IMMEDIATE")
+        assert limiter.acquire("client") == 0.0
+        other.execute("ROLLBACK")
+    finally:
+        other.close()
+
+    # 写锁释放后恢复正常计费，放行的那次请求没有留下半个事务
+    assert limiter.acquire("client") > 0
+
+
+def make_request(host: str) -> Request:
+    return Request({"type": "http", "method": "POST", "path": "/chat", "headers": [], "client": (host, 12345)})
+
+
+def test_check_rate_limit_sets_retry_after(clock, monkeypatch):
+    monkeypatch.setattr(middleware, "rate_limiter", RateLimiter(max_requests=2, window_seconds=60))
+    request = make_request("1.2.3.4")
+    asyncio.run(middleware.check_rate_limit(request))
+    asyncio.run(middleware.check_rate_limit(request))
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(middleware.check_rate_limit(request))
+    assert excinfo.value.status_code == 429
+    assert excinfo.value.headers["Retry-After"] == "30"
+
+
+def test_check_batch_rate_limit_charges_per_question(clock, tmp_path, monkeypatch):
+    limiter = SQLiteRateLimiter(str(tmp_path / "rate_limit.sqlite3"), max_requests=10, window_seconds=3600)
+    monkeypatch.setattr(middleware, "batch_rate_limiter", limiter)
+    request = make_request("1.2.3.4")
+    asyncio.run(middleware.check_batch_rate_limit(request, 8))
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(middleware.check_batch_rate_limit(request, 5))
+    assert excinfo.value.status_code == 429
+    # 还差 3 个令牌，每 360 秒补充一个
+    assert excinfo.value.headers["Retry-After"] == "1080"
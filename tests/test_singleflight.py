@@ -0,0 +1,125 @@
+"""SingleFlight 请求合并测试"""
+import asyncio
+
+from app.singleflight import SingleFlight
+
+
+def test_leader_and_followers_share_one_call():
+    async def scenario():
+        flight = SingleFlight("test")
+        calls = 0
+        release = asyncio.Event()
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return "answer"
+
+        tasks = [asyncio.create_task(flight.do("q", compute)) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert len(flight) == 1
+        release.set()
+        results = await asyncio.gather(*tasks)
+        return calls, results, len(flight)
+
+    calls, results, remaining = asyncio.run(scenario())
+    assert calls == 1
+    assert [result for result, _ in results] == ["answer"] * 5
+    assert [shared for _, shared in results] == [False, True, True, True, True]
+    assert remaining == 0
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    async def scenario():
+        flight = SingleFlight("test")
+        release = asyncio.Event()
+
+        async def compute():
+            await release.wait()
+            return "answer"
+
+        leader = asyncio.create_task(flight.do("q", compute))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(flight.do("q", compute)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        await asyncio.sleep(0)
+        assert leader.cancelled()
+        release.set()
+        return await asyncio.gather(*followers)
+
+    assert asyncio.run(scenario()) == [("answer", True), ("answer", True)]
+
+
+def test_last_waiter_cancelled_cancels_computation():
+    async def scenario():
+        flight = SingleFlight("test")
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def compute():
+            started.set()
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiters = [asyncio.create_task(flight.do("q", compute)) for _ in range(2)]
+        await started.wait()
+        waiters[0].cancel()
+        await asyncio.sleep(0)
+        assert not cancelled.is_set()
+        assert len(flight) == 1
+
+        waiters[1].cancel()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        assert len(flight) == 0
+
+        # 取消后同一个键重新执行，而不是加入已取消的计算
+        async def again():
+            return "fresh"
+
+        return await flight.do("q", again)
+
+    assert asyncio.run(scenario()) == ("fresh", False)
+
+
+def test_exception_fans_out_to_all_followers():
+    async def scenario():
+        flight = SingleFlight("test")
+        release = asyncio.Event()
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            raise ValueError("upstream failed")
+
+        tasks = [asyncio.create_task(flight.do("q", compute)) for _ in range(4)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        return calls, results, len(flight)
+
+    calls, results, remaining = asyncio.run(scenario())
+    assert calls == 1
+    assert all(isinstance(result, ValueError) and str(result) == "upstream failed" for result in results)
+    # 失败不会被缓存
+    assert remaining == 0
+
+
+def test_different_keys_do_not_coalesce():
+    async def scenario():
+        flight = SingleFlight("test")
+
+        async def compute(value):
+            await asyncio.sleep(0)
+            return value
+
+        return await asyncio.gather(flight.do("a", lambda: compute(1)), flight.do("b", lambda: compute(2)))
+
+    assert asyncio.run(scenario()) == [(1, False), (2, False)]
@@ -0,0 +1,95 @@
+"""索引快照（向量 + 紧凑片段存储）导出、加载和检索测试"""
+import numpy as np
+import pytest
+
+from app.chunk_store import ChunkStore
+from app.snapshot import IndexSnapshot, export_snapshot, quantize_vectors
+
+DIM = 32
+COURSES = ("MAT224H1", "STA237H1")
+
+
+class FakeVectorStore:
+    """只实现 export_snapshot 用到的 get()（与 Chroma 的返回结构一致）"""
+
+    def __init__(self, ids, embeddings, documents, metadatas):
+        self._data = {"ids": ids, "embeddings": embeddings, "documents": documents, "metadatas": metadatas}
+
+    def get(self, include):
+        return {key: self._data[key] for key in ["ids", *include]}
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    rng = np.random.default_rng(0)
+    ids, documents, metadatas = [], [], []
+    # 课程交错写入，导出时按课程排序
+    for i in range(40):
+        course = COURSES[i % 2]
+        ids.append(f"{course}-{i}")
+        documents.append(f"{course} 第 {i} 段：Midterm ✓ {i}")
+        metadatas.append({
+            "course": course, "course_base": course[:6], "source_file": f"{course}.pdf", "page": i // 4,
+            "content_type": "table" if i % 5 == 0 else "text", **({"table_index": 1} if i % 5 == 0 else {}),
+        })
+    embeddings = rng.normal(size=(len(ids), DIM)).astype(np.float32)
+    return ids, embeddings, documents, metadatas
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_snapshot_round_trip_and_search(tmp_path, corpus, dtype):
+    ids, embeddings, documents, metadatas = corpus
+    export_snapshot(FakeVectorStore(ids, embeddings.tolist(), documents, metadatas), 7, str(tmp_path), dtype)
+
+    snapshot = IndexSnapshot.load(str(tmp_path))
+    assert snapshot is not None
+    assert (snapshot.dtype, snapshot.index_version, len(snapshot)) == (dtype, 7, len(ids))
+    assert (snapshot.scales is not None) == (dtype == "int8")
+
+    # 片段文本和元数据原样取回
+    records = snapshot.chunks.get_records(ids)
+    for chunk_id, text, meta in zip(ids, documents, metadatas):
+        assert records[chunk_id].page_content == text
+        assert records[chunk_id].metadata == meta
+
+    # 用片段自身的嵌入查询，量化后第一名仍是该片段
+    exact = [snapshot.query([embeddings[i].tolist()], 3)[0] for i in range(len(ids))]
+    assert [hits[0][0] for hits in exact] == ids
+
+    # 课程过滤：只返回该课程的片段
+    hits = snapshot.query([embeddings[1].tolist()], 50, {"course": "STA237H1"})[0]
+    assert hits[0][0] == ids[1]
+    assert len(hits) == 20
+    assert {record.metadata["course"] for _, record in hits} == {"STA237H1"}
+    both = snapshot.query([embeddings[0].tolist()], 50, {"course": {"$in": list(COURSES)}})[0]
+    assert len(both) == len(ids)
+    assert snapshot.query([embeddings[0].tolist()], 5, {"course": "CSC108H1"}) == [[]]
+
+
+def test_quantized_scores_preserve_ranking(corpus):
+    _, embeddings, _, _ = corpus
+    vectors = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    query = vectors[3]
+    expected = np.argsort(-(vectors @ query))[:5]
+    for dtype in ("float16", "int8"):
+        quantized, scales = quantize_vectors(vectors, dtype)
+        scores = quantized.astype(np.float32) @ query
+        if scales is not None:
+            scores *= scales
+        assert list(np.argsort(-scores)[:5]) == list(expected)
+    with pytest.raises(ValueError):
+        quantize_vectors(vectors, "bfloat16")
+
+
+def test_reexport_replaces_snapshot_and_rejects_mismatched_files(tmp_path, corpus):
+    ids, embeddings, documents, metadatas = corpus
+    store = FakeVectorStore(ids, embeddings.tolist(), documents, metadatas)
+    export_snapshot(store, 1, str(tmp_path), "float32")
+    target = export_snapshot(store, 2, str(tmp_path), "int8")
+    assert IndexSnapshot.load(str(tmp_path)).index_version == 2
+    assert ChunkStore.load(str(tmp_path)).index_version == 2
+
+    # int8 快照缺少反量化系数时拒绝加载
+    (target / "scales.npy").unlink()
+    assert IndexSnapshot.load(str(tmp_path)) is None
+    assert IndexSnapshot.load(str(tmp_path / "missing")) is None